@@ -1,8 +1,21 @@
 import os
+import glob
 import pandas as pd
+import matplotlib
+# Render to files only when there is no display (e.g. over SSH on the Pi)
+if not os.environ.get('DISPLAY'):
+    matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import numpy as np
+from detection_log import query_detection_logs
+from data_logger import read_rollups
+
+VEHICLE_COLUMNS = ['Total_Vehicles', 'Cars', 'Trucks', 'Buses', 'Bicycles', 'Motorbikes']
+FPS_BINS = np.arange(0, 61, 1.0)  # 1 FPS wide bins; faster frames land in the last bin
+CHUNK_ROWS = 50000
 
 def analyze_log_file(log_file):
     """Analyze vehicle detection data from CSV log file"""
@@ -53,18 +66,247 @@ def analyze_log_file(log_file):
     plt.savefig(plot_file)
     
     print(f"Analysis plot saved to {plot_file}")
-    plt.show()
+    if matplotlib.get_backend().lower() != 'agg':
+        plt.show()
+
+def find_log_files(paths):
+    """Expand directories and glob patterns into a sorted list of CSV sessions"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += glob.glob(os.path.join(path, "vehicle_data_*.csv"))
+            files += glob.glob(os.path.join(path, "vehicle_data_*.csv.gz"))
+        else:
+            files += glob.glob(path)
+    return sorted(set(files))
+
+def aggregate_log_file(log_file, chunk_rows=CHUNK_ROWS):
+    """Stream one CSV session in chunks and return its partial hourly rollup
+
+    Returns (hourly, fps_counts, peak) where hourly holds per-hour sums, maxima
+    and FPS extremes that can be combined with other files by combine_rollups.
+    """
+    parts = []
+    fps_counts = np.zeros(len(FPS_BINS) - 1, dtype=np.int64)
+    peak = None
+    
+    for chunk in pd.read_csv(log_file, chunksize=chunk_rows):
+        chunk['Timestamp'] = pd.to_datetime(chunk['Timestamp'], errors='coerce')
+        chunk = chunk.dropna(subset=['Timestamp'])
+        if chunk.empty:
+            continue
+        
+        hour = chunk['Timestamp'].dt.floor('h')
+        grouped = chunk.groupby(hour)
+        part = grouped[VEHICLE_COLUMNS].sum().add_suffix('_sum')
+        part = part.join(grouped[VEHICLE_COLUMNS].max().add_suffix('_max'))
+        part['rows'] = grouped.size()
+        part['FPS_sum'] = grouped['FPS'].sum()
+        part['FPS_min'] = grouped['FPS'].min()
+        part['FPS_max'] = grouped['FPS'].max()
+        parts.append(part)
+        
+        fps = np.clip(chunk['FPS'].to_numpy(dtype=float), FPS_BINS[0], FPS_BINS[-1] - 1e-9)
+        fps_counts += np.histogram(fps, bins=FPS_BINS)[0]
+        
+        row = chunk.loc[chunk['Total_Vehicles'].idxmax()]
+        if peak is None or row['Total_Vehicles'] > peak[1]:
+            peak = (row['Timestamp'], int(row['Total_Vehicles']))
+    
+    hourly = combine_rollups(parts) if parts else None
+    return hourly, fps_counts, peak
+
+def combine_rollups(parts):
+    """Merge partial rollups that may share hours (chunk or file boundaries)"""
+    rollup = pd.concat(parts)
+    aggregations = {column: ('max' if column.endswith('_max') else
+                             'min' if column.endswith('_min') else 'sum')
+                    for column in rollup.columns}
+    return rollup.groupby(level=0).agg(aggregations).sort_index()
+
+def finalize_rollup(rollup):
+    """Turn summed rollup columns into totals, means and maxima"""
+    result = pd.DataFrame(index=rollup.index)
+    result['frames'] = rollup['rows']
+    for column in VEHICLE_COLUMNS:
+        result[f'{column}_total'] = rollup[f'{column}_sum']
+        result[f'{column}_mean'] = rollup[f'{column}_sum'] / rollup['rows']
+        result[f'{column}_max'] = rollup[f'{column}_max']
+    result['FPS_mean'] = rollup['FPS_sum'] / rollup['rows']
+    result['FPS_min'] = rollup['FPS_min']
+    result['FPS_max'] = rollup['FPS_max']
+    return result
+
+def analyze_directory(paths, output_dir=None, workers=None, chunk_rows=CHUNK_ROWS):
+    """Combine many CSV sessions into hourly/daily rollups and a headless report"""
+    log_files = find_log_files(paths)
+    if not log_files:
+        print("Error: No vehicle_data_*.csv files found")
+        return
+    print(f"Aggregating {len(log_files)} log files...")
+    
+    # Files are independent, so each worker streams whole files
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(aggregate_log_file, log_files,
+                                    [chunk_rows] * len(log_files)))
+    
+    parts = [hourly for hourly, _, _ in results if hourly is not None]
+    if not parts:
+        print("Error: The log files contain no rows")
+        return
+    hourly = combine_rollups(parts)
+    daily = combine_rollups([hourly.set_axis(hourly.index.floor('D'))])
+    fps_counts = np.sum([counts for _, counts, _ in results], axis=0)
+    peak = max((peak for _, _, peak in results if peak is not None), key=lambda p: p[1])
+    
+    hourly_report = finalize_rollup(hourly)
+    daily_report = finalize_rollup(daily)
+    
+    # Write everything next to the logs unless told otherwise
+    if output_dir is None:
+        output_dir = paths[0] if os.path.isdir(paths[0]) else os.path.dirname(log_files[0])
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    hourly_file = os.path.join(output_dir, f"rollup_hourly_{timestamp}.csv")
+    daily_file = os.path.join(output_dir, f"rollup_daily_{timestamp}.csv")
+    fps_file = os.path.join(output_dir, f"fps_histogram_{timestamp}.csv")
+    hourly_report.to_csv(hourly_file, index_label='Hour', float_format='%.3f')
+    daily_report.to_csv(daily_file, index_label='Day', float_format='%.3f')
+    pd.DataFrame({'FPS_from': FPS_BINS[:-1], 'FPS_to': FPS_BINS[1:], 'frames': fps_counts}).to_csv(
+        fps_file, index=False)
+    
+    total_frames = int(hourly['rows'].sum())
+    fps_mean = hourly['FPS_sum'].sum() / total_frames
+    busiest = hourly_report['Total_Vehicles_mean'].idxmax()
+    
+    print(f"\nDirectory Analysis Summary:")
+    print(f"Files: {len(log_files)}")
+    print(f"Period: {hourly.index.min():%Y-%m-%d %H:00} to {hourly.index.max():%Y-%m-%d %H:00}")
+    print(f"Frames logged: {total_frames}")
+    print(f"Average FPS: {fps_mean:.1f} (min {hourly['FPS_min'].min():.1f}, max {hourly['FPS_max'].max():.1f})")
+    print(f"Peak vehicles in frame: {peak[1]} at {peak[0]:%Y-%m-%d %H:%M:%S}")
+    print(f"Busiest hour: {busiest:%Y-%m-%d %H:00} "
+          f"({hourly_report.loc[busiest, 'Total_Vehicles_mean']:.2f} vehicles per frame)")
+    print(f"Rollups saved to {hourly_file} and {daily_file}")
+    print(f"FPS distribution saved to {fps_file}")
+    
+    # Headless report: always rendered to a file, never shown
+    fig, axes = plt.subplots(3, 1, figsize=(12, 12))
+    for column in VEHICLE_COLUMNS[1:]:
+        axes[0].plot(hourly_report.index, hourly_report[f'{column}_mean'], label=column)
+    axes[0].set_title('Mean Vehicles per Frame by Hour')
+    axes[0].set_ylabel('Vehicles')
+    axes[0].legend()
+    
+    axes[1].bar(daily_report.index, daily_report['Total_Vehicles_max'])
+    axes[1].set_title('Peak Vehicles in Frame by Day')
+    axes[1].set_ylabel('Vehicles')
+    
+    axes[2].bar(FPS_BINS[:-1], fps_counts, width=1.0, align='edge')
+    axes[2].set_title('FPS Distribution')
+    axes[2].set_xlabel('Frames Per Second')
+    axes[2].set_ylabel('Frames')
+    
+    plot_file = os.path.join(output_dir, f"report_{timestamp}.png")
+    fig.tight_layout()
+    fig.savefig(plot_file)
+    plt.close(fig)
+    print(f"Report plot saved to {plot_file}")
+
+def parse_time(text):
+    """Parse a 'YYYY-MM-DD HH:MM:SS' (or ISO) time into a Unix timestamp"""
+    return datetime.fromisoformat(text).timestamp()
+
+def load_class_names(classes_path):
+    """Class names by id, or None if the names file is not available"""
+    if not classes_path or not os.path.exists(classes_path):
+        return None
+    with open(classes_path, 'r') as f:
+        return [line.strip() for line in f.readlines()]
+
+def analyze_detection_log(log_dir, start_time=None, end_time=None, classes_path=None):
+    """Summarize raw detections from binary detection logs in a time range"""
+    print(f"Querying detection logs in {log_dir}...")
+    records = query_detection_logs(log_dir, start_time, end_time, include_empty_frames=True)
+    detections = records[records['class_id'] >= 0]
+    if len(records) == 0:
+        print("No detections in the requested time range")
+        return
+    
+    first = datetime.fromtimestamp(records['timestamp'][0])
+    last = datetime.fromtimestamp(records['timestamp'][-1])
+    frames = len(np.unique(records['timestamp']))  # Sequence numbers restart every session
+    
+    print(f"\nDetection Log Summary:")
+    print(f"Time range: {first:%Y-%m-%d %H:%M:%S} to {last:%Y-%m-%d %H:%M:%S}")
+    print(f"Frames processed: {frames}")
+    print(f"Total detections: {len(detections)}")
+    tracked = detections['track_id'][detections['track_id'] >= 0]
+    if len(tracked):
+        print(f"Unique tracked vehicles: {len(np.unique(tracked))}")
+    
+    names = load_class_names(classes_path)
+    print("\nPer class:")
+    for class_id in np.unique(detections['class_id']):
+        selected = detections[detections['class_id'] == class_id]
+        name = names[class_id] if names and class_id < len(names) else f"class {class_id}"
+        widths = selected['box'][:, 2]
+        print(f"  {name:10} {len(selected):7} detections, mean score {selected['score'].mean():.2f}, "
+              f"mean box width {widths.mean():.0f}px")
+
+def show_rollups(log_dir, resolution=3600):
+    """Print the rollups kept by the logger, without reading any raw rows"""
+    records = read_rollups(log_dir, resolution)
+    if not records:
+        print(f"No {resolution} s rollups found in {log_dir}")
+        return
+    
+    print(f"{'Start':19} | {'Frames':>7} | {'Mean':>5} | {'Max':>3} | {'Cars':>6} | {'Trucks':>6} | "
+          f"{'Buses':>5} | {'FPS min/mean':>12}")
+    for record in records:
+        mean, maximum = record['mean'], record['max']
+        print(f"{record['start']:19} | {record['frames']:7} | {mean['total']:5.2f} | {maximum['total']:3} | "
+              f"{mean['cars']:6.2f} | {mean['trucks']:6.2f} | {mean['buses']:5.2f} | "
+              f"{record['fps_min']:5.1f}/{record['fps_mean']:<6.1f}")
 
 def main():
     parser = argparse.ArgumentParser(description='Analyze vehicle detection data')
-    parser.add_argument('log_file', help='Path to the CSV log file to analyze')
+    parser.add_argument('log_file', nargs='*',
+                        help='CSV log file to analyze, or directories/glob patterns of many files')
+    parser.add_argument('--detections', metavar='DIR',
+                        help='Summarize the binary detection logs in this directory instead')
+    parser.add_argument('--start', type=parse_time, help='Start of the time range (YYYY-MM-DD HH:MM:SS)')
+    parser.add_argument('--end', type=parse_time, help='End of the time range (YYYY-MM-DD HH:MM:SS)')
+    parser.add_argument('--classes', default="/home/pi/Project/Onroad Final/models/coco.names",
+                        help='Class names file used to label class ids')
+    parser.add_argument('--rollups', metavar='DIR',
+                        help='Show the rollups kept by the data logger in this directory instead')
+    parser.add_argument('--resolution', type=int, default=3600,
+                        help='Rollup bucket size in seconds to show with --rollups')
+    parser.add_argument('--output-dir', help='Where to write the rollups and report (default: next to the logs)')
+    parser.add_argument('--workers', type=int, default=None, help='Processes used to read files (default: CPU count)')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='Rows read from a file at a time')
     args = parser.parse_args()
     
-    if not os.path.exists(args.log_file):
-        print(f"Error: Log file {args.log_file} not found")
+    if args.rollups:
+        show_rollups(args.rollups, args.resolution)
+        return
+    if args.detections:
+        analyze_detection_log(args.detections, args.start, args.end, args.classes)
+        return
+    if not args.log_file:
+        parser.error("a CSV log file, --detections DIR or --rollups DIR is required")
+    
+    # A single existing file keeps the original per-session analysis
+    if len(args.log_file) == 1 and os.path.isfile(args.log_file[0]):
+        analyze_log_file(args.log_file[0])
+        return
+    
+    if not find_log_files(args.log_file):
+        print(f"Error: No log files found in {' '.join(args.log_file)}")
         return
     
-    analyze_log_file(args.log_file)
+    analyze_directory(args.log_file, args.output_dir, args.workers, args.chunk_rows)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+from config import *
+from utils import load_classes, summarize_detections
+from render import FrameRenderer
+from detector import BACKENDS, create_detector
+from oled import OledRenderer
+from data_logger import VehicleDataLogger
+from frame_sources import add_source_arguments, source_from_args
+
+STAGES = ["blob", "forward", "decode", "draw", "oled_render", "csv_log"]
+
+def summarize(samples):
+    """Return latency percentiles in milliseconds for a list of durations in seconds"""
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    return {
+        "count": int(ms.size),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    if sys.platform == "darwin":
+        return peak / 1024 / 1024
+    return peak / 1024
+
+def run_benchmark(source, num_frames, warmup, blob_size, backend=DETECTOR_BACKEND):
+    """Time every pipeline stage separately over frames from the source"""
+    classes = load_classes(CLASSES_PATH)
+    detector = create_detector(classes, blob_size, backend)
+    renderer = FrameRenderer(classes)
+    oled_renderer = OledRenderer()
+    timings = {stage: [] for stage in STAGES}
+
+    with tempfile.TemporaryDirectory() as log_dir, source:
+        data_logger = VehicleDataLogger(log_dir=log_dir)
+        first_frame = None
+
+        for i in range(warmup + num_frames):
+            frame = source.read()
+            if frame is None:
+                if first_frame is None:
+                    raise RuntimeError("Frame source produced no frames")
+                frame = first_frame.copy()  # Reuse a frame once a file source runs out
+            elif first_frame is None:
+                first_frame = frame.copy()
+
+            t0 = time.perf_counter()
+            blob = detector.preprocess(frame)
+            t1 = time.perf_counter()
+            outs = detector.infer(blob)
+            t2 = time.perf_counter()
+            detections = detector.decode(outs, frame.shape[1], frame.shape[0])
+            vehicle_count, vehicle_types = summarize_detections(detections, classes)
+            t3 = time.perf_counter()
+            renderer.render(frame, detections, [f"Vehicles: {vehicle_count}"])
+            t4 = time.perf_counter()
+            oled_renderer.render_pages(vehicle_count, vehicle_types)
+            t5 = time.perf_counter()
+            data_logger.log_data(vehicle_count, vehicle_types, 0.0)
+            t6 = time.perf_counter()
+
+            if i < warmup:
+                continue
+            for stage, start, end in zip(STAGES, (t0, t1, t2, t3, t4, t5), (t1, t2, t3, t4, t5, t6)):
+                timings[stage].append(end - start)
+
+        data_logger.close()
+
+    totals = np.sum([timings[stage] for stage in STAGES], axis=0)
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "opencv": cv2.__version__,
+        "source": type(source).__name__,
+        "frame_shape": list(source.frame_shape),
+        "backend": detector.name,
+        "blob_size": detector.input_size,
+        "frames": num_frames,
+        "stages": {stage: summarize(timings[stage]) for stage in STAGES},
+        "total": summarize(totals),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def compare_to_baseline(results, baseline, tolerance, min_delta_ms):
+    """Return a list of (stage, metric, baseline_ms, current_ms) regressions"""
+    regressions = []
+    stages = dict(results["stages"], total=results["total"])
+    baseline_stages = dict(baseline.get("stages", {}), total=baseline.get("total", {}))
+    for stage, stats in stages.items():
+        reference = baseline_stages.get(stage)
+        if not reference:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            old, new = reference[metric], stats[metric]
+            # Ignore sub-noise differences on very fast stages
+            if new > old * (1 + tolerance) and new - old > min_delta_ms:
+                regressions.append((stage, metric, old, new))
+    return regressions
+
+def print_results(results, baseline=None):
+    """Print a per-stage latency table"""
+    print(f"\nStage latencies over {results['frames']} frames "
+          f"({results['source']}, {results.get('backend', 'opencv')}, blob {results['blob_size']}):")
+    print("| Stage       | p50 (ms) | p95 (ms) | p99 (ms) | baseline p50 |")
+    print("|-------------|----------|----------|----------|--------------|")
+    stages = dict(results["stages"], total=results["total"])
+    baseline_stages = {}
+    if baseline:
+        baseline_stages = dict(baseline.get("stages", {}), total=baseline.get("total", {}))
+    for stage, stats in stages.items():
+        reference = baseline_stages.get(stage)
+        ref_text = f"{reference['p50_ms']:12.2f}" if reference else f"{'-':>12}"
+        print(f"| {stage:11} | {stats['p50_ms']:8.2f} | {stats['p95_ms']:8.2f} | "
+              f"{stats['p99_ms']:8.2f} | {ref_text} |")
+    print(f"Peak RSS: {results['peak_rss_mb']:.1f} MB")
+
+def compare_backends(args, backends):
+    """Run the same benchmark for several detector backends and print them side by side
+
+    Every backend gets a fresh frame source built from the same arguments
+    (file and synthetic sources repeat the same frames) and the same input
+    size and thresholds, so only the engine differs.
+    """
+    all_results = {}
+    for backend in backends:
+        print(f"Benchmarking {backend}...")
+        try:
+            all_results[backend] = run_benchmark(source_from_args(args), args.frames, args.warmup,
+                                                 args.blob_size, backend)
+        except (ImportError, FileNotFoundError) as e:
+            print(f"  Skipped: {e}")
+
+    print(f"\nDetector backends over {args.frames} frames:")
+    print("| Backend     | Input | preprocess p50 | infer p50 | decode p50 | total p50 | total p95 |")
+    print("|-------------|-------|----------------|-----------|------------|-----------|-----------|")
+    for backend, results in all_results.items():
+        stages = results["stages"]
+        print(f"| {backend:11} | {results['blob_size']:5} | {stages['blob']['p50_ms']:14.2f} | "
+              f"{stages['forward']['p50_ms']:9.2f} | {stages['decode']['p50_ms']:10.2f} | "
+              f"{results['total']['p50_ms']:9.2f} | {results['total']['p95_ms']:9.2f} |")
+    return all_results
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-stage pipeline benchmark')
+    add_source_arguments(parser)
+    parser.set_defaults(source="synthetic", fast=True)
+    parser.add_argument('--frames', type=int, default=200, help='Frames to time')
+    parser.add_argument('--warmup', type=int, default=10, help='Untimed warm-up frames')
+    parser.add_argument('--blob-size', type=int, default=BLOB_SIZE, help='Network input size')
+    parser.add_argument('--backend', choices=list(BACKENDS), default=DETECTOR_BACKEND,
+                        help='Detector backend to time')
+    parser.add_argument('--compare-backends', nargs='*', choices=list(BACKENDS), default=None,
+                        metavar='BACKEND', help='Time several backends (default: all) and print a comparison')
+    parser.add_argument('--output', default=None, help='Write JSON results to this file')
+    parser.add_argument('--baseline', default=None, help='Baseline JSON file to compare against')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Write these results to the baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Allowed relative slowdown before flagging a regression')
+    parser.add_argument('--min-delta-ms', type=float, default=0.2,
+                        help='Ignore slowdowns smaller than this many milliseconds')
+    args = parser.parse_args()
+
+    if args.compare_backends is not None:
+        all_results = compare_backends(args, args.compare_backends or list(BACKENDS))
+        output = args.output or f"backends_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(output, "w") as f:
+            json.dump(all_results, f, indent=2)
+        print(f"Results saved to {output}")
+        return 0
+
+    results = run_benchmark(source_from_args(args), args.frames, args.warmup, args.blob_size,
+                            args.backend)
+
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    output = args.output or f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.update_baseline:
+        if not args.baseline:
+            parser.error("--update-baseline requires --baseline")
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if baseline:
+        regressions = compare_to_baseline(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for stage, metric, old, new in regressions:
+                # A stage that took no time in the baseline (e.g. disabled) has no ratio
+                change = f"+{(new / old - 1) * 100:.0f}%" if old > 0 else "was 0 ms"
+                print(f"  {stage} {metric}: {old:.2f} ms -> {new:.2f} ms ({change})")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,23 +4,46 @@
 CAMERA_WIDTH = 640
 CAMERA_HEIGHT = 480
 CAMERA_FRAMERATE = 30
+CAMERA_WARMUP_TIMEOUT = 2.0  # Longest wait (seconds) for the camera's auto exposure to settle
+CAMERA_SETTLE_FRAMES = 3  # Consecutive frames with stable exposure that count as settled
+
+# Frame source settings (can be overridden on the command line)
+FRAME_SOURCE = "picamera"  # picamera, video, images, raw or synthetic
+FRAME_SOURCE_PATH = None  # Video file, image directory or raw recording for file sources
+FRAME_SOURCE_REALTIME = True  # Pace file/synthetic sources at their frame rate (False = as fast as possible)
+FRAME_SOURCE_LOOP = False  # Restart file sources when they reach the end
 
 # Detection settings
 CONFIDENCE_THRESHOLD = 0.5
 NMS_THRESHOLD = 0.4
 
+# Region of interest: polygons of (x, y) points in CAMERA_WIDTH x CAMERA_HEIGHT pixels.
+# Detection runs on the bounding crop of the polygons, and vehicles whose bottom-centre
+# point lies outside them are ignored. Empty = whole frame.
+# Example (road across the middle of the frame): [[(0, 180), (640, 180), (640, 430), (0, 430)]]
+ROI_POLYGONS = []
+ROI_MARGIN = 16  # Pixels kept around the polygons so vehicles crossing the edge are still seen
+ROI_BLOB_SIZE = None  # Network input size for the crop (None = BLOB_SIZE; a small crop can use a smaller blob)
+
 # Classes we want to detect (COCO dataset)
-VEHICLE_CLASSES = ["bicycle", "car", "motorbike", "bus", "truck"]
+VEHICLE_CLASSES = ["bicycle", "car", "motorbike", "motorcycle", "bus", "truck"]  # motorcycle is the YOLOv5 name of motorbike
 
 # Paths
 MODEL_PATH = "/home/pi/Project/Onroad Final/models/yolov4-tiny.weights"
 CONFIG_PATH = "/home/pi/Project/Onroad Final/models/yolov4-tiny.cfg"
 CLASSES_PATH = "/home/pi/Project/Onroad Final/models/coco.names"
+ONNX_MODEL_PATH = "/home/pi/Project/Onroad Final/models/yolov5n.onnx"
+TORCHSCRIPT_MODEL_PATH = "/home/pi/Project/Onroad Final/models/yolov5n.torchscript"
+
+# Detector settings
+DETECTOR_BACKEND = "opencv"  # opencv (YOLOv4-tiny), onnxruntime (ONNX_MODEL_PATH) or torchscript (TORCHSCRIPT_MODEL_PATH)
+EXPORTED_MODEL_INPUT_SIZE = 320  # Input size the YOLOv5 TorchScript/ONNX models were exported with
+DETECTOR_THREADS = 0  # Threads for ONNX Runtime / Torch inference (0 = library default)
 
 # Display settings
 ENABLE_PREVIEW = True
-DISPLAY_WIDTH = 800
-DISPLAY_HEIGHT = 600
+DISPLAY_WIDTH = 800  # Largest width of rendered frames (preview, recordings, streams)
+DISPLAY_HEIGHT = 600  # Largest height of rendered frames; frames are shrunk to fit, never enlarged
 
 # OLED Display settings
 ENABLE_OLED = True
@@ -29,10 +52,29 @@ OLED_HEIGHT = 64
 OLED_I2C_ADDRESS = 0x3C  # Common address for SSD1306 displays (might be 0x3D for some)
 OLED_I2C_BUS = 1  # Default I2C bus on Raspberry Pi
 OLED_UPDATE_INTERVAL = 5  # Update OLED every N frames to reduce overhead
+OLED_FULL_REFRESH_SECONDS = 30  # The OLED worker only sends changed pages, with a full redraw this often
 
 # Logging
 LOG_DETECTIONS = True
 LOG_PATH = "/home/pi/Project/Onroad Final/logs/detections.log"
+LOG_LEVEL = "INFO"  # "DEBUG" also logs every detected box (still written off the inference thread)
+LOG_SUMMARY_SECONDS = 60  # detections.log gets one summary line per interval instead of one per box
+LOG_QUEUE_SIZE = 1000  # Rows buffered for the CSV writer thread before new rows are dropped
+LOG_FLUSH_ROWS = 100  # Write to the SD card once this many rows are buffered...
+LOG_FLUSH_INTERVAL = 5.0  # ...or after this many seconds
+LOG_ROTATE_BYTES = 10 * 1024 * 1024  # Start a new CSV file after this size (0 = never)
+LOG_ROTATE_SECONDS = 24 * 3600  # Start a new CSV file after this age (0 = never)
+LOG_COMPRESS_ROTATED = True  # Gzip finished CSV files
+LOG_RETENTION_DAYS = 30  # Delete finished CSV files older than this (0 = keep forever)
+LOG_CHANGES_ONLY = False  # Only write a CSV row when the vehicle counts change...
+LOG_HEARTBEAT_SECONDS = 60  # ...or at least this often
+LOG_ROLLUP_SECONDS = (60, 3600)  # Per-minute and per-hour rollups kept in vehicle_rollups_*.jsonl
+ENABLE_DETECTION_LOG = False  # Also append every box, score and track id to a binary detection log
+
+# Metrics settings
+ENABLE_METRICS = False  # Serve Prometheus-style metrics over HTTP
+METRICS_HOST = "127.0.0.1"  # Use "0.0.0.0" to allow scraping from other machines
+METRICS_PORT = 9108
 
 # Performance settings
 USE_THREADING = True  # Use threading for better performance
@@ -41,4 +83,61 @@ ENABLE_GPU = False  # Set to True if your Pi has GPU support
 OPTIMIZE_NETWORK = True  # Apply network optimization techniques
 OLED_UPDATE_INTERVAL = 5  # Update OLED every N frames to reduce overhead
 BLOB_SIZE = 320  # Input size for YOLO (smaller = faster, less accurate; options: 320, 416, 512)
-MAX_QUEUE_SIZE = 5  # Maximum size of frame queue for threading
+INFERENCE_WORKERS = 0  # Inference processes sharing frames via shared memory (0 = single inference thread)
+INFERENCE_WORKER_THREADS = 1  # OpenCV threads per inference process
+
+# Adaptive control settings (threaded mode)
+ENABLE_ADAPTIVE_CONTROL = False  # Adjust input size and detection interval to hold CONTROL_TARGET_FPS
+CONTROL_TARGET_FPS = 5.0  # Detector runs per second to hold
+CONTROL_BLOB_SIZES = (320, 416, 512)  # Input sizes to switch between (one network is loaded per size)
+CONTROL_MAX_INTERVAL = 6  # Longest detection interval the controller may choose
+CONTROL_PERIOD_SECONDS = 5.0  # How often the controller re-evaluates
+CONTROL_HOLD_PERIODS = 3  # Periods a decision must persist before it is applied
+CONTROL_HYSTERESIS = 0.15  # Dead band around the target FPS (fraction)
+CONTROL_TEMP_HIGH = 75.0  # Degrade above this SoC temperature (the Pi throttles at 80-85C)...
+CONTROL_TEMP_LOW = 68.0  # ...and only upgrade again below this one
+CONTROL_BACKLOG_LIMIT = 0.5  # Share of frames dropped before inference that counts as overloaded
+CONTROL_AUDIT_PATH = "/home/pi/Project/Onroad Final/logs/controller.log"  # Every change is appended here
+
+# Motion gating settings
+ENABLE_MOTION_GATE = False  # Skip the detector while the scene is static and reuse the last results
+MOTION_FRAME_WIDTH = 80  # Width of the grayscale copy compared between frames
+MOTION_PIXEL_THRESHOLD = 20  # Gray level change (0-255) that counts a pixel as changed
+MOTION_SENSITIVITY = 0.001  # Fraction of changed pixels that triggers a detector run (lower = more sensitive)
+MOTION_MAX_SKIP_SECONDS = 5.0  # Run the detector at least this often even if nothing moves
+
+# Tracking settings
+ENABLE_TRACKING = True  # Carry boxes forward between detector runs and count unique vehicles
+TRACK_MAX_AGE = 10  # Frames a vehicle is kept without a matching detection
+TRACK_MIN_HITS = 2  # Detections needed before a vehicle is confirmed and counted
+TRACK_IOU_THRESHOLD = 0.3  # Minimum box overlap to match a detection to a vehicle
+
+# Event recording settings
+ENABLE_RECORDER = False  # Save video clips around detections, including the seconds before them
+RECORD_DIR = "/home/pi/Project/Onroad Final/clips"  # Where event clips are written
+RECORD_PRE_SECONDS = 5.0  # Seconds kept in memory and saved before a detection
+RECORD_POST_SECONDS = 5.0  # Seconds recorded after the last detection
+RECORD_MAX_SECONDS = 60.0  # Longest clip; continuous traffic is split into clips of this length
+RECORD_MIN_VEHICLES = 1  # Vehicles in a detector run that trigger recording
+RECORD_WIDTH = 640  # Frames are shrunk to at most this width before buffering
+RECORD_JPEG_QUALITY = 80  # Buffered frames are kept as JPEGs of this quality (0-100)
+RECORD_BUFFER_MB = 32  # Memory cap of the pre-event ring
+RECORD_QUEUE_SIZE = 8  # Frames waiting for compression before new ones are dropped
+
+# Snapshot settings
+ENABLE_SNAPSHOTS = False  # Save a JPEG thumbnail of detected vehicles
+SNAPSHOT_DIR = "/home/pi/Project/Onroad Final/snapshots"  # Content-addressed store with an index.csv
+SNAPSHOT_MODE = "crop"  # "crop" saves each vehicle box, "frame" the whole frame once per detector run
+SNAPSHOT_WORKERS = 2  # Threads encoding and writing JPEGs
+SNAPSHOT_QUEUE_SIZE = 32  # Snapshots waiting for a worker before new ones are dropped
+SNAPSHOT_MIN_INTERVAL = 10.0  # Seconds between snapshots of the same track (or class, without tracking)
+SNAPSHOT_MAX_SIZE = 320  # Longest side of a saved image in pixels
+SNAPSHOT_PADDING = 0.1  # Margin added around each box (fraction of its size)
+SNAPSHOT_JPEG_QUALITY = 85  # JPEG quality (0-100)
+SNAPSHOT_QUOTA_MB = 500  # Disk space for snapshots; the oldest are deleted beyond it
+
+# Detection event stream settings
+ENABLE_EVENT_STREAM = False  # Publish per-frame detection records to local processes
+EVENT_SOCKET_PATH = "/tmp/onroad-detections.sock"  # UNIX socket clients connect to
+EVENT_QUEUE_SIZE = 64  # Frames queued per client before its oldest are dropped
+EVENT_MAX_SUBSCRIBERS = 8  # Further connections are refused
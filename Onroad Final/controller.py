@@ -0,0 +1,176 @@
+import json
+import os
+import time
+from datetime import datetime
+from metrics import read_cpu_temperature
+from config import (
+    CONTROL_TARGET_FPS,
+    CONTROL_MAX_INTERVAL,
+    CONTROL_PERIOD_SECONDS,
+    CONTROL_HOLD_PERIODS,
+    CONTROL_HYSTERESIS,
+    CONTROL_TEMP_HIGH,
+    CONTROL_TEMP_LOW,
+    CONTROL_BACKLOG_LIMIT,
+    CONTROL_AUDIT_PATH
+)
+
+class AdaptiveController:
+    """Feedback controller for the network input size and the detection interval.
+
+    Every period it compares the processed FPS with the target, using the
+    measured inference latency, the share of frames dropped before inference
+    (backlog) and the SoC temperature:
+    - too hot: smaller input, then a longer interval to shed heat
+    - below target and short of capacity: smaller input
+    - below target with spare capacity: shorter interval
+    - above target and cool: larger input if it is predicted to keep up,
+      otherwise a longer interval to save power
+    A decision must repeat for hold_periods periods before it is applied, and
+    every change is appended to a JSON lines audit log. With `parallelism`
+    detector runs executing at once (inference pool workers), capacity is
+    that many times 1 / latency.
+    """
+
+    def __init__(self, blob_sizes, blob_size, interval, target_fps=CONTROL_TARGET_FPS,
+                 max_interval=CONTROL_MAX_INTERVAL, period=CONTROL_PERIOD_SECONDS,
+                 hold_periods=CONTROL_HOLD_PERIODS, hysteresis=CONTROL_HYSTERESIS,
+                 temp_high=CONTROL_TEMP_HIGH, temp_low=CONTROL_TEMP_LOW,
+                 backlog_limit=CONTROL_BACKLOG_LIMIT, audit_path=CONTROL_AUDIT_PATH,
+                 read_temperature=read_cpu_temperature, parallelism=1):
+        self.blob_sizes = sorted(blob_sizes)
+        self.blob_size = min(self.blob_sizes, key=lambda size: abs(size - blob_size))
+        self.interval = max(1, interval)
+        self.target_fps = target_fps
+        self.max_interval = max_interval
+        self.period = period
+        self.hold_periods = hold_periods
+        self.hysteresis = hysteresis
+        self.temp_high = temp_high
+        self.temp_low = temp_low
+        self.backlog_limit = backlog_limit
+        self.audit_path = audit_path
+        self.read_temperature = read_temperature
+        self.parallelism = max(1, parallelism)
+
+        self.changes = 0
+        self.last_stats = {}
+
+        self._runs = 0
+        self._timed_runs = 0
+        self._latency_sum = 0.0
+        self._window_start = time.monotonic()
+        self._last_captured = None
+        self._last_dropped = None
+        self._pending = None  # (blob_size, interval, reason) waiting out the hold time
+        self._pending_count = 0
+
+    def record(self, inference_seconds):
+        """Record one detector run"""
+        self._runs += 1
+        self._timed_runs += 1
+        self._latency_sum += inference_seconds
+
+    def record_skip(self):
+        """Record a detector run the motion gate made unnecessary; it counts toward the FPS"""
+        self._runs += 1
+
+    def decide(self, fps, latency, backlog, temperature):
+        """Return (blob_size, interval, reason) for the measured state"""
+        index = self.blob_sizes.index(self.blob_size)
+        smaller = self.blob_sizes[index - 1] if index > 0 else None
+        larger = self.blob_sizes[index + 1] if index + 1 < len(self.blob_sizes) else None
+        # Detector runs/s if never idle; each pool worker has its own latency
+        capacity = self.parallelism / latency if latency else float("inf")
+        low = self.target_fps * (1 - self.hysteresis)
+        high = self.target_fps * (1 + self.hysteresis)
+
+        if temperature is not None and temperature >= self.temp_high:
+            if smaller:
+                return smaller, self.interval, f"temperature {temperature:.1f}C"
+            if self.interval < self.max_interval:
+                return self.blob_size, self.interval + 1, f"temperature {temperature:.1f}C"
+        elif fps < low:
+            if capacity < high or backlog > self.backlog_limit:
+                if smaller:
+                    return smaller, self.interval, f"{fps:.1f} FPS below target, latency {latency * 1000:.0f} ms"
+            elif self.interval > 1:
+                return self.blob_size, self.interval - 1, f"{fps:.1f} FPS below target with spare capacity"
+        elif fps > high and (temperature is None or temperature <= self.temp_low):
+            # Cost grows with the number of input pixels; only upgrade on measured latency
+            if larger and latency and capacity * (self.blob_size / larger) ** 2 >= high:
+                return larger, self.interval, f"{fps:.1f} FPS above target, capacity {capacity:.1f}/s"
+            if self.interval < self.max_interval and fps * self.interval / (self.interval + 1) >= low:
+                return self.blob_size, self.interval + 1, f"{fps:.1f} FPS above target"
+        return self.blob_size, self.interval, None
+
+    def step(self, captured_frames, dropped_frames):
+        """Re-evaluate once per period; returns True if the settings changed
+
+        Args:
+            captured_frames: Total frames captured so far
+            dropped_frames: Total frames overwritten before inference took them
+        """
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < self.period:
+            return False
+
+        fps = self._runs / elapsed
+        latency = self._latency_sum / self._timed_runs if self._timed_runs else 0.0
+        backlog = 0.0
+        if self._last_captured is not None and captured_frames > self._last_captured:
+            backlog = (dropped_frames - self._last_dropped) / (captured_frames - self._last_captured)
+        temperature = self.read_temperature()
+        self.last_stats = {"fps": fps, "latency_ms": latency * 1000, "backlog": backlog,
+                           "temperature": temperature}
+
+        self._runs = 0
+        self._timed_runs = 0
+        self._latency_sum = 0.0
+        self._window_start = now
+        self._last_captured = captured_frames
+        self._last_dropped = dropped_frames
+
+        blob_size, interval, reason = self.decide(fps, latency, backlog, temperature)
+        if reason is None:
+            self._pending = None
+            self._pending_count = 0
+            return False
+
+        # Hysteresis: only act on a decision that keeps coming back
+        if self._pending is not None and self._pending[:2] == (blob_size, interval):
+            self._pending_count += 1
+        else:
+            self._pending = (blob_size, interval, reason)
+            self._pending_count = 1
+        if self._pending_count < self.hold_periods:
+            return False
+
+        self._apply(blob_size, interval, reason)
+        return True
+
+    def _apply(self, blob_size, interval, reason):
+        change = {
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "blob_size": [self.blob_size, blob_size],
+            "interval": [self.interval, interval],
+            "reason": reason,
+            **{key: round(value, 2) if value is not None else None
+               for key, value in self.last_stats.items()},
+        }
+        print(f"Controller: blob {self.blob_size} -> {blob_size}, interval {self.interval} -> {interval} "
+              f"({reason})")
+        self.blob_size = blob_size
+        self.interval = interval
+        self.changes += 1
+        self._pending = None
+        self._pending_count = 0
+
+        if self.audit_path:
+            try:
+                os.makedirs(os.path.dirname(self.audit_path), exist_ok=True)
+                with open(self.audit_path, "a") as f:
+                    f.write(json.dumps(change) + "\n")
+            except OSError as e:
+                print(f"Error writing controller audit log: {e}")
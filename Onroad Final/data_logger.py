@@ -1,42 +1,313 @@
 import csv
+import glob
+import gzip
+import json
 import os
+import queue
+import shutil
+import threading
 import time
 from datetime import datetime
+from config import (
+    LOG_QUEUE_SIZE,
+    LOG_FLUSH_ROWS,
+    LOG_FLUSH_INTERVAL,
+    LOG_ROTATE_BYTES,
+    LOG_ROTATE_SECONDS,
+    LOG_COMPRESS_ROTATED,
+    LOG_RETENTION_DAYS,
+    LOG_CHANGES_ONLY,
+    LOG_HEARTBEAT_SECONDS,
+    LOG_ROLLUP_SECONDS
+)
+
+CSV_HEADER = [
+    'Timestamp', 'Total_Vehicles', 'Cars', 'Trucks',
+    'Buses', 'Bicycles', 'Motorbikes', 'FPS'
+]
+ROLLUP_FIELDS = ['total', 'cars', 'trucks', 'buses', 'bicycles', 'motorbikes']
+
+class TimeRollup:
+    """Running per-bucket statistics for one time resolution.
+
+    add() is O(1): it updates sums and maxima of the current bucket and only
+    returns a finished record when a sample falls into a new bucket.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._start = None
+        self._end = None
+
+    def _reset(self, start):
+        self._start = start
+        self._end = start + self.seconds
+        self._frames = 0
+        self._sums = [0] * len(ROLLUP_FIELDS)
+        self._maxima = [0] * len(ROLLUP_FIELDS)
+        self._fps_sum = 0.0
+        self._fps_min = float("inf")
+
+    def add(self, timestamp, counts, fps):
+        """Add one frame; returns the finished bucket record when the bucket changes"""
+        finished = None
+        if self._start is None or not self._start <= timestamp < self._end:
+            # Buckets follow the local clock (like analyze_data.py), not UTC:
+            # with a +05:30 offset an hourly bucket still starts at :00
+            offset = time.localtime(timestamp).tm_gmtoff
+            start = timestamp - (timestamp + offset) % self.seconds
+            finished = self.flush()
+            self._reset(start)
+
+        self._frames += 1
+        for i, count in enumerate(counts):
+            self._sums[i] += count
+            if count > self._maxima[i]:
+                self._maxima[i] = count
+        self._fps_sum += fps
+        if fps < self._fps_min:
+            self._fps_min = fps
+        return finished
+
+    def flush(self):
+        """Return the current (possibly partial) bucket as a record, or None if empty"""
+        if self._start is None or self._frames == 0:
+            return None
+        frames = self._frames
+        return {
+            "resolution": self.seconds,
+            "start": datetime.fromtimestamp(self._start).strftime("%Y-%m-%d %H:%M:%S"),
+            "frames": frames,
+            "count": dict(zip(ROLLUP_FIELDS, self._sums)),
+            "mean": {field: round(total / frames, 3) for field, total in zip(ROLLUP_FIELDS, self._sums)},
+            "max": dict(zip(ROLLUP_FIELDS, self._maxima)),
+            "fps_min": round(float(self._fps_min), 2),
+            "fps_mean": round(self._fps_sum / frames, 2),
+        }
+
+def read_rollups(log_dir, resolution=None):
+    """Load rollup records from every sidecar index in a directory, oldest first"""
+    records = []
+    for path in sorted(glob.glob(os.path.join(log_dir, "vehicle_rollups_*.jsonl"))):
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Partly written last line
+                if resolution is None or record["resolution"] == resolution:
+                    records.append(record)
+    records.sort(key=lambda record: (record["resolution"], record["start"]))
+    return records
 
 class VehicleDataLogger:
-    def __init__(self, log_dir="/home/pi/Project/Onroad Final/data_logs"):
+    """Per-frame vehicle counts written to CSV by a background thread.
+
+    log_data() only formats a row and puts it on a bounded queue, so SD card
+    stalls never reach the caller. The writer thread batches rows, flushes on
+    a row count or time limit, and rotates, compresses and expires files.
+
+    Every frame also updates per-minute/per-hour rollups, which are appended to
+    a small vehicle_rollups_*.jsonl sidecar as each bucket closes. With
+    changes_only set, raw rows are only written when the counts change or
+    when heartbeat_seconds have passed since the last row.
+    """
+
+    def __init__(self, log_dir="/home/pi/Project/Onroad Final/data_logs",
+                 flush_rows=LOG_FLUSH_ROWS, flush_interval=LOG_FLUSH_INTERVAL,
+                 queue_size=LOG_QUEUE_SIZE, rotate_bytes=LOG_ROTATE_BYTES,
+                 rotate_seconds=LOG_ROTATE_SECONDS, compress=LOG_COMPRESS_ROTATED,
+                 retention_days=LOG_RETENTION_DAYS, changes_only=LOG_CHANGES_ONLY,
+                 heartbeat_seconds=LOG_HEARTBEAT_SECONDS, rollup_seconds=LOG_ROLLUP_SECONDS):
         self.log_dir = log_dir
         os.makedirs(log_dir, exist_ok=True)
-        
+
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+        self.retention_days = retention_days
+        self.changes_only = changes_only
+        self.heartbeat_seconds = heartbeat_seconds
+
+        self.dropped_rows = 0  # Rows discarded because the queue was full
+        self.written_rows = 0
+        self.skipped_rows = 0  # Unchanged rows left out in changes_only mode
+
+        self._rollups = [TimeRollup(seconds) for seconds in rollup_seconds]
+        self._last_counts = None
+        self._last_row_time = 0.0
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = object()  # Sentinel that ends the writer thread
+
         # Create a new CSV file for each session
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.csv_path = os.path.join(log_dir, f"vehicle_data_{timestamp}.csv")
-        
-        # Initialize CSV file with headers
-        with open(self.csv_path, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow([
-                'Timestamp', 'Total_Vehicles', 'Cars', 'Trucks', 
-                'Buses', 'Bicycles', 'Motorbikes', 'FPS'
-            ])
-        
+        self._open_new_file()
+        session = os.path.basename(self.csv_path)[len("vehicle_data_"):-len(".csv")]
+        self.rollup_path = os.path.join(self.log_dir, f"vehicle_rollups_{session}.jsonl")
+        self._remove_expired()
+
+        self._thread = threading.Thread(target=self._writer_loop, name="data-logger", daemon=True)
+        self._thread.start()
+
         print(f"Data logger initialized, saving to: {self.csv_path}")
-    
+
+    def _open_new_file(self):
+        """Start a new CSV file with headers"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.csv_path = os.path.join(self.log_dir, f"vehicle_data_{timestamp}.csv")
+        suffix = 1
+        while os.path.exists(self.csv_path) or os.path.exists(self.csv_path + ".gz"):
+            self.csv_path = os.path.join(self.log_dir, f"vehicle_data_{timestamp}_{suffix}.csv")
+            suffix += 1
+
+        self._file = open(self.csv_path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(CSV_HEADER)
+        self._file.flush()
+        self._file_opened = time.monotonic()
+
     def log_data(self, vehicle_count, vehicle_types, fps):
-        """Log detection data to CSV file"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
+        """Queue detection data for the CSV file without blocking"""
+        now = time.time()
+
         # Extract vehicle counts by type (0 if not detected)
         cars = vehicle_types.get('car', 0)
         trucks = vehicle_types.get('truck', 0)
         buses = vehicle_types.get('bus', 0)
         bicycles = vehicle_types.get('bicycle', 0)
-        motorbikes = vehicle_types.get('motorbike', 0)
-        
-        # Write to CSV
-        with open(self.csv_path, 'a', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow([
-                timestamp, vehicle_count, cars, trucks, 
-                buses, bicycles, motorbikes, round(fps, 2)
-            ])
+        # YOLOv5 class lists call them 'motorcycle'
+        motorbikes = vehicle_types.get('motorbike', 0) + vehicle_types.get('motorcycle', 0)
+        counts = (vehicle_count, cars, trucks, buses, bicycles, motorbikes)
+
+        # Rollups see every frame, even those left out of the CSV
+        for rollup in self._rollups:
+            finished = rollup.add(now, counts, fps)
+            if finished:
+                self._enqueue(finished)
+
+        if (self.changes_only and counts == self._last_counts and
+                now - self._last_row_time < self.heartbeat_seconds):
+            self.skipped_rows += 1
+            return
+        self._last_counts = counts
+        self._last_row_time = now
+
+        timestamp = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+        self._enqueue([timestamp, *counts, round(fps, 2)])
+
+    def _enqueue(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped_rows += 1
+
+    def _writer_loop(self):
+        """Writer thread: batch rows and write them on the flush policy"""
+        batch = []
+        rollups = []
+        last_flush = time.monotonic()
+        running = True
+
+        while running:
+            timeout = max(0.0, last_flush + self.flush_interval - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+                # Drain whatever else is already waiting
+                while True:
+                    if item is self._stop:
+                        running = False
+                        break
+                    if isinstance(item, dict):
+                        rollups.append(item)
+                    else:
+                        batch.append(item)
+                    if len(batch) >= self.flush_rows:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            if rollups:
+                try:
+                    self._write_rollups(rollups)
+                except Exception as e:
+                    print(f"Error writing vehicle rollups: {e}")
+                rollups = []
+
+            now = time.monotonic()
+            if batch and (len(batch) >= self.flush_rows or
+                          now - last_flush >= self.flush_interval or not running):
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    print(f"Error writing vehicle data: {e}")
+                batch = []
+            if now - last_flush >= self.flush_interval:
+                last_flush = now
+
+        self._file.close()
+
+    def _write_batch(self, rows):
+        """Append rows to the current file, rotating it when it is too big or old"""
+        self._writer.writerows(rows)
+        self._file.flush()
+        self.written_rows += len(rows)
+
+        too_big = self.rotate_bytes and self._file.tell() >= self.rotate_bytes
+        too_old = (self.rotate_seconds and
+                   time.monotonic() - self._file_opened >= self.rotate_seconds)
+        if too_big or too_old:
+            self._rotate()
+
+    def _write_rollups(self, records):
+        """Append finished rollup buckets to the sidecar index"""
+        with open(self.rollup_path, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(',', ':')) + "\n")
+
+    def _rotate(self):
+        """Close the current file, compress it and start a new one"""
+        self._file.close()
+        finished_path = self.csv_path
+        self._open_new_file()
+
+        if self.compress:
+            with open(finished_path, 'rb') as src, gzip.open(finished_path + ".gz", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(finished_path)
+
+        self._remove_expired()
+
+    def _remove_expired(self):
+        """Delete finished log files older than the retention period"""
+        if not self.retention_days:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        paths = glob.glob(os.path.join(self.log_dir, "vehicle_data_*.csv*"))
+        paths += glob.glob(os.path.join(self.log_dir, "vehicle_rollups_*.jsonl"))
+        for path in paths:
+            if path in (self.csv_path, self.rollup_path):
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def close(self):
+        """Write out everything still queued and stop the writer thread"""
+        if not self._thread.is_alive():
+            return
+        # Keep the partial buckets of this session
+        for rollup in self._rollups:
+            record = rollup.flush()
+            if record:
+                self._queue.put(record)
+        self._queue.put(self._stop)
+        self._thread.join()
+        if self.dropped_rows:
+            print(f"Data logger dropped {self.dropped_rows} rows (queue full)")
+        if self.skipped_rows:
+            print(f"Data logger left out {self.skipped_rows} unchanged rows")
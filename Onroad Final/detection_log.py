@@ -0,0 +1,290 @@
+import argparse
+import csv
+import glob
+import gzip
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+import numpy as np
+
+# One fixed-width little-endian record per detection. Frames without any
+# detection get a single marker record with class_id -1 so every processed
+# frame's timestamp is kept.
+DETECTION_RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),  # Unix time the frame was captured
+    ('frame_seq', '<u4'),
+    ('box', '<i2', (4,)),  # x, y, w, h in frame pixels
+    ('class_id', '<i2'),
+    ('score', '<f4'),
+    ('track_id', '<i4'),
+])
+
+FILE_MAGIC = b"ONRDDET1"
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('record_size', '<u4'), ('reserved', '<u4')])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+
+# Column layout of the compressed per-frame archive made from CSV sessions
+CSV_COLUMNS = [
+    ('Timestamp', 'timestamp', '<f8'),
+    ('Total_Vehicles', 'total', '<u2'),
+    ('Cars', 'cars', '<u2'),
+    ('Trucks', 'trucks', '<u2'),
+    ('Buses', 'buses', '<u2'),
+    ('Bicycles', 'bicycles', '<u2'),
+    ('Motorbikes', 'motorbikes', '<u2'),
+    ('FPS', 'fps', '<f4'),
+]
+
+def make_records(timestamp, frame_seq, detections):
+    """Build detection records for one frame from a utils.DETECTION_DTYPE array"""
+    if len(detections) == 0:
+        records = np.zeros(1, dtype=DETECTION_RECORD_DTYPE)
+        records['class_id'] = -1
+        records['track_id'] = -1
+    else:
+        records = np.empty(len(detections), dtype=DETECTION_RECORD_DTYPE)
+        records['box'] = np.clip(detections['box'], -32768, 32767)
+        records['class_id'] = detections['class_id']
+        records['score'] = detections['score']
+        records['track_id'] = detections['track_id']
+    records['timestamp'] = timestamp
+    records['frame_seq'] = frame_seq
+    return records
+
+class DetectionLogWriter:
+    """Append-only binary log of raw detections, written by a background thread"""
+
+    def __init__(self, log_dir="/home/pi/Project/Onroad Final/data_logs", queue_size=1000,
+                 flush_interval=5.0):
+        os.makedirs(log_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.flush_interval = flush_interval
+        self.dropped_frames = 0
+
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header['magic'] = FILE_MAGIC
+        header['record_size'] = DETECTION_RECORD_DTYPE.itemsize
+        # Never overwrite a log, e.g. of a session restarted within the same second
+        suffix = 0
+        while True:
+            name = f"detections_{timestamp}_{suffix}.bin" if suffix else f"detections_{timestamp}.bin"
+            self.path = os.path.join(log_dir, name)
+            try:
+                self._file = open(self.path, 'xb', buffering=64 * 1024)
+                break
+            except FileExistsError:
+                suffix += 1
+        self._file.write(header.tobytes())
+        self._file.flush()
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = object()
+        self._thread = threading.Thread(target=self._writer_loop, name="detection-log", daemon=True)
+        self._thread.start()
+
+        print(f"Detection log initialized, saving to: {self.path}")
+
+    def append(self, timestamp, frame_seq, detections):
+        """Queue one frame's detections without blocking"""
+        try:
+            self._queue.put_nowait(make_records(timestamp, frame_seq, detections))
+        except queue.Full:
+            self.dropped_frames += 1
+
+    def _writer_loop(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                records = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                records = None
+            if records is self._stop:
+                break
+            if records is not None:
+                self._file.write(records.tobytes())
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self._file.flush()
+                last_flush = time.monotonic()
+        self._file.close()
+
+    def close(self):
+        """Write out everything still queued and close the file"""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(self._stop)
+        self._thread.join()
+
+class DetectionLogReader:
+    """Memory-mapped, zero-parse access to a binary detection log"""
+
+    def __init__(self, path):
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0:
+            # Created but never written to (e.g. the process was killed at startup)
+            self.records = np.empty(0, dtype=DETECTION_RECORD_DTYPE)
+            return
+        if header['magic'][0] != FILE_MAGIC:
+            raise ValueError(f"{path} is not a detection log")
+        if header['record_size'][0] != DETECTION_RECORD_DTYPE.itemsize:
+            raise ValueError(f"{path} uses an unsupported record size")
+
+        # Ignore a partly written trailing record (e.g. after a power cut)
+        count = (os.path.getsize(path) - HEADER_SIZE) // DETECTION_RECORD_DTYPE.itemsize
+        if count > 0:
+            self.records = np.memmap(path, dtype=DETECTION_RECORD_DTYPE, mode='r',
+                                     offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.empty(0, dtype=DETECTION_RECORD_DTYPE)
+        self._sorted = None
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def is_sorted(self):
+        """True if the timestamps never go backwards (the wall clock was not stepped back)"""
+        if self._sorted is None:
+            timestamps = self.records['timestamp']
+            self._sorted = bool(np.all(timestamps[1:] >= timestamps[:-1]))
+        return self._sorted
+
+    @property
+    def time_range(self):
+        """(earliest, latest) timestamp in the log, or None if empty"""
+        if len(self.records) == 0:
+            return None
+        timestamps = self.records['timestamp']
+        if self.is_sorted:
+            return float(timestamps[0]), float(timestamps[-1])
+        return float(timestamps.min()), float(timestamps.max())
+
+    def query(self, start_time=None, end_time=None, include_empty_frames=False):
+        """Return records with start_time <= timestamp < end_time
+
+        Timestamps are wall-clock times appended in order, so this is normally
+        a binary search on the map. If the clock was stepped back (e.g. by NTP
+        on a Pi without a real-time clock) every record is checked instead.
+        """
+        timestamps = self.records['timestamp']
+        if self.is_sorted:
+            lo = 0 if start_time is None else np.searchsorted(timestamps, start_time, side='left')
+            hi = len(timestamps) if end_time is None else np.searchsorted(timestamps, end_time, side='left')
+            records = self.records[lo:hi]
+        else:
+            mask = np.ones(len(timestamps), dtype=bool)
+            if start_time is not None:
+                mask &= timestamps >= start_time
+            if end_time is not None:
+                mask &= timestamps < end_time
+            records = self.records[mask]
+        if not include_empty_frames:
+            records = records[records['class_id'] >= 0]
+        return records
+
+def query_detection_logs(log_dir, start_time=None, end_time=None, include_empty_frames=False):
+    """Return matching records from every detection log in a directory, in time order"""
+    parts = []
+    for path in sorted(glob.glob(os.path.join(log_dir, "detections_*.bin"))):
+        reader = DetectionLogReader(path)
+        time_range = reader.time_range
+        if time_range is None:
+            continue
+        # Skip files entirely outside the requested window without touching their data
+        if start_time is not None and time_range[1] < start_time:
+            continue
+        if end_time is not None and time_range[0] >= end_time:
+            continue
+        parts.append(np.array(reader.query(start_time, end_time, include_empty_frames)))
+    if not parts:
+        return np.empty(0, dtype=DETECTION_RECORD_DTYPE)
+    return np.concatenate(parts)
+
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rt', newline='')
+    return open(path, newline='')
+
+def read_csv_session(path):
+    """Parse a VehicleDataLogger CSV (optionally gzipped) into a structured array"""
+    dtype = np.dtype([(name, kind) for _, name, kind in CSV_COLUMNS])
+    rows = []
+    with _open_text(path) as f:
+        for row in csv.DictReader(f):
+            try:
+                timestamp = datetime.strptime(row['Timestamp'], "%Y-%m-%d %H:%M:%S").timestamp()
+                rows.append((timestamp,) + tuple(
+                    float(row[column]) if kind == '<f4' else int(row[column])
+                    for column, _, kind in CSV_COLUMNS[1:]))
+            except (KeyError, ValueError):
+                continue  # Skip truncated or malformed rows
+    return np.array(rows, dtype=dtype)
+
+def write_archive(path, table, kind):
+    """Save a structured array as a compressed columnar .npz archive"""
+    columns = {name: table[name] for name in table.dtype.names}
+    np.savez_compressed(path, kind=np.array(kind), **columns)
+
+def load_archive(path):
+    """Load an archive written by write_archive back into (kind, structured array)"""
+    with np.load(path) as archive:
+        kind = str(archive['kind'])
+        names = [name for name in archive.files if name != 'kind']
+        reference = DETECTION_RECORD_DTYPE if kind == "detections" else np.dtype(
+            [(name, dtype) for _, name, dtype in CSV_COLUMNS])
+        table = np.empty(len(archive[names[0]]) if names else 0, dtype=reference)
+        for name in reference.names:
+            table[name] = archive[name]
+    return kind, table
+
+def compact(paths, older_than_days=0, remove=False):
+    """Convert CSV sessions and binary detection logs to compressed .npz archives"""
+    cutoff = time.time() - older_than_days * 86400
+    for path in paths:
+        if os.path.getmtime(path) > cutoff:
+            continue
+        base = path
+        for suffix in (".gz", ".csv", ".bin"):
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+        archive_path = base + ".npz"
+        if os.path.exists(archive_path):
+            print(f"Skipping {path}: {archive_path} already exists")
+            continue
+
+        if path.endswith(".bin"):
+            table = np.array(DetectionLogReader(path).records)
+            kind = "detections"
+        else:
+            table = read_csv_session(path)
+            kind = "frames"
+        write_archive(archive_path, table, kind)
+
+        before = os.path.getsize(path)
+        after = os.path.getsize(archive_path)
+        print(f"{path}: {len(table)} rows, {before / 1024:.1f} KB -> {after / 1024:.1f} KB")
+        if remove:
+            os.remove(path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compact vehicle logs into compressed columnar archives')
+    parser.add_argument('paths', nargs='+',
+                        help='CSV sessions (.csv/.csv.gz), detection logs (.bin) or directories')
+    parser.add_argument('--older-than-days', type=float, default=0,
+                        help='Only compact files last modified before this many days ago')
+    parser.add_argument('--remove', action='store_true', help='Delete the originals after compaction')
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, "vehicle_data_*.csv*")))
+            files += sorted(glob.glob(os.path.join(path, "detections_*.bin")))
+        else:
+            files.append(path)
+    compact(files, args.older_than_days, args.remove)
+
+if __name__ == "__main__":
+    main()
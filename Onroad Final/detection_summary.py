@@ -0,0 +1,135 @@
+import argparse
+import logging
+import os
+import tempfile
+import time
+import numpy as np
+from config import LOG_DETECTIONS, LOG_SUMMARY_SECONDS
+
+logger = logging.getLogger("detections")
+
+class DetectionSummary:
+    """Aggregates detector runs and logs one summary line per interval.
+
+    add() runs on the inference thread, so it only updates a few counters
+    (one numpy call per run, whatever the traffic). Every `interval` seconds
+    a single line with runs, vehicles per class, mean score and the busiest
+    run is logged. With the log level at DEBUG each box is logged as well.
+    Log records go through the queue set up by utils.setup_logging, so the
+    file write happens on the listener thread.
+    """
+
+    def __init__(self, interval=LOG_SUMMARY_SECONDS, enabled=LOG_DETECTIONS):
+        self.interval = interval
+        self.enabled = enabled
+        self.classes = None
+        self._start = time.monotonic()
+        self._runs = 0
+        self._counts = None
+        self._score_sum = 0.0
+        self._peak = 0
+
+    def add(self, detections, classes):
+        """Count one detector run's vehicle detections"""
+        if not self.enabled:
+            return
+        if self._counts is None:
+            self.classes = classes
+            self._counts = np.zeros(len(classes), dtype=np.int64)
+        self._runs += 1
+        if len(detections):
+            np.add.at(self._counts, detections['class_id'], 1)
+            self._score_sum += float(detections['score'].sum())
+            self._peak = max(self._peak, len(detections))
+            if logger.isEnabledFor(logging.DEBUG):
+                for class_id, score in zip(detections['class_id'].tolist(), detections['score'].tolist()):
+                    logger.debug(f"Detected {classes[class_id]} with confidence {score:.2f}")
+        if time.monotonic() - self._start >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """Log the summary of the current interval and start a new one"""
+        now = time.monotonic()
+        if self._runs:
+            total = int(self._counts.sum())
+            per_class = ", ".join(f"{self.classes[i]}: {self._counts[i]}"
+                                  for i in np.argsort(-self._counts) if self._counts[i])
+            mean_score = self._score_sum / total if total else 0.0
+            logger.info(f"Last {now - self._start:.0f} s: {self._runs} detector runs, {total} vehicles"
+                        f"{f' ({per_class})' if per_class else ''}, mean confidence {mean_score:.2f}, "
+                        f"at most {self._peak} in one run")
+            self._counts[:] = 0
+        self._start = now
+        self._runs = 0
+        self._score_sum = 0.0
+        self._peak = 0
+
+def _rush_hour_runs(num_runs, vehicles, num_classes, seed=0):
+    """Detection arrays like a busy road produces"""
+    from utils import DETECTION_DTYPE
+
+    rng = np.random.default_rng(seed)
+    runs = []
+    for _ in range(num_runs):
+        detections = np.zeros(vehicles, dtype=DETECTION_DTYPE)
+        detections['class_id'] = rng.choice([2, 3, 5, 7], vehicles) % num_classes
+        detections['score'] = rng.uniform(0.5, 0.99, vehicles)
+        runs.append(detections)
+    return runs
+
+def benchmark(num_runs=500, vehicles=25):
+    """Time the logging work left on the inference thread, per-box file logging versus queued summaries"""
+    from logging.handlers import QueueHandler, QueueListener
+    import queue
+
+    classes = [f"class{i}" for i in range(80)]
+    runs = _rush_hour_runs(num_runs, vehicles, len(classes))
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        # Before: one synchronous file write per box on the inference thread
+        handler = logging.FileHandler(os.path.join(log_dir, "per_box.log"))
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        root.addHandler(handler)
+        start = time.perf_counter()
+        for detections in runs:
+            for class_id, score in zip(detections['class_id'].tolist(), detections['score'].tolist()):
+                logging.info(f"Detected {classes[class_id]} with confidence {score:.2f}")
+        results["per-box lines, file handler"] = time.perf_counter() - start
+        root.removeHandler(handler)
+        handler.close()
+
+        # After: aggregated summaries handed to a listener thread
+        file_handler = logging.FileHandler(os.path.join(log_dir, "summary.log"))
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, file_handler)
+        queue_handler = QueueHandler(log_queue)
+        root.addHandler(queue_handler)
+        listener.start()
+        summary = DetectionSummary(interval=0.05, enabled=True)
+        start = time.perf_counter()
+        for detections in runs:
+            summary.add(detections, classes)
+        results["summaries, queue handler"] = time.perf_counter() - start
+        listener.stop()
+        root.removeHandler(queue_handler)
+        file_handler.close()
+
+    baseline = results["per-box lines, file handler"]
+    print(f"\nLogging cost on the inference thread: {num_runs} detector runs, {vehicles} vehicles each")
+    print("| Method                      | Total ms | us per run |")
+    print("|-----------------------------|----------|------------|")
+    for name, seconds in results.items():
+        print(f"| {name:27} | {seconds * 1000:8.1f} | {seconds / num_runs * 1e6:10.1f} |")
+    reclaimed = baseline - results["summaries, queue handler"]
+    print(f"Reclaimed: {reclaimed / num_runs * 1e6:.0f} us per detector run "
+          f"({reclaimed / baseline * 100:.0f}% of the logging time)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark detection logging on the inference thread')
+    parser.add_argument('--runs', type=int, default=500, help='Detector runs to simulate')
+    parser.add_argument('--vehicles', type=int, default=25, help='Vehicles per run (rush hour)')
+    args = parser.parse_args()
+    benchmark(args.runs, args.vehicles)
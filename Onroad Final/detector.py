@@ -0,0 +1,190 @@
+import os
+import numpy as np
+import cv2
+from config import (
+    MODEL_PATH,
+    CONFIG_PATH,
+    ONNX_MODEL_PATH,
+    TORCHSCRIPT_MODEL_PATH,
+    DETECTOR_BACKEND,
+    EXPORTED_MODEL_INPUT_SIZE,
+    DETECTOR_THREADS,
+    ENABLE_GPU,
+    BLOB_SIZE,
+    CONFIDENCE_THRESHOLD,
+    NMS_THRESHOLD
+)
+from utils import get_output_layers, decode_detections
+from preprocess import BlobPreprocessor
+
+def decode_yolov5(output, frame_width, frame_height, input_size, classes, conf_threshold, nms_threshold):
+    """Decode a YOLOv5 output of shape (1, N, 5 + num_classes) into vehicle detections
+
+    YOLOv5 boxes are in input pixels and its class scores still have to be
+    multiplied by the objectness, so the rows are converted to the darknet
+    layout and share decode_detections with the YOLOv4-tiny path.
+    """
+    rows = output.reshape(-1, output.shape[-1])
+    # No class score can beat the objectness; dropping weak rows first keeps the rest cheap
+    rows = rows[rows[:, 4] > conf_threshold]  # Boolean indexing copies, so the edits below are safe
+    rows[:, :4] /= input_size
+    rows[:, 5:] *= rows[:, 4:5]
+    return decode_detections([rows], frame_width, frame_height, classes, conf_threshold, nms_threshold)
+
+class Detector:
+    """Common interface of the detection backends.
+
+    detect() runs three steps that can be timed separately: preprocess
+    (BGR frame to network input), infer (the engine) and decode (raw outputs
+    to a DETECTION_DTYPE array in frame pixels). Preprocessing and decoding are
+    shared, so backends only differ in the engine that runs the network.
+    """
+
+    name = None
+    resizable = False  # True if any multiple of 32 works as input size
+
+    def __init__(self, classes, input_size, conf_threshold=CONFIDENCE_THRESHOLD,
+                 nms_threshold=NMS_THRESHOLD):
+        self.classes = classes
+        self.input_size = input_size
+        self.conf_threshold = conf_threshold
+        self.nms_threshold = nms_threshold
+        self.preprocessor = BlobPreprocessor(input_size)
+
+    def preprocess(self, frame):
+        """Return the network input for a BGR frame (a reused buffer)"""
+        return self.preprocessor(frame)
+
+    def infer(self, blob):
+        """Run the network on a preprocessed input and return its raw outputs"""
+        raise NotImplementedError
+
+    def decode(self, outputs, frame_width, frame_height):
+        """Turn raw outputs into detections for a frame of the given size"""
+        return decode_yolov5(outputs, frame_width, frame_height, self.input_size, self.classes,
+                             self.conf_threshold, self.nms_threshold)
+
+    def detect(self, frame):
+        """Return the vehicle detections in a BGR frame"""
+        outputs = self.infer(self.preprocess(frame))
+        return self.decode(outputs, frame.shape[1], frame.shape[0])
+
+    def warm_up(self):
+        """Run one inference so the first real frame isn't slow"""
+        self.infer(np.zeros((1, 3, self.input_size, self.input_size), dtype=np.float32))
+
+def _check_model_file(path):
+    if not path or not os.path.exists(path):
+        raise FileNotFoundError(f"Model file not found: {path}")
+
+class OpenCVDetector(Detector):
+    """OpenCV DNN: YOLOv4-tiny darknet weights, or a YOLOv5 ONNX model"""
+
+    name = "opencv"
+
+    def __init__(self, classes, input_size=BLOB_SIZE, model_path=MODEL_PATH, config_path=CONFIG_PATH,
+                 threads=DETECTOR_THREADS, **kwargs):
+        _check_model_file(model_path)
+        self.darknet = not model_path.endswith(".onnx")
+        if self.darknet:
+            _check_model_file(config_path)
+            self.net = cv2.dnn.readNet(model_path, config_path)
+        else:
+            self.net = cv2.dnn.readNet(model_path)
+            input_size = EXPORTED_MODEL_INPUT_SIZE
+        # Darknet YOLO rescales its grids to whatever input it is given
+        self.resizable = self.darknet
+        super().__init__(classes, input_size, **kwargs)
+
+        # Use GPU if available and enabled
+        if ENABLE_GPU:
+            print("Attempting to use GPU for inference")
+            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA)
+        else:
+            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        if threads:
+            cv2.setNumThreads(threads)
+        self.output_layers = get_output_layers(self.net)
+
+    def infer(self, blob):
+        self.net.setInput(blob)
+        return self.net.forward(self.output_layers)
+
+    def decode(self, outputs, frame_width, frame_height):
+        if self.darknet:
+            return decode_detections(outputs, frame_width, frame_height, self.classes,
+                                     self.conf_threshold, self.nms_threshold)
+        return super().decode(outputs[0], frame_width, frame_height)
+
+class OnnxRuntimeDetector(Detector):
+    """ONNX Runtime on the CPU with a YOLOv5 ONNX export"""
+
+    name = "onnxruntime"
+
+    def __init__(self, classes, input_size=BLOB_SIZE, model_path=ONNX_MODEL_PATH,
+                 threads=DETECTOR_THREADS, **kwargs):
+        # Imported here so the other backends work without onnxruntime installed
+        import onnxruntime
+
+        _check_model_file(model_path)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path, options,
+                                                    providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+
+        # Models exported with a fixed shape only accept that size
+        height = model_input.shape[2]
+        self.resizable = not isinstance(height, int)
+        if not self.resizable:
+            input_size = height
+        super().__init__(classes, input_size, **kwargs)
+
+    def infer(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+class TorchScriptDetector(Detector):
+    """PyTorch on the CPU with a YOLOv5 TorchScript export"""
+
+    name = "torchscript"
+
+    def __init__(self, classes, input_size=BLOB_SIZE, model_path=TORCHSCRIPT_MODEL_PATH,
+                 threads=DETECTOR_THREADS, model=None, **kwargs):
+        # Imported here so the other backends work without PyTorch installed
+        import torch
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.torch = torch
+        # A module already loaded by model_registry.load_model is traced at input_size
+        if model is None:
+            _check_model_file(model_path)
+            model = torch.jit.load(model_path, map_location="cpu")
+            # A traced YOLOv5 has its grids baked in for the export size
+            input_size = EXPORTED_MODEL_INPUT_SIZE
+        self.model = model.eval()
+        super().__init__(classes, input_size, **kwargs)
+
+    def infer(self, blob):
+        with self.torch.inference_mode():
+            output = self.model(self.torch.from_numpy(blob))
+        if isinstance(output, (list, tuple)):
+            output = output[0]
+        return output.numpy()
+
+BACKENDS = {
+    "opencv": OpenCVDetector,
+    "onnxruntime": OnnxRuntimeDetector,
+    "torchscript": TorchScriptDetector,
+}
+
+def create_detector(classes, input_size=BLOB_SIZE, backend=DETECTOR_BACKEND, **kwargs):
+    """Create a detector for the configured (or given) backend"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown detector backend {backend!r} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[backend](classes, input_size, **kwargs)
@@ -0,0 +1,252 @@
+import argparse
+import collections
+import os
+import socket
+import struct
+import threading
+import time
+import numpy as np
+from config import EVENT_SOCKET_PATH, EVENT_QUEUE_SIZE, EVENT_MAX_SUBSCRIBERS
+
+# Wire format. Every message is a little-endian u32 payload length followed by
+# the payload. The first message on a connection is the hello: STREAM_MAGIC
+# followed by the class names, one per line. Every later message is one frame:
+# FRAME_HEADER followed by num_records EVENT_RECORD_DTYPE records.
+STREAM_MAGIC = b"ONRDEVT1"
+LENGTH = struct.Struct("<I")
+FRAME_HEADER = struct.Struct("<dIHiBH")  # timestamp, frame_seq, vehicle_count, unique_count (-1 = none), flags, num_records
+FLAG_DETECTOR_RAN = 1  # The boxes come from a detector run, not only from tracking
+
+EVENT_RECORD_DTYPE = np.dtype([
+    ('box', '<i2', (4,)),  # x, y, w, h in frame pixels
+    ('class_id', '<i2'),
+    ('score', '<f4'),
+    ('track_id', '<i4'),
+])
+
+def encode_frame(timestamp, frame_seq, detections, vehicle_count, unique_count=None, detector_ran=True):
+    """Pack one frame's detections (a utils.DETECTION_DTYPE array) into a message"""
+    records = np.empty(len(detections), dtype=EVENT_RECORD_DTYPE)
+    records['box'] = np.clip(detections['box'], -32768, 32767)
+    records['class_id'] = detections['class_id']
+    records['score'] = detections['score']
+    records['track_id'] = detections['track_id']
+    header = FRAME_HEADER.pack(timestamp, frame_seq, min(vehicle_count, 0xFFFF),
+                               -1 if unique_count is None else unique_count,
+                               FLAG_DETECTOR_RAN if detector_ran else 0, len(records))
+    payload = header + records.tobytes()
+    return LENGTH.pack(len(payload)) + payload
+
+def decode_frame(payload):
+    """Unpack a frame payload into a dict with a structured array of records"""
+    timestamp, frame_seq, vehicle_count, unique_count, flags, num_records = \
+        FRAME_HEADER.unpack_from(payload)
+    records = np.frombuffer(payload, dtype=EVENT_RECORD_DTYPE, count=num_records,
+                            offset=FRAME_HEADER.size)
+    return {
+        "timestamp": timestamp,
+        "frame_seq": frame_seq,
+        "vehicle_count": vehicle_count,
+        "unique_count": None if unique_count < 0 else unique_count,
+        "detector_ran": bool(flags & FLAG_DETECTOR_RAN),
+        "detections": records,
+    }
+
+class _Subscriber:
+    """One connected client with its own bounded queue and sender thread"""
+
+    def __init__(self, conn, queue_size, on_close):
+        self.conn = conn
+        self.sent = 0
+        self.dropped = 0
+        self._queue = collections.deque()
+        self._queue_size = queue_size
+        self._ready = threading.Condition()
+        self._closed = False
+        self._on_close = on_close
+        self._thread = threading.Thread(target=self._send_loop, name="event-subscriber", daemon=True)
+        self._thread.start()
+
+    def offer(self, message):
+        """Queue a message; a slow client loses its oldest queued message"""
+        with self._ready:
+            if len(self._queue) >= self._queue_size:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(message)
+            self._ready.notify()
+
+    def close(self):
+        with self._ready:
+            self._closed = True
+            self._ready.notify()
+        try:
+            # Wakes the sender if it is stuck in sendall()
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _send_loop(self):
+        try:
+            while True:
+                with self._ready:
+                    while not self._queue and not self._closed:
+                        self._ready.wait()
+                    if self._closed:
+                        break
+                    message = self._queue.popleft()
+                # Only this thread ever waits on the client
+                self.conn.sendall(message)
+                self.sent += 1
+        except OSError:
+            pass
+        finally:
+            self.conn.close()
+            self._on_close(self)
+
+class EventPublisher:
+    """Publishes per-frame detection records to local clients over a UNIX socket.
+
+    publish() encodes each frame once and hands it to every subscriber's
+    queue without blocking. Each subscriber has its own sender thread. A
+    client that reads too slowly loses its oldest queued frames (counted in
+    `dropped`) and never holds up detection or the other clients.
+    """
+
+    def __init__(self, classes, path=EVENT_SOCKET_PATH, queue_size=EVENT_QUEUE_SIZE,
+                 max_subscribers=EVENT_MAX_SUBSCRIBERS):
+        self.path = path
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.published = 0
+        self.dropped_closed = 0  # Drops of subscribers that have since disconnected
+        self.rejected = 0
+
+        hello = STREAM_MAGIC + "\n".join(classes).encode()
+        self._hello = LENGTH.pack(len(hello)) + hello
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+        # A socket file left by a previous run would make bind() fail
+        if os.path.exists(path):
+            os.remove(path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen(max_subscribers)
+        self._accept_thread = threading.Thread(target=self._accept_loop, name="event-accept", daemon=True)
+        self._accept_thread.start()
+        print(f"Detection event stream listening on {path}")
+
+    @property
+    def subscribers(self):
+        """Number of connected clients"""
+        return len(self._subscribers)
+
+    @property
+    def dropped(self):
+        """Frames dropped for slow clients, including disconnected ones"""
+        with self._lock:
+            return self.dropped_closed + sum(subscriber.dropped for subscriber in self._subscribers)
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                break  # Server socket closed
+            with self._lock:
+                if len(self._subscribers) >= self.max_subscribers:
+                    self.rejected += 1
+                    conn.close()
+                    continue
+                subscriber = _Subscriber(conn, self.queue_size, self._remove)
+                subscriber.offer(self._hello)
+                self._subscribers.append(subscriber)
+
+    def _remove(self, subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+                self.dropped_closed += subscriber.dropped
+
+    def publish(self, timestamp, frame_seq, detections, vehicle_count, unique_count=None, detector_ran=True):
+        """Send one frame's detections to every subscriber; never blocks on a client"""
+        if not self._subscribers:
+            return
+        message = encode_frame(timestamp, frame_seq, detections, vehicle_count, unique_count, detector_ran)
+        with self._lock:
+            for subscriber in self._subscribers:
+                subscriber.offer(message)
+        self.published += 1
+
+    def close(self):
+        """Disconnect all clients and remove the socket file"""
+        try:
+            # Wakes the accept thread
+            self._server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._server.close()
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class EventSubscriber:
+    """Client for the detection event stream; iterate over it to get frames as dicts"""
+
+    def __init__(self, path=EVENT_SOCKET_PATH):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(path)
+        self._file = self._sock.makefile("rb")
+        hello = self._read_message()
+        if hello is None or not hello.startswith(STREAM_MAGIC):
+            raise IOError(f"{path} is not a detection event stream")
+        self.classes = hello[len(STREAM_MAGIC):].decode().split("\n")
+
+    def _read_message(self):
+        length = self._file.read(LENGTH.size)
+        if len(length) < LENGTH.size:
+            return None
+        size = LENGTH.unpack(length)[0]
+        payload = self._file.read(size)
+        return payload if len(payload) == size else None
+
+    def __iter__(self):
+        while True:
+            payload = self._read_message()
+            if payload is None:
+                return
+            yield decode_frame(payload)
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the detection event stream of a running pipeline')
+    parser.add_argument('--path', default=EVENT_SOCKET_PATH, help='Socket of the running pipeline')
+    parser.add_argument('--slow', type=float, default=0.0,
+                        help='Seconds to sleep per frame (to watch drops for a slow client)')
+    args = parser.parse_args()
+
+    subscriber = EventSubscriber(args.path)
+    try:
+        for frame in subscriber:
+            counts = collections.Counter(subscriber.classes[class_id]
+                                         for class_id in frame["detections"]['class_id'])
+            summary = ", ".join(f"{name}: {count}" for name, count in counts.most_common())
+            print(f"{frame['timestamp']:.3f} frame {frame['frame_seq']:>6} "
+                  f"{'detect' if frame['detector_ran'] else 'track '} "
+                  f"vehicles {frame['vehicle_count']:>2}  {summary}")
+            if args.slow:
+                time.sleep(args.slow)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        subscriber.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+import argparse
+import glob
+import os
+import time
+import cv2
+import numpy as np
+from config import (
+    CAMERA_WIDTH,
+    CAMERA_HEIGHT,
+    CAMERA_FRAMERATE,
+    CAMERA_WARMUP_TIMEOUT,
+    CAMERA_SETTLE_FRAMES,
+    FRAME_SOURCE,
+    FRAME_SOURCE_PATH,
+    FRAME_SOURCE_REALTIME,
+    FRAME_SOURCE_LOOP
+)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+class FrameSource:
+    """Base class for anything that delivers BGR frames to the pipeline.
+
+    Subclasses implement _read_frame(). In real-time mode read() paces frames
+    at the source frame rate; otherwise frames are returned as fast as possible.
+    """
+
+    def __init__(self, frame_shape, fps=CAMERA_FRAMERATE, realtime=True):
+        self.frame_shape = tuple(frame_shape)  # (height, width, channels)
+        self.fps = fps if fps and fps > 0 else CAMERA_FRAMERATE
+        self.realtime = realtime
+        self.frames_read = 0
+        self._next_frame_time = None
+
+    def start(self):
+        """Open the source"""
+        self._next_frame_time = None
+
+    def stop(self):
+        """Release the source"""
+
+    def _read_frame(self):
+        raise NotImplementedError
+
+    def read(self):
+        """Return the next frame, or None once the source is exhausted"""
+        if self.realtime:
+            self._pace()
+        frame = self._read_frame()
+        if frame is not None:
+            self.frames_read += 1
+        return frame
+
+    def _pace(self):
+        """Sleep until the next frame is due at the source frame rate"""
+        now = time.monotonic()
+        if self._next_frame_time is None or now - self._next_frame_time > 1.0:
+            # First frame, or we fell far behind: don't try to catch up
+            self._next_frame_time = now
+        elif self._next_frame_time > now:
+            time.sleep(self._next_frame_time - now)
+        self._next_frame_time += 1.0 / self.fps
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+class PicameraSource(FrameSource):
+    """Raspberry Pi camera via Picamera2 (paced by the camera itself)"""
+
+    def __init__(self, width=CAMERA_WIDTH, height=CAMERA_HEIGHT, framerate=CAMERA_FRAMERATE):
+        super().__init__((height, width, 3), framerate, realtime=False)
+        self.picam2 = None
+        self.warmup_seconds = None
+
+    def start(self):
+        # Imported here so the rest of the pipeline runs on machines without Picamera2
+        from picamera2 import Picamera2
+        super().start()
+        height, width = self.frame_shape[:2]
+        self.picam2 = Picamera2()
+        config = self.picam2.create_preview_configuration(
+            main={"size": (width, height), "format": "RGB888"},
+            controls={"FrameRate": self.fps}
+        )
+        self.picam2.configure(config)
+        self.picam2.start()
+        self._wait_until_settled()
+
+    def _wait_until_settled(self, timeout=CAMERA_WARMUP_TIMEOUT, settle_frames=CAMERA_SETTLE_FRAMES):
+        """Wait for frames to arrive and auto exposure to settle, at most timeout seconds"""
+        start = time.monotonic()
+        previous = None
+        stable = 0
+        while time.monotonic() - start < timeout:
+            metadata = self.picam2.capture_metadata()
+            if metadata.get("AeLocked"):
+                break
+            # Older libcamera builds lack AeLocked; watch exposure and gain instead
+            exposure = (metadata.get("ExposureTime"), metadata.get("AnalogueGain"))
+            if None in exposure:
+                break  # No exposure metadata: the first frame is as good as it gets
+            if previous is not None and all(abs(a - b) <= 0.02 * max(abs(b), 1e-6)
+                                            for a, b in zip(exposure, previous)):
+                stable += 1
+                if stable >= settle_frames:
+                    break
+            else:
+                stable = 0
+            previous = exposure
+        self.warmup_seconds = time.monotonic() - start
+        print(f"Camera ready after {self.warmup_seconds:.2f} s")
+
+    def stop(self):
+        if self.picam2 is not None:
+            self.picam2.stop()
+            self.picam2 = None
+
+    def _read_frame(self):
+        return self.picam2.capture_array()
+
+class VideoFileSource(FrameSource):
+    """Frames decoded from a video file with OpenCV"""
+
+    def __init__(self, path, realtime=True, loop=False):
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise IOError(f"Could not open video file {path}")
+        width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        capture.release()
+
+        super().__init__((height, width, 3), fps, realtime)
+        self.path = path
+        self.loop = loop
+        self.capture = None
+
+    def start(self):
+        super().start()
+        self.capture = cv2.VideoCapture(self.path)
+
+    def stop(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+    def _read_frame(self):
+        ret, frame = self.capture.read()
+        if not ret and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.capture.read()
+        return frame if ret else None
+
+class ImageDirectorySource(FrameSource):
+    """Frames read from the image files in a directory, in name order"""
+
+    def __init__(self, path, fps=CAMERA_FRAMERATE, realtime=True, loop=False):
+        self.files = sorted(
+            f for f in glob.glob(os.path.join(path, "*"))
+            if f.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.files:
+            raise IOError(f"No images found in {path}")
+        first = cv2.imread(self.files[0])
+        if first is None:
+            raise IOError(f"Could not read image {self.files[0]}")
+
+        super().__init__(first.shape, fps, realtime)
+        self.loop = loop
+        self._index = 0
+
+    def start(self):
+        super().start()
+        self._index = 0
+
+    def _read_frame(self):
+        while True:
+            if self._index >= len(self.files):
+                if not self.loop:
+                    return None
+                self._index = 0
+            path = self.files[self._index]
+            self._index += 1
+            frame = cv2.imread(path)
+            if frame is None:
+                print(f"Warning: skipping unreadable image {path}")
+                continue
+            # Every frame must have the same shape as the first one
+            if frame.shape != self.frame_shape:
+                frame = cv2.resize(frame, (self.frame_shape[1], self.frame_shape[0]))
+            return frame
+
+class RawRecordingSource(FrameSource):
+    """Frames from a raw recording: back-to-back HxWx3 uint8 frames, memory-mapped"""
+
+    def __init__(self, path, width=CAMERA_WIDTH, height=CAMERA_HEIGHT,
+                 fps=CAMERA_FRAMERATE, realtime=True, loop=False):
+        super().__init__((height, width, 3), fps, realtime)
+        frame_bytes = width * height * 3
+        num_frames = os.path.getsize(path) // frame_bytes
+        if num_frames == 0:
+            raise IOError(f"Raw recording {path} holds no {width}x{height} frames")
+        self.path = path
+        self.loop = loop
+        self.num_frames = num_frames
+        self.frames = None
+        self._index = 0
+
+    def start(self):
+        super().start()
+        self.frames = np.memmap(self.path, dtype=np.uint8, mode="r",
+                                shape=(self.num_frames,) + self.frame_shape)
+        self._index = 0
+
+    def stop(self):
+        self.frames = None
+
+    def _read_frame(self):
+        if self._index >= self.num_frames:
+            if not self.loop:
+                return None
+            self._index = 0
+        # Copy out of the read-only map since the pipeline draws on frames
+        frame = np.array(self.frames[self._index])
+        self._index += 1
+        return frame
+
+class SyntheticSource(FrameSource):
+    """Generated road scene with moving boxes; needs no files or hardware"""
+
+    def __init__(self, width=CAMERA_WIDTH, height=CAMERA_HEIGHT, fps=CAMERA_FRAMERATE,
+                 realtime=True, num_frames=None, num_vehicles=4, seed=0):
+        super().__init__((height, width, 3), fps, realtime)
+        self.num_frames = num_frames
+        rng = np.random.default_rng(seed)
+        self._background = np.full(self.frame_shape, 90, dtype=np.uint8)
+        self._background[: height // 3] = (200, 170, 140)  # Sky
+        self._background += rng.integers(0, 12, self.frame_shape, dtype=np.uint8)
+        self._lanes = rng.uniform(height * 0.4, height * 0.9, num_vehicles)
+        self._speeds = rng.uniform(2, 8, num_vehicles) * rng.choice([-1, 1], num_vehicles)
+        self._offsets = rng.uniform(0, width, num_vehicles)
+        self._colors = rng.integers(0, 256, (num_vehicles, 3)).tolist()
+
+    def _read_frame(self):
+        if self.num_frames is not None and self.frames_read >= self.num_frames:
+            return None
+        height, width = self.frame_shape[:2]
+        frame = self._background.copy()
+        positions = (self._offsets + self._speeds * self.frames_read) % (width + 120) - 120
+        for x, y, color in zip(positions.astype(int), self._lanes.astype(int), self._colors):
+            cv2.rectangle(frame, (x, y - 30), (x + 100, y + 30), color, -1)
+        return frame
+
+def create_frame_source(kind=FRAME_SOURCE, path=FRAME_SOURCE_PATH,
+                        realtime=FRAME_SOURCE_REALTIME, loop=FRAME_SOURCE_LOOP):
+    """Create a frame source by name: picamera, video, images, raw or synthetic"""
+    if kind == "picamera":
+        return PicameraSource()
+    if kind == "synthetic":
+        return SyntheticSource(realtime=realtime)
+    if not path:
+        raise ValueError(f"Frame source '{kind}' needs a path")
+    if kind == "video":
+        return VideoFileSource(path, realtime=realtime, loop=loop)
+    if kind == "images":
+        return ImageDirectorySource(path, realtime=realtime, loop=loop)
+    if kind == "raw":
+        return RawRecordingSource(path, realtime=realtime, loop=loop)
+    raise ValueError(f"Unknown frame source '{kind}'")
+
+def add_source_arguments(parser):
+    """Add the frame source command line options to an argparse parser"""
+    parser.add_argument('--source', choices=['picamera', 'video', 'images', 'raw', 'synthetic'],
+                        default=FRAME_SOURCE, help='Where frames come from')
+    parser.add_argument('--path', default=FRAME_SOURCE_PATH,
+                        help='Video file, image directory or raw recording for file sources')
+    parser.add_argument('--fast', action='store_true', default=not FRAME_SOURCE_REALTIME,
+                        help='Deliver frames as fast as possible instead of in real time')
+    parser.add_argument('--loop', action='store_true', default=FRAME_SOURCE_LOOP,
+                        help='Restart file sources when they reach the end')
+
+def source_from_args(args):
+    """Create a frame source from parsed add_source_arguments options"""
+    return create_frame_source(args.source, args.path, not args.fast, args.loop)
+
+def record_raw(source, output_path, num_frames):
+    """Append frames from a source to a raw recording for RawRecordingSource"""
+    with source, open(output_path, "ab") as out_file:
+        for _ in range(num_frames):
+            frame = source.read()
+            if frame is None:
+                break
+            out_file.write(np.ascontiguousarray(frame).tobytes())
+    print(f"Recorded {source.frames_read} frames of {source.frame_shape} to {output_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Record frames to a raw recording')
+    add_source_arguments(parser)
+    parser.add_argument('output', help='Raw recording file to append to')
+    parser.add_argument('--frames', type=int, default=300, help='Number of frames to record')
+    args = parser.parse_args()
+    record_raw(source_from_args(args), args.output, args.frames)
@@ -0,0 +1,255 @@
+import argparse
+import heapq
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from utils import DETECTION_DTYPE
+
+class WorkerError(RuntimeError):
+    """An inference worker process has exited"""
+
+def _worker_main(worker_id, detector_loader, shm_name, frames_shape, task_queue, result_queue,
+                 cv_threads, roi):
+    """Inference worker process: read frames from shared memory, return detections"""
+    # Avoid oversubscribing the cores when several processes run OpenCV
+    cv2.setNumThreads(cv_threads)
+
+    detector = detector_loader()
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = np.ndarray(frames_shape, dtype=np.uint8, buffer=shm.buf)
+
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            seq, slot = task
+
+            start = time.perf_counter()
+            try:
+                frame = frames[slot] if roi is None else roi.crop(frames[slot])
+                detections = detector.detect(frame)
+                if roi is not None:
+                    detections = roi.map_detections(detections)
+            except Exception as e:
+                # Every sequence number must come back, or results stall behind it
+                print(f"Error in inference worker {worker_id} on frame {seq}: {e}")
+                detections = np.empty(0, dtype=DETECTION_DTYPE)
+            inference_time = time.perf_counter() - start
+
+            # Only the small detection array is pickled; the frame stays in shared memory
+            result_queue.put((seq, slot, detections, inference_time, worker_id))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        del frames
+        shm.close()
+
+class InferencePool:
+    """Pool of inference processes fed through shared-memory frame slots.
+
+    Frames are copied once into a free slot and only (sequence, slot) pairs are
+    sent to the workers. Results are handed back in frame sequence order;
+    frames passed with skip() come back in that order too, without running
+    the detector, so tracking can carry boxes across them. A frame the
+    detector fails on comes back without detections; if a worker process
+    exits (e.g. its model failed to load), submit() and get_result() raise
+    WorkerError instead of waiting forever.
+    """
+
+    def __init__(self, num_workers, frame_shape, detector_loader, slots_per_worker=2,
+                 cv_threads=1, roi=None):
+        """Start the worker processes
+
+        Args:
+            num_workers: Number of inference processes
+            frame_shape: (height, width, channels) of the frames to be submitted
+            detector_loader: Callable returning a ready detector.Detector (e.g. main.load_detector)
+            slots_per_worker: Shared frame slots per worker (2 keeps workers busy)
+            cv_threads: OpenCV threads per worker process
+            roi: Optional roi.RegionOfInterest; workers then only look at its crop
+        """
+        self.num_workers = num_workers
+        self.frame_shape = tuple(frame_shape)
+        num_slots = num_workers * slots_per_worker
+        frames_shape = (num_slots,) + self.frame_shape
+
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=int(np.prod(frames_shape)))
+        self._frames = np.ndarray(frames_shape, dtype=np.uint8, buffer=self._shm.buf)
+
+        # Workers are forked so they inherit detector_loader without pickling it
+        context = mp.get_context("fork")
+        self._task_queue = context.Queue()
+        self._result_queue = context.Queue()
+        self._free_slots = queue.Queue()
+        for slot in range(num_slots):
+            self._free_slots.put(slot)
+
+        self._next_seq = 0        # Sequence number for the next submitted frame
+        self._next_result_seq = 0 # Sequence number the consumer expects next
+        self._pending = []        # Heap of out-of-order results
+        self._tags = {}           # Caller tags by sequence number
+        self._skipped = {}        # Frames passed without inference by sequence number
+
+        self.completed = 0
+        self.per_worker = [0] * num_workers
+
+        self._workers = []
+        for worker_id in range(num_workers):
+            process = context.Process(
+                target=_worker_main,
+                args=(worker_id, detector_loader, self._shm.name, frames_shape,
+                      self._task_queue, self._result_queue, cv_threads, roi),
+                daemon=True)
+            process.start()
+            self._workers.append(process)
+
+        print(f"Inference pool started with {num_workers} worker processes")
+
+    def _check_workers(self):
+        """Raise WorkerError if any worker process has exited"""
+        for worker_id, process in enumerate(self._workers):
+            if not process.is_alive():
+                raise WorkerError(f"Inference worker {worker_id} exited with code {process.exitcode}")
+
+    def _wait(self, get, timeout):
+        """Call get(timeout) in short steps, checking the workers in between"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._check_workers()
+            remaining = 1.0 if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                return get(timeout=min(remaining, 1.0))
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+
+    def submit(self, frame, timeout=None, tag=None):
+        """Copy a frame into a free slot and queue it for inference
+
+        Blocks until a slot is free. The optional tag is handed back with the
+        result. Returns the frame sequence number, or None if no slot became
+        free within the timeout.
+        """
+        try:
+            slot = self._wait(self._free_slots.get, timeout)
+        except queue.Empty:
+            return None
+        np.copyto(self._frames[slot], frame)
+        seq = self._next_seq
+        self._next_seq += 1
+        self._tags[seq] = tag
+        self._task_queue.put((seq, slot))
+        return seq
+
+    def skip(self, frame, tag=None):
+        """Pass a frame through in sequence order without running the detector
+
+        get_result() returns it with detections and inference_time set to None.
+        The frame is not copied. Returns the frame sequence number.
+        """
+        seq = self._next_seq
+        self._next_seq += 1
+        self._tags[seq] = tag
+        self._skipped[seq] = frame
+        # Only the sequence number travels through the queue; it wakes get_result()
+        self._result_queue.put((seq, None, None, None, None))
+        return seq
+
+    def get_result(self, timeout=None):
+        """Return the next result in sequence order
+
+        Returns (seq, frame, detections, inference_time, tag) where frame is a
+        private copy of the submitted frame, or None on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._pending or self._pending[0][0] != self._next_result_seq:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                seq, slot, detections, inference_time, worker_id = self._wait(
+                    self._result_queue.get, remaining)
+            except queue.Empty:
+                return None
+            if worker_id is not None:
+                self.per_worker[worker_id] += 1
+            heapq.heappush(self._pending, (seq, slot, detections, inference_time))
+
+        seq, slot, detections, inference_time = heapq.heappop(self._pending)
+        self._next_result_seq += 1
+        if slot is None:
+            return seq, self._skipped.pop(seq), None, None, self._tags.pop(seq)
+        self.completed += 1
+
+        # Copy the frame out so the slot can be reused straight away
+        frame = self._frames[slot].copy()
+        self._free_slots.put(slot)
+        return seq, frame, detections, inference_time, self._tags.pop(seq)
+
+    def close(self):
+        """Stop the workers and release the shared memory"""
+        for _ in self._workers:
+            self._task_queue.put(None)
+        for process in self._workers:
+            process.join(timeout=2.0)
+            if process.is_alive():
+                process.terminate()
+        del self._frames
+        self._shm.close()
+        self._shm.unlink()
+
+def benchmark_scaling(max_workers=4, num_frames=100):
+    """Measure pool throughput for 1..max_workers processes on random frames"""
+    from functools import partial
+    from config import CAMERA_WIDTH, CAMERA_HEIGHT, CLASSES_PATH, BLOB_SIZE
+    from utils import load_classes
+    from detector import create_detector
+
+    classes = load_classes(CLASSES_PATH)
+    frame_shape = (CAMERA_HEIGHT, CAMERA_WIDTH, 3)
+    frame = np.random.randint(0, 256, frame_shape, dtype=np.uint8)
+
+    results = []
+    for num_workers in range(1, max_workers + 1):
+        print(f"Testing {num_workers} worker(s)...")
+        pool = InferencePool(num_workers, frame_shape, partial(create_detector, classes, BLOB_SIZE, threads=1))
+        try:
+            # Warm up every worker before timing
+            for _ in range(num_workers * 2):
+                pool.submit(frame)
+            for _ in range(num_workers * 2):
+                pool.get_result()
+
+            start_time = time.time()
+            submitted = 0
+            received = 0
+            while received < num_frames:
+                # Keep every slot busy
+                while submitted < num_frames and pool.submit(frame, timeout=0) is not None:
+                    submitted += 1
+                if pool.get_result(timeout=10.0) is not None:
+                    received += 1
+            elapsed = time.time() - start_time
+        finally:
+            pool.close()
+
+        fps = num_frames / elapsed
+        results.append((num_workers, fps))
+        print(f"  Result: {fps:.1f} FPS")
+
+    print("\nInference Pool Scaling:")
+    print("| Workers | FPS  | Speedup |")
+    print("|---------|------|---------|")
+    for num_workers, fps in results:
+        print(f"| {num_workers:7} | {fps:4.1f} | {fps / results[0][1]:6.2f}x |")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure inference pool throughput scaling')
+    parser.add_argument('--workers', type=int, default=4, help='Maximum number of worker processes')
+    parser.add_argument('--frames', type=int, default=100, help='Frames to process per configuration')
+    args = parser.parse_args()
+    benchmark_scaling(args.workers, args.frames)
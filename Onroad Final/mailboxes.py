@@ -0,0 +1,70 @@
+import threading
+
+class FrameMailbox:
+    """Single-slot mailbox between pipeline threads.
+
+    The producer never blocks: putting a new item overwrites one the consumer
+    has not picked up yet (drop-oldest), so the consumer always receives the
+    freshest frame. An item put with keep=True is only replaced by another kept
+    item, so e.g. a detector result is not lost to a frame that was only
+    tracked. Consumers sleep on a condition variable instead of polling.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item = None
+        self._put_seq = 0    # Sequence number of the newest item
+        self._taken_seq = 0  # Sequence number of the last item handed out
+        self._closed = False
+        self._keep = False   # The waiting item may only be replaced by a kept item
+        self.dropped = 0     # Items overwritten before the consumer took them
+
+    def put(self, item, keep=False):
+        """Publish an item, replacing any item still waiting
+
+        A waiting kept item is not replaced unless `keep` is set too; the new
+        item is then dropped instead. Returns the sequence number assigned to
+        the item, or None if it was dropped.
+        """
+        with self._condition:
+            if self._put_seq > self._taken_seq:
+                self.dropped += 1
+                if self._keep and not keep:
+                    return None
+            self._item = item
+            self._keep = keep
+            self._put_seq += 1
+            self._condition.notify()
+            return self._put_seq
+
+    def get(self, timeout=None):
+        """Wait for an item newer than the last one taken
+
+        Returns None on timeout or once the mailbox is closed.
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                    lambda: self._put_seq > self._taken_seq or self._closed, timeout):
+                return None
+            if self._put_seq == self._taken_seq:
+                return None  # Closed with nothing pending
+            item = self._item
+            self._item = None
+            self._taken_seq = self._put_seq
+            return item
+
+    def pending(self):
+        """Return True if an item is waiting for the consumer"""
+        with self._condition:
+            return self._put_seq > self._taken_seq
+
+    @property
+    def put_count(self):
+        """Total number of items published"""
+        return self._put_seq
+
+    def close(self):
+        """Wake up any waiting consumer; subsequent gets return None when empty"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
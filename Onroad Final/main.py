@@ -3,76 +3,113 @@ import numpy as np
 import time
 import os
 import threading
-import queue
-from picamera2 import Picamera2
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from utils import (
     load_classes, 
-    get_output_layers, 
-    process_detections, 
-    initialize_oled, 
-    update_oled_display
+    summarize_detections, 
+    DETECTION_DTYPE,
+    initialize_oled,
+    setup_logging
 )
 # Import all configuration parameters
 from config import *
 from data_logger import VehicleDataLogger
+from detection_log import DetectionLogWriter
+from tracker import VehicleTracker
+from mailboxes import FrameMailbox
+from detector import create_detector
+from inference_pool import InferencePool
+from frame_sources import add_source_arguments, source_from_args
+from metrics import MetricsRegistry, MetricsServer, register_process_metrics
+from oled import OledWorker
+from motion import MotionGate
+from roi import create_roi
+from controller import AdaptiveController
+from startup import StartupProfiler
+from detection_summary import DetectionSummary
+from render import FrameRenderer
+from recorder import EventRecorder
+from snapshots import SnapshotStore
+from event_stream import EventPublisher
 
 # Global variables for inter-thread communication
-frame_queue = queue.Queue(maxsize=MAX_QUEUE_SIZE)
-result_queue = queue.Queue(maxsize=MAX_QUEUE_SIZE)
+# Each mailbox holds only the newest item so consumers never work on stale frames
+frame_mailbox = FrameMailbox()
+result_mailbox = FrameMailbox()
 stop_event = threading.Event()
 fps_value = 0
 processed_fps_value = 0
 
-def setup_camera():
-    """Initialize and configure the Raspberry Pi camera"""
-    picam2 = Picamera2()
-    config = picam2.create_preview_configuration(
-        main={"size": (CAMERA_WIDTH, CAMERA_HEIGHT), "format": "RGB888"},
-        controls={"FrameRate": CAMERA_FRAMERATE}
-    )
-    picam2.configure(config)
-    return picam2
+# Start-up phase times, printed once the first detection is published
+startup = StartupProfiler()
 
-def load_network():
-    """Load YOLO network from disk"""
-    # Check if model files exist
-    if not os.path.exists(MODEL_PATH) or not os.path.exists(CONFIG_PATH):
-        print("Error: Model files not found. Please download them first.")
+# Detections are logged as one summary line per LOG_SUMMARY_SECONDS
+detection_summary = DetectionSummary()
+
+# Runtime metrics, served on /metrics when ENABLE_METRICS is set.
+# Recording is a few additions per frame; everything else is read at scrape time.
+metrics = MetricsRegistry()
+register_process_metrics(metrics)
+frames_captured = metrics.counter("vehicle_frames_captured_total", "Frames read from the frame source")
+inferences_run = metrics.counter("vehicle_inferences_total", "Detector runs")
+vehicles_detected = metrics.counter("vehicle_detections_total", "Vehicle detections summed over detector runs")
+stage_latency = {
+    stage: metrics.histogram("vehicle_stage_latency_seconds", "Pipeline stage latency", {"stage": stage})
+    for stage in ("capture", "preprocess", "forward", "postprocess", "inference", "display", "oled", "log")
+}
+for _name, _mailbox in (("frame", frame_mailbox), ("result", result_mailbox)):
+    metrics.gauge("vehicle_mailbox_pending", "Items waiting in a pipeline mailbox (0 or 1)",
+                  {"mailbox": _name}, callback=_mailbox.pending)
+    metrics.counter("vehicle_frames_dropped_total", "Items overwritten before the consumer took them",
+                    {"mailbox": _name}, callback=lambda m=_mailbox: m.dropped)
+metrics.gauge("vehicle_camera_fps", "Frames captured per second", callback=lambda: fps_value)
+metrics.gauge("vehicle_inference_fps", "Detector runs per second", callback=lambda: processed_fps_value)
+
+def load_detector(classes, input_size, **kwargs):
+    """Load the DETECTOR_BACKEND network from disk"""
+    try:
+        detector = create_detector(classes, input_size, **kwargs)
+    except FileNotFoundError as e:
+        print(f"Error: {e}. Please download the model files first.")
         print("Run download_models.py to fetch the required files.")
         exit(1)
-        
-    # Load YOLO network
-    net = cv2.dnn.readNet(MODEL_PATH, CONFIG_PATH)
-    
-    # Use GPU if available and enabled
-    if ENABLE_GPU:
-        print("Attempting to use GPU for inference")
-        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
-        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA)
-    else:
-        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
-        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
     
-    print("Neural network loaded successfully")
-    return net
+    print(f"Neural network loaded successfully ({detector.name}, "
+          f"{detector.input_size}x{detector.input_size} input)")
+    return detector
 
-def capture_thread(picam):
+def capture_thread(source, recorder=None):
     """Thread function to continuously capture frames"""
-    global frame_queue, stop_event, fps_value
+    global frame_mailbox, stop_event, fps_value
     
     frame_count = 0
+    frame_seq = 0
     start_time = time.time()
     
     print("Camera capture thread started")
     
     try:
         while not stop_event.is_set():
-            # Capture frame
-            frame = picam.capture_array()
+            # Capture frame (blocks until the source delivers the next one)
+            capture_start = time.perf_counter()
+            frame = source.read()
+            if frame is None:
+                print("Frame source exhausted")
+                stop_event.set()
+                break
+            frame_time = time.time()
+            stage_latency["capture"].observe(time.perf_counter() - capture_start)
+            frames_captured.inc()
+            frame_seq += 1
+            
+            # Hand over the newest frame, replacing one inference has not taken yet
+            frame_mailbox.put((frame_seq, frame_time, frame))
             
-            # Put frame in queue if not full (non-blocking)
-            if not frame_queue.full():
-                frame_queue.put(frame, block=False)
+            # Every frame goes to the pre-event ring (never blocks)
+            if recorder:
+                recorder.add(frame, frame_time)
             
             # Calculate FPS
             frame_count += 1
@@ -81,64 +118,180 @@ def capture_thread(picam):
                 fps_value = frame_count / elapsed_time
                 frame_count = 0
                 start_time = time.time()
-                
-            # Small sleep to prevent CPU maxing out
-            time.sleep(0.001)
     except Exception as e:
         print(f"Error in capture thread: {e}")
     finally:
         print("Camera capture thread stopped")
 
-def inference_thread(net, classes):
-    """Thread function to process frames for vehicle detection"""
-    global frame_queue, result_queue, stop_event, processed_fps_value
+def create_tracker():
+    """Create the vehicle tracker if tracking is enabled"""
+    if not ENABLE_TRACKING:
+        return None
+    return VehicleTracker(max_age=TRACK_MAX_AGE, min_hits=TRACK_MIN_HITS,
+                          iou_threshold=TRACK_IOU_THRESHOLD)
+
+def track_skipped_frame(tracker, classes, last_detections=None, static=False):
+    """Carry tracked vehicles forward to a frame the detector skipped
+
+    Without a tracker the last detector results are reused unchanged. So are
+    they while the motion gate holds (static): the scene has not changed, and
+    predicting would age parked vehicles out after TRACK_MAX_AGE frames and
+    give them new track IDs on the next detector run.
+    Returns (vehicle_count, vehicle_types, detections).
+    """
+    if tracker is not None and not static:
+        detections = tracker.predict()
+    else:
+        detections = last_detections if last_detections is not None else np.empty(0, DETECTION_DTYPE)
+    vehicle_count, vehicle_types = summarize_detections(detections, classes)
+    return vehicle_count, vehicle_types, detections
+
+def create_motion_gate():
+    """Create the motion gate if enabled and export its counters"""
+    if not ENABLE_MOTION_GATE:
+        return None
+    gate = MotionGate()
+    metrics.counter("vehicle_inferences_skipped_total", "Detector runs skipped because the scene was static",
+                    callback=lambda: gate.skipped)
+    metrics.gauge("vehicle_motion_changed_fraction", "Fraction of pixels changed since the last detector run",
+                  callback=lambda: gate.last_changed_fraction)
+    return gate
+
+def report_motion_stats(gate):
+    """Print how many detector runs the motion gate saved"""
+    if gate is None:
+        return
+    stats = gate.stats()
+    print(f"Motion gate: {stats['executed']} detector runs, {stats['skipped']} skipped "
+          f"({stats['skip_ratio'] * 100:.0f}%)")
+
+def report_preprocess_stats(preprocessor):
+    """Print blob preprocessing timing and the allocations it avoided"""
+    stats = preprocessor.stats()
+    if stats["calls"] == 0:
+        return
+    print(f"Preprocessing: {stats['calls']} frames, {stats['mean_ms']:.2f} ms average, "
+          f"{stats['bytes_reused_total'] / 1024 / 1024:.1f} MB of buffer allocations avoided")
+
+def detector_blob_size(roi):
+    """Network input size: ROI_BLOB_SIZE for an ROI crop if set, otherwise BLOB_SIZE"""
+    if roi is not None and ROI_BLOB_SIZE:
+        return ROI_BLOB_SIZE
+    return BLOB_SIZE
+
+def create_controller(blob_sizes, blob_size, parallelism=1):
+    """Create the adaptive controller if enabled and export its settings"""
+    if not ENABLE_ADAPTIVE_CONTROL:
+        return None
+    controller = AdaptiveController(blob_sizes, blob_size, DETECTION_INTERVAL, parallelism=parallelism)
+    metrics.gauge("vehicle_controller_blob_size", "Network input size chosen by the controller",
+                  callback=lambda: controller.blob_size)
+    metrics.gauge("vehicle_controller_detection_interval", "Detection interval chosen by the controller",
+                  callback=lambda: controller.interval)
+    metrics.counter("vehicle_controller_changes_total", "Settings changes made by the controller",
+                    callback=lambda: controller.changes)
+    print(f"Adaptive control: target {controller.target_fps} FPS, input sizes {controller.blob_sizes}")
+    return controller
+
+def inference_thread(detectors, classes, roi=None, controller=None):
+    """Thread function to process frames for vehicle detection
+
+    detectors maps each network input size to a loaded detector; the
+    controller (if any) picks the size and the detection interval.
+    """
+    global frame_mailbox, result_mailbox, stop_event, processed_fps_value
     
     frame_count = 0
     process_count = 0
     start_time = time.time()
+    tracker = create_tracker()
+    blob_size = controller.blob_size if controller is not None else next(iter(detectors))
+    motion_gate = create_motion_gate()
+    last_detections = None
+    scene_static = False  # The motion gate skipped the last detector run
     
     print("Inference thread started")
     
     try:
         while not stop_event.is_set():
-            # Skip if queue is empty
-            if frame_queue.empty():
-                time.sleep(0.01)
+            # Wait for the newest frame
+            captured = frame_mailbox.get(timeout=0.1)
+            if captured is None:
                 continue
-            
-            # Get a frame from the queue
-            frame = frame_queue.get()
+            frame_seq, frame_time, frame = captured
             frame_count += 1
             
+            # Let the controller adjust input size and interval to the measured load
+            interval = DETECTION_INTERVAL
+            if controller is not None:
+                controller.step(frames_captured.value, frame_mailbox.dropped)
+                interval = controller.interval
+                blob_size = controller.blob_size
+            
             # Only process every DETECTION_INTERVAL frames
-            if DETECTION_INTERVAL > 1 and frame_count % DETECTION_INTERVAL != 0:
+            if interval > 1 and frame_count % interval != 0:
+                # Keep showing tracked vehicles between detector runs
+                if tracker is not None:
+                    tracked = track_skipped_frame(tracker, classes, last_detections, scene_static)
+                    result_mailbox.put((frame, *tracked, tracker.total_count, None, frame_seq, frame_time))
+                continue
+            
+            # Reuse the previous results while nothing in the scene moves
+            if motion_gate is not None and not motion_gate.should_run(frame if roi is None else roi.crop(frame)):
+                if controller is not None:
+                    controller.record_skip()
+                scene_static = True
+                tracked = track_skipped_frame(tracker, classes, last_detections, static=True)
+                unique_count = tracker.total_count if tracker is not None else None
+                result_mailbox.put((frame, *tracked, unique_count, None, frame_seq, frame_time))
                 continue
             
             process_count += 1
             process_start = time.time()
+            scene_static = False
             
-            # Create a 4D blob from the frame
-            blob = cv2.dnn.blobFromImage(frame, 1/255.0, (BLOB_SIZE, BLOB_SIZE), 
-                                         swapRB=True, crop=False)
+            # Create a 4D blob from the frame in the reusable buffer
+            t0 = time.perf_counter()
+            detector = detectors[blob_size]
+            detector_input = frame if roi is None else roi.crop(frame)
+            blob = detector.preprocess(detector_input)
             
-            # Set the input blob for the neural network
-            net.setInput(blob)
+            # Run the network
+            t1 = time.perf_counter()
+            outs = detector.infer(blob)
             
-            # Run forward pass to get output of the output layers
-            outs = net.forward(get_output_layers(net))
+            # Process detections (an ROI crop's boxes are mapped back to the frame)
+            t2 = time.perf_counter()
+            detections = detector.decode(outs, detector_input.shape[1], detector_input.shape[0])
+            if roi is not None:
+                detections = roi.map_detections(detections)
+            vehicle_count, vehicle_types = summarize_detections(detections, classes)
             
-            # Process detections
-            processed_frame, vehicle_count, vehicle_types = process_detections(
-                frame, outs, classes, CONFIDENCE_THRESHOLD, NMS_THRESHOLD)
+            # Assign detections to tracked vehicles
+            unique_count = None
+            if tracker is not None:
+                detections = tracker.update(detections)
+                unique_count = tracker.total_count
+            last_detections = detections
+            t3 = time.perf_counter()
+            if controller is not None:
+                controller.record(t3 - t0)
             
-            # Add inference time as text
+            stage_latency["preprocess"].observe(t1 - t0)
+            stage_latency["forward"].observe(t2 - t1)
+            stage_latency["postprocess"].observe(t3 - t2)
+            stage_latency["inference"].observe(t3 - t0)
+            inferences_run.inc()
+            vehicles_detected.inc(vehicle_count)
+            detection_summary.add(detections, classes)
             inference_time = time.time() - process_start
-            cv2.putText(processed_frame, f"Infer: {inference_time*1000:.1f}ms", (10, 90), 
-                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
             
-            # Add results to output queue if not full
-            if not result_queue.full():
-                result_queue.put((processed_frame, vehicle_count, vehicle_types, inference_time))
+            # Publish results, replacing any the display has not shown yet; the
+            # display runs the recorder, snapshots and logs on detector results,
+            # so later skipped frames must not replace this one
+            result_mailbox.put((frame, vehicle_count, vehicle_types, detections, 
+                                unique_count, inference_time, frame_seq, frame_time), keep=True)
+            startup.detection_done()
             
             # Calculate processed FPS
             elapsed_time = time.time() - start_time
@@ -149,72 +302,319 @@ def inference_thread(net, classes):
     except Exception as e:
         print(f"Error in inference thread: {e}")
     finally:
+        for detector in detectors.values():
+            report_preprocess_stats(detector.preprocessor)
+        report_motion_stats(motion_gate)
         print("Inference thread stopped")
 
-def display_thread(data_logger):
-    """Thread function to display results and update OLED"""
-    global result_queue, stop_event, fps_value, processed_fps_value
+def pool_feeder_thread(pool, roi=None, controller=None):
+    """Thread function to feed captured frames to the inference worker pool"""
+    global frame_mailbox, stop_event
+    
+    frame_count = 0
+    motion_gate = create_motion_gate()
+    scene_static = False  # The motion gate skipped the last detector run
+    
+    print("Pool feeder thread started")
+    
+    try:
+        while not stop_event.is_set():
+            # Wait for the newest frame
+            captured = frame_mailbox.get(timeout=0.1)
+            if captured is None:
+                continue
+            frame_seq, frame_time, frame = captured
+            frame_count += 1
+            
+            # Only process every DETECTION_INTERVAL frames (or the controller's interval)
+            interval = controller.interval if controller is not None else DETECTION_INTERVAL
+            if interval > 1 and frame_count % interval != 0:
+                # Pass the frame on in order so the tracker can carry vehicles forward
+                if ENABLE_TRACKING:
+                    pool.skip(frame, tag=(frame_seq, frame_time, scene_static))
+                continue
+            
+            # Leave static scenes out; the result thread shows the last results
+            if motion_gate is not None and not motion_gate.should_run(frame if roi is None else roi.crop(frame)):
+                if controller is not None:
+                    controller.record_skip()
+                scene_static = True
+                pool.skip(frame, tag=(frame_seq, frame_time, True))
+                continue
+            scene_static = False
+            
+            # Copy into a shared-memory slot, waiting until a worker frees one
+            while pool.submit(frame, timeout=0.1, tag=(frame_seq, frame_time, False)) is None:
+                if stop_event.is_set():
+                    return
+    except Exception as e:
+        print(f"Error in pool feeder thread: {e}")
+        stop_event.set()
+    finally:
+        report_motion_stats(motion_gate)
+        print("Pool feeder thread stopped")
+
+def pool_result_thread(pool, classes, controller=None):
+    """Thread function to collect worker pool results in frame order"""
+    global result_mailbox, stop_event, processed_fps_value
+    
+    process_count = 0
+    start_time = time.time()
+    tracker = create_tracker()
+    last_detections = None
     
-    oled_update_count = 0
+    print("Pool result thread started")
     
+    try:
+        while not stop_event.is_set():
+            # Results arrive in frame sequence order
+            result = pool.get_result(timeout=0.1)
+            if result is None:
+                continue
+            seq, frame, detections, inference_time, (frame_seq, frame_time, static) = result
+            
+            # Frames the detector skipped: carry tracked vehicles forward
+            if detections is None:
+                tracked = track_skipped_frame(tracker, classes, last_detections, static)
+                unique_count = tracker.total_count if tracker is not None else None
+                result_mailbox.put((frame, *tracked, unique_count, None, frame_seq, frame_time))
+                continue
+            process_count += 1
+            
+            # Assign detections to tracked vehicles
+            postprocess_start = time.perf_counter()
+            unique_count = None
+            if tracker is not None:
+                detections = tracker.update(detections)
+                unique_count = tracker.total_count
+            last_detections = detections
+            
+            vehicle_count, vehicle_types = summarize_detections(detections, classes)
+            stage_latency["postprocess"].observe(time.perf_counter() - postprocess_start)
+            stage_latency["inference"].observe(inference_time)
+            if controller is not None:
+                controller.record(inference_time)
+                controller.step(frames_captured.value, frame_mailbox.dropped)
+            inferences_run.inc()
+            vehicles_detected.inc(vehicle_count)
+            detection_summary.add(detections, classes)
+            
+            # Publish results, replacing any the display has not shown yet
+            result_mailbox.put((frame, vehicle_count, vehicle_types, detections, 
+                                unique_count, inference_time, frame_seq, frame_time), keep=True)
+            startup.detection_done()
+            
+            # Calculate processed FPS
+            elapsed_time = time.time() - start_time
+            if elapsed_time >= 1.0:  # Update FPS every second
+                processed_fps_value = process_count / elapsed_time
+                process_count = 0
+                start_time = time.time()
+    except Exception as e:
+        print(f"Error in pool result thread: {e}")
+        stop_event.set()
+    finally:
+        print(f"Pool result thread stopped ({pool.completed} frames, per worker: {pool.per_worker})")
+
+def show_preview(image):
+    """Show a rendered frame in the preview window; returns False once 'q' is pressed"""
+    cv2.imshow("Vehicle Detection", image)
+    return cv2.waitKey(1) & 0xFF != ord('q')
+
+def render_for_consumers(renderer, frame, detections, lines=()):
+    """Render a frame if any consumer is attached; returns False once the preview asks to quit"""
+    if renderer is None or not renderer.active:
+        return True
+    image = renderer.render(frame, detections, lines)
+    return not ENABLE_PREVIEW or show_preview(image)
+
+def display_thread(data_logger, detection_log=None, oled_worker=None, renderer=None, recorder=None,
+                   snapshots=None, events=None):
+    """Thread function to update OLED and logs, and render frames for attached consumers"""
+    global result_mailbox, stop_event, fps_value, processed_fps_value
+    
+    last_inference_time = None
     print("Display thread started")
     
     try:
         while not stop_event.is_set():
-            # Skip if queue is empty
-            if result_queue.empty():
-                time.sleep(0.01)
+            # Wait for the newest processed results
+            result = result_mailbox.get(timeout=0.1)
+            if result is None:
                 continue
+            (frame, vehicle_count, vehicle_types, detections, 
+             unique_count, inference_time, frame_seq, frame_time) = result
+            if inference_time is not None:
+                last_inference_time = inference_time
             
-            # Get processed results
-            processed_frame, vehicle_count, vehicle_types, inference_time = result_queue.get()
+            # Save a clip around this detection; encoding runs on the recorder's threads
+            if recorder and inference_time is not None and vehicle_count >= RECORD_MIN_VEHICLES:
+                recorder.trigger(frame_time)
             
-            # Add FPS information
-            cv2.putText(processed_frame, f"Camera: {fps_value:.1f} FPS", (10, 30), 
-                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-            cv2.putText(processed_frame, f"Process: {processed_fps_value:.1f} FPS", (10, 60), 
-                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+            # Queue thumbnails of new vehicles; encoding runs on the snapshot workers
+            if snapshots and inference_time is not None and len(detections):
+                snapshots.submit(frame, detections, frame_time, frame_seq)
             
-            # Update OLED display - use proper OLED_UPDATE_INTERVAL from config
-            if ENABLE_OLED:
-                oled_update_count += 1
-                # Use modulo to decide when to force an update
-                force_update = (oled_update_count % OLED_UPDATE_INTERVAL == 0)
-                update_oled_display(vehicle_count, vehicle_types, fps=0, force_update=force_update)
+            # Publish the records to local subscribers (their queues drop, never block)
+            if events:
+                events.publish(frame_time, frame_seq, detections, vehicle_count, unique_count,
+                               inference_time is not None)
             
-            # Log vehicle data
-            if LOG_DETECTIONS and data_logger:
+            # Hand the counts to the OLED worker; rendering and I2C happen there
+            if oled_worker:
+                oled_start = time.perf_counter()
+                oled_worker.update(vehicle_count, vehicle_types)
+                stage_latency["oled"].observe(time.perf_counter() - oled_start)
+            
+            # Log vehicle data for frames the detector actually ran on
+            if LOG_DETECTIONS and data_logger and inference_time is not None:
+                log_start = time.perf_counter()
                 data_logger.log_data(vehicle_count, vehicle_types, processed_fps_value)
+                if detection_log:
+                    detection_log.append(frame_time, frame_seq, detections)
+                stage_latency["log"].observe(time.perf_counter() - log_start)
+            
+            # Draw only when something is watching
+            if renderer is None or not renderer.active:
+                continue
+            display_start = time.perf_counter()
+            lines = [f"Camera: {fps_value:.1f} FPS", f"Process: {processed_fps_value:.1f} FPS",
+                     f"Vehicles: {vehicle_count}"]
+            if last_inference_time is not None:
+                lines.append(f"Infer: {last_inference_time * 1000:.1f}ms")
+            if unique_count is not None:
+                lines.append(f"Unique: {unique_count}")
             
-            # Display the resulting frame
-            if ENABLE_PREVIEW:
-                cv2.imshow("Vehicle Detection", processed_frame)
-                
             # Break the loop if 'q' pressed
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            if not render_for_consumers(renderer, frame, detections, lines):
                 stop_event.set()
                 break
+            stage_latency["display"].observe(time.perf_counter() - display_start)
     except Exception as e:
         print(f"Error in display thread: {e}")
     finally:
         print("Display thread stopped")
-        cv2.destroyAllWindows()
+        if ENABLE_PREVIEW:
+            cv2.destroyAllWindows()
 
 def main():
+    parser = argparse.ArgumentParser(description='Vehicle detection on a Raspberry Pi')
+    add_source_arguments(parser)
+    args = parser.parse_args()
+    startup.mark("interpreter start and imports")
+    
     # Create required directories
     os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
     
     # Load COCO class names
     classes = load_classes(CLASSES_PATH)
     
-    # Load neural network
-    net = load_network()
+    # Select the frame source (not started yet)
+    source = source_from_args(args)
     
-    # Initialize OLED display
+    # Restrict detection to the configured road area
+    roi = create_roi(source.frame_shape, ROI_POLYGONS)
+    startup.mark("configuration")
+    
+    # Start the worker processes that each load their own network.
+    # The pool is forked before any camera or display threads exist.
+    detector = None
+    pool = None
+    controller = None
+    blob_size = detector_blob_size(roi)
+    if USE_THREADING and INFERENCE_WORKERS > 0:
+        detector_loader = partial(load_detector, classes, blob_size, threads=INFERENCE_WORKER_THREADS)
+        pool = InferencePool(INFERENCE_WORKERS, source.frame_shape, detector_loader,
+                             cv_threads=INFERENCE_WORKER_THREADS, roi=roi)
+        # Workers keep their input size, so only the interval is adapted
+        controller = create_controller([blob_size], blob_size, parallelism=INFERENCE_WORKERS)
+        startup.mark("worker pool start")
+    
+    # Start the log writer thread only now: forking the pool while it runs
+    # could leave the workers with a logging lock held by that thread
+    setup_logging()
+    
+    # Initialize camera or other frame source in the background; its warm-up
+    # overlaps with loading the network and the other set-up below
+    print(f"Setting up {args.source} frame source...")
+    def start_source():
+        start = time.perf_counter()
+        source.start()
+        startup.record("frame source start", time.perf_counter() - start)
+    source_starter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="source-start")
+    source_started = source_starter.submit(start_source)
+    
+    # Load neural network(s) and run the slow first forward pass now rather
+    # than on the first frame
+    detectors = {}
+    if pool is None:
+        detector = load_detector(classes, blob_size)
+        detectors = {detector.input_size: detector}
+        if USE_THREADING:
+            # Exported models with a fixed input size can only adapt the interval
+            blob_sizes = CONTROL_BLOB_SIZES if detector.resizable else [detector.input_size]
+            controller = create_controller(blob_sizes, detector.input_size)
+            if controller is not None:
+                # One detector per input size the controller can switch to
+                for size in controller.blob_sizes:
+                    if size not in detectors:
+                        detectors[size] = load_detector(classes, size)
+        for size_detector in detectors.values():
+            size_detector.warm_up()
+        startup.mark("network load and warm-up")
+    
+    # Frames are only drawn while a consumer (the preview window) is attached
+    renderer = FrameRenderer(classes)
+    if ENABLE_PREVIEW:
+        renderer.attach("preview")
+    
+    # Initialize OLED display and its update thread
+    oled_worker = None
     if ENABLE_OLED:
-        initialize_oled()
-        # Show starting message on OLED
-        update_oled_display(0, {}, 0, True)
+        oled_display = initialize_oled()
+        if oled_display is not None:
+            oled_worker = OledWorker(oled_display)
+            metrics.counter("vehicle_oled_bytes_sent_total", "Framebuffer bytes sent to the OLED",
+                            callback=lambda: oled_worker.bytes_sent)
+            metrics.counter("vehicle_oled_updates_total", "OLED redraws",
+                            callback=lambda: oled_worker.renders)
+            # Show starting message on OLED
+            oled_worker.update(0, {}, force=True)
+        startup.mark("OLED")
+    
+    # Keep the last seconds of video in memory and save clips around detections
+    recorder = None
+    if ENABLE_RECORDER:
+        recorder = EventRecorder()
+        metrics.counter("vehicle_recorder_clips_total", "Event clips written",
+                        callback=lambda: recorder.clips_written)
+        metrics.counter("vehicle_recorder_frames_dropped_total", "Frames the recorder could not keep up with",
+                        callback=lambda: recorder.frames_dropped)
+        metrics.gauge("vehicle_recorder_ring_bytes", "Memory held by the pre-event ring",
+                      callback=lambda: recorder.ring_bytes)
+    
+    # Save thumbnails of detected vehicles off the detection path
+    snapshots = None
+    if ENABLE_SNAPSHOTS:
+        snapshots = SnapshotStore(classes)
+        metrics.counter("vehicle_snapshots_written_total", "Snapshot JPEGs written",
+                        callback=lambda: snapshots.written)
+        metrics.counter("vehicle_snapshots_dropped_total", "Snapshots dropped because the workers were busy",
+                        callback=lambda: snapshots.dropped)
+        metrics.gauge("vehicle_snapshots_stored_bytes", "Disk space used by the snapshot store",
+                      callback=lambda: snapshots.stored_bytes)
+    
+    # Publish detection records to other processes on a local socket
+    events = None
+    if ENABLE_EVENT_STREAM:
+        try:
+            events = EventPublisher(classes)
+            metrics.gauge("vehicle_event_subscribers", "Clients connected to the detection event stream",
+                          callback=lambda: events.subscribers)
+            metrics.counter("vehicle_event_frames_dropped_total", "Frames dropped for slow event stream clients",
+                            callback=lambda: events.dropped)
+        except OSError as e:
+            print(f"Warning: Could not start detection event stream: {e}")
     
     # Initialize data logger if enabled
     data_logger = None
@@ -223,71 +623,128 @@ def main():
             data_logger = VehicleDataLogger()
         except Exception as e:
             print(f"Warning: Could not initialize data logger: {e}")
+    detection_log = None
+    if LOG_DETECTIONS and ENABLE_DETECTION_LOG:
+        try:
+            detection_log = DetectionLogWriter()
+        except Exception as e:
+            print(f"Warning: Could not initialize detection log: {e}")
     
-    # Initialize camera
-    print("Setting up camera...")
-    picam2 = setup_camera()
-    picam2.start()
-    time.sleep(2)  # Give camera time to warm up
+    # Serve runtime metrics for headless monitoring
+    metrics_server = None
+    if ENABLE_METRICS:
+        try:
+            metrics_server = MetricsServer(metrics, METRICS_HOST, METRICS_PORT)
+            metrics_server.start()
+        except OSError as e:
+            print(f"Warning: Could not start metrics server: {e}")
+    startup.mark("loggers and metrics")
+    
+    # Wait for the frame source (re-raises any error from starting it)
+    source_started.result()
+    source_starter.shutdown()
+    startup.mark("waiting for frame source")
     
     print("Vehicle detection started! Press 'q' to quit.")
     
     # Start threads if threading is enabled
     if USE_THREADING:
         # Create and start the capture thread
-        cap_thread = threading.Thread(target=capture_thread, args=(picam2,))
+        cap_thread = threading.Thread(target=capture_thread, args=(source, recorder))
         cap_thread.daemon = True
         cap_thread.start()
         
-        # Create and start the inference thread
-        inf_thread = threading.Thread(target=inference_thread, args=(net, classes))
-        inf_thread.daemon = True
-        inf_thread.start()
+        # Create and start the inference thread(s)
+        if pool is not None:
+            inf_threads = [
+                threading.Thread(target=pool_feeder_thread, args=(pool, roi, controller)),
+                threading.Thread(target=pool_result_thread, args=(pool, classes, controller)),
+            ]
+        else:
+            inf_threads = [threading.Thread(target=inference_thread, args=(detectors, classes, roi, controller))]
+        for inf_thread in inf_threads:
+            inf_thread.daemon = True
+            inf_thread.start()
         
         # Run display in the main thread
-        display_thread(data_logger)
+        display_thread(data_logger, detection_log, oled_worker, renderer, recorder, snapshots, events)
         
-        # Signal threads to stop
+        # Signal threads to stop and wake any thread waiting on a mailbox
         stop_event.set()
+        frame_mailbox.close()
+        result_mailbox.close()
         
         # Wait for threads to finish
         cap_thread.join(timeout=1.0)
-        inf_thread.join(timeout=1.0)
+        for inf_thread in inf_threads:
+            inf_thread.join(timeout=1.0)
+        if pool is not None:
+            pool.close()
+        
+        print(f"Dropped frames: {frame_mailbox.dropped}/{frame_mailbox.put_count} before inference, "
+              f"{result_mailbox.dropped}/{result_mailbox.put_count} before display")
     else:
         # Run everything in a single thread (original approach)
         try:
             frame_count = 0
+            frame_seq = 0
+            fps = 0
             start_time = time.time()
+            tracker = create_tracker()
+            motion_gate = create_motion_gate()
+            last_detections = None
+            scene_static = False
+            no_detections = np.empty(0, DETECTION_DTYPE)
             
             while True:
                 loop_start = time.time()
                 
                 # Capture frame from camera
-                frame = picam2.capture_array()
+                frame = source.read()
+                if frame is None:
+                    print("Frame source exhausted")
+                    break
+                frame_time = time.time()
+                frame_seq += 1
+                if recorder:
+                    recorder.add(frame, frame_time)
                 
                 # Only process every DETECTION_INTERVAL frames
                 frame_count += 1
                 if DETECTION_INTERVAL > 1 and frame_count % DETECTION_INTERVAL != 0:
-                    # Just display the frame without detection
-                    if ENABLE_PREVIEW:
-                        cv2.imshow("Vehicle Detection", frame)
-                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                    # Just display the frame (with tracked vehicles) without detection
+                    shown = track_skipped_frame(tracker, classes, last_detections, scene_static)[2] if tracker is not None else no_detections
+                    if not render_for_consumers(renderer, frame, shown):
                         break
                     continue
                 
-                # Create a 4D blob from the frame
-                blob = cv2.dnn.blobFromImage(frame, 1/255.0, (BLOB_SIZE, BLOB_SIZE), 
-                                           swapRB=True, crop=False)
-                
-                # Set the input blob for the neural network
-                net.setInput(blob)
-                
-                # Run forward pass to get output of the output layers
-                outs = net.forward(get_output_layers(net))
+                # Skip the detector while the scene is static
+                if motion_gate is not None and not motion_gate.should_run(frame if roi is None else roi.crop(frame)):
+                    scene_static = True
+                    shown = track_skipped_frame(tracker, classes, last_detections, static=True)[2]
+                    if not render_for_consumers(renderer, frame, shown):
+                        break
+                    continue
                 
-                # Process detections
-                processed_frame, vehicle_count, vehicle_types = process_detections(
-                    frame, outs, classes, CONFIDENCE_THRESHOLD, NMS_THRESHOLD)
+                # Run the detector (on the ROI crop if configured)
+                scene_static = False
+                if roi is None:
+                    detections = detector.detect(frame)
+                else:
+                    detections = roi.map_detections(detector.detect(roi.crop(frame)))
+                vehicle_count, vehicle_types = summarize_detections(detections, classes)
+                detection_summary.add(detections, classes)
+                if tracker is not None:
+                    detections = tracker.update(detections)
+                last_detections = detections
+                startup.detection_done()
+                if recorder and vehicle_count >= RECORD_MIN_VEHICLES:
+                    recorder.trigger(frame_time)
+                if snapshots and len(detections):
+                    snapshots.submit(frame, detections, frame_time, frame_seq)
+                if events:
+                    events.publish(frame_time, frame_seq, detections, vehicle_count,
+                                   tracker.total_count if tracker is not None else None)
                 
                 # Calculate FPS
                 elapsed = time.time() - start_time
@@ -295,25 +752,20 @@ def main():
                     fps = frame_count / elapsed
                     frame_count = 0
                     start_time = time.time()
-                    
-                    # Add FPS information
-                    cv2.putText(processed_frame, f"FPS: {fps:.1f}", (10, 30), 
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
                 
                 # Update OLED display
-                if ENABLE_OLED:
-                    update_oled_display(vehicle_count, vehicle_types)
+                if oled_worker:
+                    oled_worker.update(vehicle_count, vehicle_types)
                 
                 # Log vehicle data
                 if LOG_DETECTIONS and data_logger:
                     data_logger.log_data(vehicle_count, vehicle_types, fps)
+                if detection_log:
+                    detection_log.append(frame_time, frame_seq, detections)
                 
-                # Display the resulting frame
-                if ENABLE_PREVIEW:
-                    cv2.imshow("Vehicle Detection", processed_frame)
-                    
-                # Break the loop if 'q' pressed
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+                # Display the resulting frame; break the loop if 'q' pressed
+                if not render_for_consumers(renderer, frame, detections,
+                                            [f"FPS: {fps:.1f}", f"Vehicles: {vehicle_count}"]):
                     break
                 
                 # Add a small delay to prevent high CPU usage
@@ -323,10 +775,28 @@ def main():
                     
         except KeyboardInterrupt:
             print("Stopping detection...")
+        report_preprocess_stats(detector.preprocessor)
+        report_motion_stats(motion_gate)
     
     # Clean up
-    picam2.stop()
-    cv2.destroyAllWindows()
+    source.stop()
+    detection_summary.flush()
+    if oled_worker:
+        oled_worker.close()
+    if recorder:
+        recorder.close()
+    if snapshots:
+        snapshots.close()
+    if events:
+        events.close()
+    if data_logger:
+        data_logger.close()
+    if detection_log:
+        detection_log.close()
+    if metrics_server is not None:
+        metrics_server.stop()
+    if ENABLE_PREVIEW:
+        cv2.destroyAllWindows()
     print("Vehicle detection stopped.")
 
 if __name__ == "__main__":
@@ -0,0 +1,183 @@
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, spanning a fast decode step to a slow forward pass
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5)
+
+THERMAL_ZONE_PATH = "/sys/class/thermal/thermal_zone0/temp"
+
+def _format_labels(labels, extra=None):
+    """Format a label dict as a Prometheus label string"""
+    items = list(labels.items())
+    if extra:
+        items += list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return str(int(value))
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonically increasing count. Each counter should have a single writer thread."""
+
+    kind = "counter"
+
+    def __init__(self, labels=None, callback=None):
+        self.labels = labels or {}
+        self.callback = callback
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name):
+        yield name + _format_labels(self.labels), self.callback() if self.callback else self.value
+
+class Gauge:
+    """Value that can go up and down, either set directly or read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, labels=None, callback=None):
+        self.labels = labels or {}
+        self.callback = callback
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name):
+        value = self.callback() if self.callback else self.value
+        if value is not None:
+            yield name + _format_labels(self.labels), value
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is a bisect and two additions"""
+
+    kind = "histogram"
+
+    def __init__(self, labels=None, buckets=DEFAULT_BUCKETS):
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            yield name + "_bucket" + _format_labels(self.labels, {"le": _format_value(bound)}), cumulative
+        yield name + "_sum" + _format_labels(self.labels), self.sum
+        yield name + "_count" + _format_labels(self.labels), cumulative
+
+class MetricsRegistry:
+    """Collection of named metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families = {}  # name -> (kind, help, {label tuple: metric})
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            kind, _, metrics = self._families.setdefault(name, (cls.kind, help_text, {}))
+            if kind != cls.kind:
+                raise ValueError(f"Metric {name} already registered as a {kind}")
+            if key not in metrics:
+                metrics[key] = cls(labels=labels, **kwargs)
+            return metrics[key]
+
+    def counter(self, name, help_text, labels=None, callback=None):
+        return self._get(Counter, name, help_text, labels, callback=callback)
+
+    def gauge(self, name, help_text, labels=None, callback=None):
+        return self._get(Gauge, name, help_text, labels, callback=callback)
+
+    def histogram(self, name, help_text, labels=None, buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            families = [(name, kind, help_text, list(metrics.values()))
+                        for name, (kind, help_text, metrics) in self._families.items()]
+        lines = []
+        for name, kind, help_text, metrics in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in metrics:
+                try:
+                    for sample_name, value in metric.samples(name):
+                        lines.append(f"{sample_name} {_format_value(value)}")
+                except Exception as e:
+                    lines.append(f"# Error collecting {name}: {e}")
+        return "\n".join(lines) + "\n"
+
+def read_cpu_temperature():
+    """CPU temperature in degrees Celsius, or None if not available"""
+    try:
+        with open(THERMAL_ZONE_PATH) as f:
+            return int(f.read().strip()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+def read_rss_bytes():
+    """Resident set size of this process in bytes, or None if not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def register_process_metrics(registry):
+    """Add CPU temperature and memory gauges evaluated at scrape time"""
+    registry.gauge("vehicle_cpu_temperature_celsius", "SoC temperature",
+                   callback=read_cpu_temperature)
+    registry.gauge("vehicle_process_resident_memory_bytes", "Resident memory of the detection process",
+                   callback=read_rss_bytes)
+
+class MetricsServer:
+    """Serves a registry at http://host:port/metrics from a background thread"""
+
+    def __init__(self, registry, host="127.0.0.1", port=9108):
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?")[0] != "/metrics":
+                    handler.send_error(404)
+                    return
+                body = registry.render().encode()
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass  # Keep scrapes out of the service log
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        print(f"Metrics available at http://{host}:{port}/metrics")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,84 @@
+import time
+import cv2
+import numpy as np
+from config import (
+    MOTION_FRAME_WIDTH,
+    MOTION_PIXEL_THRESHOLD,
+    MOTION_SENSITIVITY,
+    MOTION_MAX_SKIP_SECONDS
+)
+
+class MotionGate:
+    """Decides whether a frame is worth a detector run.
+
+    Each frame is shrunk to a small grayscale copy (area averaging also removes
+    most sensor noise) and compared with the copy taken at the last detector
+    run. The detector only runs when enough pixels changed, or when
+    max_skip_seconds have passed so slow changes are never missed for long.
+    """
+
+    def __init__(self, width=MOTION_FRAME_WIDTH, pixel_threshold=MOTION_PIXEL_THRESHOLD,
+                 sensitivity=MOTION_SENSITIVITY, max_skip_seconds=MOTION_MAX_SKIP_SECONDS):
+        """
+        Args:
+            width: Width of the grayscale copy used for differencing
+            pixel_threshold: Gray level change (0-255) that counts a pixel as changed
+            sensitivity: Fraction of changed pixels that triggers a detector run
+            max_skip_seconds: Longest time without a detector run
+        """
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.sensitivity = sensitivity
+        self.max_skip_seconds = max_skip_seconds
+
+        self.executed = 0
+        self.skipped = 0
+        self.last_changed_fraction = 0.0
+
+        self._reference = None
+        self._last_run = 0.0
+        self._size = None
+        self._small = None
+        self._gray = None
+        self._diff = None
+
+    def _grayscale(self, frame):
+        if self._size is None:
+            height, width = frame.shape[:2]
+            self._size = (self.width, max(1, round(height * self.width / width)))
+            self._small = np.empty((self._size[1], self._size[0], 3), dtype=np.uint8)
+            self._gray = np.empty((self._size[1], self._size[0]), dtype=np.uint8)
+            self._diff = np.empty_like(self._gray)
+        cv2.resize(frame, self._size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        return self._gray
+
+    def should_run(self, frame):
+        """Return True if the detector should run on this frame"""
+        gray = self._grayscale(frame)
+        now = time.monotonic()
+
+        if self._reference is None:
+            run = True
+        else:
+            cv2.absdiff(gray, self._reference, dst=self._diff)
+            self.last_changed_fraction = np.count_nonzero(self._diff > self.pixel_threshold) / self._diff.size
+            run = (self.last_changed_fraction >= self.sensitivity or
+                   now - self._last_run >= self.max_skip_seconds)
+
+        if run:
+            self._reference = gray.copy()
+            self._last_run = now
+            self.executed += 1
+        else:
+            self.skipped += 1
+        return run
+
+    def stats(self):
+        """Detector runs executed and skipped so far"""
+        total = self.executed + self.skipped
+        return {
+            "executed": self.executed,
+            "skipped": self.skipped,
+            "skip_ratio": self.skipped / total if total else 0.0,
+        }
@@ -0,0 +1,316 @@
+import argparse
+import threading
+import time
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from config import OLED_WIDTH, OLED_HEIGHT, OLED_FULL_REFRESH_SECONDS
+
+LARGE_FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+MEDIUM_FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+LINE_HEIGHT = 24  # Tall enough for descenders of the 16 px font
+
+# SSD1306 commands used for partial updates
+SET_COL_ADDR = 0x21
+SET_PAGE_ADDR = 0x22
+DATA_PREFIX = b"\x40"
+
+_fonts = None
+
+def load_oled_fonts():
+    """Return (large_font, medium_font), loading them from disk only once"""
+    global _fonts
+    if _fonts is None:
+        try:
+            _fonts = (ImageFont.truetype(LARGE_FONT_PATH, 16),
+                      ImageFont.truetype(MEDIUM_FONT_PATH, 14))
+        except OSError:
+            # Fall back to default font if custom font fails
+            _fonts = (ImageFont.load_default(), ImageFont.load_default())
+    return _fonts
+
+def _text_width(draw, text, font):
+    try:
+        # For newer PIL versions
+        bbox = draw.textbbox((0, 0), text, font=font)
+        return bbox[2] - bbox[0]
+    except AttributeError:
+        # For older PIL versions
+        return draw.textsize(text, font=font)[0]
+
+def pack_pages(pixels):
+    """Pack a (height, width) bool image into SSD1306 pages (8 rows per byte, LSB on top)"""
+    height, width = pixels.shape
+    pages = np.packbits(pixels.reshape(height // 8, 8, width), axis=1, bitorder='little')
+    return pages.reshape(height // 8, width)
+
+class OledRenderer:
+    """Draws the vehicle summary from cached, pre-rendered text lines.
+
+    Each distinct line ("Total: 3", "Car: 2", ...) is rasterised once and kept
+    as a bit mask, so a redraw is a few array ORs instead of font rendering.
+    """
+
+    def __init__(self, width=OLED_WIDTH, height=OLED_HEIGHT):
+        self.width = width
+        self.height = height
+        self.large_font, self.medium_font = load_oled_fonts()
+        self._lines = {}  # (text, large) -> bool mask of LINE_HEIGHT x width
+
+    def _line(self, text, large):
+        mask = self._lines.get((text, large))
+        if mask is None:
+            font = self.large_font if large else self.medium_font
+            image = Image.new("1", (self.width, LINE_HEIGHT))
+            draw = ImageDraw.Draw(image)
+            # Center the text
+            draw.text(((self.width - _text_width(draw, text, font)) // 2, 0), text, font=font, fill=255)
+            mask = np.array(image, dtype=bool)
+            self._lines[(text, large)] = mask
+        return mask
+
+    def _paste(self, pixels, text, large, y):
+        mask = self._line(text, large)
+        rows = min(LINE_HEIGHT, self.height - y)
+        pixels[y:y + rows] |= mask[:rows]
+
+    def render_pixels(self, vehicle_count, vehicle_types=None):
+        """Return the display contents as a (height, width) bool array"""
+        pixels = np.zeros((self.height, self.width), dtype=bool)
+
+        # Draw total vehicles count at the top in large font
+        self._paste(pixels, f"Total: {vehicle_count}", True, 0)
+
+        # Draw each vehicle type with count, highest first
+        if vehicle_types:
+            y_position = 20
+            for vehicle_type, count in sorted(vehicle_types.items(), key=lambda x: x[1], reverse=True):
+                if count > 0:
+                    display_name = vehicle_type[0].upper() + vehicle_type[1:]
+                    self._paste(pixels, f"{display_name}: {count}", False, y_position)
+                    y_position += 16
+                    # Only show top 3 vehicle types to ensure they fit on screen
+                    if y_position > 55:
+                        break
+
+        # If no vehicles detected, show a message
+        if vehicle_count == 0:
+            self._paste(pixels, "No vehicles", False, 30)
+        return pixels
+
+    def render_pages(self, vehicle_count, vehicle_types=None):
+        """Return the display contents as SSD1306 page bytes, shape (height // 8, width)"""
+        return pack_pages(self.render_pixels(vehicle_count, vehicle_types))
+
+def dirty_regions(previous, pages):
+    """Yield (first_page, last_page, first_col, last_col) windows covering changed bytes"""
+    changed = previous != pages
+    dirty_pages = np.flatnonzero(changed.any(axis=1))
+    if len(dirty_pages) == 0:
+        return
+    # Group consecutive dirty pages into one window each
+    splits = np.flatnonzero(np.diff(dirty_pages) > 1) + 1
+    for run in np.split(dirty_pages, splits):
+        first, last = int(run[0]), int(run[-1])
+        columns = np.flatnonzero(changed[first:last + 1].any(axis=0))
+        yield first, last, int(columns[0]), int(columns[-1])
+
+def unpack_pages(pages):
+    """Inverse of pack_pages"""
+    pixels = np.unpackbits(pages[:, None, :], axis=1, bitorder='little')
+    return pixels.reshape(-1, pages.shape[1]).astype(bool)
+
+def send_pages(display, previous, pages):
+    """Send only the changed part of the framebuffer to an SSD1306_I2C display
+
+    Returns the number of data bytes written. Displays without raw I2C access
+    fall back to a full image()/show().
+    """
+    if not hasattr(display, "i2c_device") or not hasattr(display, "write_cmd"):
+        display.image(Image.fromarray(unpack_pages(pages)))
+        display.show()
+        return pages.size
+
+    # 64 px wide panels are mapped to the middle of the controller's 128 columns
+    col_offset = 32 if pages.shape[1] == 64 else 0
+    sent = 0
+    for first_page, last_page, first_col, last_col in dirty_regions(previous, pages):
+        display.write_cmd(SET_COL_ADDR)
+        display.write_cmd(first_col + col_offset)
+        display.write_cmd(last_col + col_offset)
+        display.write_cmd(SET_PAGE_ADDR)
+        display.write_cmd(first_page)
+        display.write_cmd(last_page)
+        data = pages[first_page:last_page + 1, first_col:last_col + 1].tobytes()
+        with display.i2c_device:
+            display.i2c_device.write(DATA_PREFIX + data)
+        sent += len(data)
+
+    # Keep the driver's own framebuffer in step for anyone calling show() later
+    buffer = getattr(display, "buffer", None)
+    if buffer is not None and len(buffer) == pages.size + 1:
+        buffer[1:] = pages.tobytes()
+    return sent
+
+class OledWorker:
+    """Updates the OLED from its own thread so I2C transfers never block the display loop.
+
+    update() only stores the newest counts; the worker renders the latest state
+    and pushes the pages that changed. A full refresh is sent every
+    full_refresh_seconds to recover from any corrupted pixels.
+    """
+
+    def __init__(self, display, renderer=None, full_refresh_seconds=OLED_FULL_REFRESH_SECONDS):
+        self.display = display
+        self.renderer = renderer or OledRenderer(display.width, display.height)
+        self.full_refresh_seconds = full_refresh_seconds
+
+        self.renders = 0
+        self.bytes_sent = 0
+        self.render_seconds = 0.0
+        self.transfer_seconds = 0.0
+
+        self._latest = None
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="oled", daemon=True)
+        self._thread.start()
+
+    def update(self, vehicle_count, vehicle_types=None, force=False):
+        """Hand over the newest counts without waiting for the display"""
+        self._latest = (vehicle_count, dict(vehicle_types) if vehicle_types else {}, force)
+        self._wake.set()
+
+    def _run(self):
+        shown_state = None
+        shown_pages = None
+        last_full_refresh = 0.0
+
+        while not self._stopped:
+            self._wake.wait(timeout=self.full_refresh_seconds)
+            self._wake.clear()
+            if self._stopped or self._latest is None:
+                continue
+            vehicle_count, vehicle_types, force = self._latest
+
+            now = time.monotonic()
+            full_refresh = force or shown_pages is None or now - last_full_refresh >= self.full_refresh_seconds
+            state = (vehicle_count, vehicle_types)
+            if state == shown_state and not full_refresh:
+                continue
+
+            try:
+                start = time.perf_counter()
+                pages = self.renderer.render_pages(vehicle_count, vehicle_types)
+                rendered = time.perf_counter()
+                if full_refresh:
+                    # Diff against the inverse so every byte is resent
+                    previous = ~pages
+                    last_full_refresh = now
+                else:
+                    previous = shown_pages
+                self.bytes_sent += send_pages(self.display, previous, pages)
+                done = time.perf_counter()
+            except Exception as e:
+                print(f"Error updating OLED display: {e}")
+                continue
+
+            self.renders += 1
+            self.render_seconds += rendered - start
+            self.transfer_seconds += done - rendered
+            shown_state = state
+            shown_pages = pages
+
+    def close(self):
+        """Stop the worker thread"""
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=1.0)
+
+class MockDisplay:
+    """Stand-in for adafruit_ssd1306.SSD1306_I2C that simulates I2C transfer time"""
+
+    def __init__(self, width=OLED_WIDTH, height=OLED_HEIGHT, bus_hz=400000):
+        self.width = width
+        self.height = height
+        self.bus_hz = bus_hz
+        self.buffer = bytearray(width * height // 8 + 1)
+        self.buffer[0] = 0x40
+        self.bytes_written = 0
+        self.i2c_device = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def write(self, data):
+        # Address byte plus 9 clocks (8 bits + ACK) per byte
+        self.bytes_written += len(data)
+        time.sleep((len(data) + 1) * 9 / self.bus_hz)
+
+    def write_cmd(self, cmd):
+        self.write(bytes([0x80, cmd]))
+
+    def image(self, image):
+        self.buffer[1:] = pack_pages(np.array(image.convert("1"), dtype=bool)).tobytes()
+
+    def show(self):
+        for cmd in (SET_COL_ADDR, 0, self.width - 1, SET_PAGE_ADDR, 0, self.height // 8 - 1):
+            self.write_cmd(cmd)
+        self.write(self.buffer)
+
+def benchmark(num_updates=200):
+    """Compare full redraws with the cached renderer and dirty-page updates on a mock display"""
+    global _fonts
+
+    # Counts that change a little between updates, like real traffic
+    rng = np.random.default_rng(0)
+    states = []
+    for _ in range(num_updates):
+        cars, trucks, buses = (int(n) for n in rng.integers(0, [6, 3, 2]))
+        types = {name: n for name, n in (("car", cars), ("truck", trucks), ("bus", buses)) if n}
+        states.append((cars + trucks + buses, types))
+
+    display = MockDisplay()
+    start = time.perf_counter()
+    render_time = 0.0
+    for vehicle_count, vehicle_types in states:
+        t0 = time.perf_counter()
+        # The old path loaded the fonts and drew every line on each update
+        _fonts = None
+        image = Image.fromarray(OledRenderer().render_pixels(vehicle_count, vehicle_types))
+        render_time += time.perf_counter() - t0
+        display.image(image)
+        display.show()
+    old_total = time.perf_counter() - start
+    old_bytes = display.bytes_written
+
+    display = MockDisplay()
+    renderer = OledRenderer()
+    previous = np.zeros((display.height // 8, display.width), dtype=np.uint8)
+    start = time.perf_counter()
+    new_render_time = 0.0
+    for vehicle_count, vehicle_types in states:
+        t0 = time.perf_counter()
+        pages = renderer.render_pages(vehicle_count, vehicle_types)
+        new_render_time += time.perf_counter() - t0
+        send_pages(display, previous, pages)
+        previous = pages
+    new_total = time.perf_counter() - start
+    new_bytes = display.bytes_written
+
+    print(f"\nOLED update over {num_updates} updates (mock display, 400 kHz I2C):")
+    print("| Path                 | Render (ms) | Transfer (ms) | I2C bytes |")
+    print("|----------------------|-------------|---------------|-----------|")
+    for name, total, render, written in (
+            ("full redraw + show()", old_total, render_time, old_bytes),
+            ("cached + dirty pages", new_total, new_render_time, new_bytes)):
+        print(f"| {name:20} | {render / num_updates * 1000:11.3f} | "
+              f"{(total - render) / num_updates * 1000:13.3f} | {written // num_updates:9} |")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='OLED render and transfer microbenchmark')
+    parser.add_argument('--updates', type=int, default=200, help='Display updates to time')
+    args = parser.parse_args()
+    benchmark(args.updates)
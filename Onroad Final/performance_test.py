@@ -1,12 +1,13 @@
 import cv2
 import numpy as np
 import time
-import os
-from picamera2 import Picamera2
+import argparse
 from utils import load_classes, get_output_layers, process_detections
+from preprocess import BlobPreprocessor
+from frame_sources import add_source_arguments, source_from_args
 from config import *
 
-def run_performance_test():
+def run_performance_test(source):
     """Run a performance test with different configuration settings"""
     print("Starting performance benchmark...")
     
@@ -14,15 +15,8 @@ def run_performance_test():
     classes = load_classes(CLASSES_PATH)
     net = cv2.dnn.readNet(MODEL_PATH, CONFIG_PATH)
     
-    # Set up camera
-    picam2 = Picamera2()
-    config = picam2.create_preview_configuration(
-        main={"size": (CAMERA_WIDTH, CAMERA_HEIGHT), "format": "RGB888"},
-        controls={"FrameRate": CAMERA_FRAMERATE}
-    )
-    picam2.configure(config)
-    picam2.start()
-    time.sleep(2)  # Camera warm-up
+    # Set up camera or other frame source
+    source.start()
     
     # Blob sizes to test
     blob_sizes = [320, 416, 512]
@@ -39,7 +33,7 @@ def run_performance_test():
     results = []
     
     # Capture a test frame
-    test_frame = picam2.capture_array()
+    test_frame = source.read()
     
     for blob_size in blob_sizes:
         for name, backend, target in backends:
@@ -48,30 +42,27 @@ def run_performance_test():
             # Configure network
             net.setPreferableBackend(backend)
             net.setPreferableTarget(target)
+            preprocessor = BlobPreprocessor(blob_size)
             
             # Warmup
-            blob = cv2.dnn.blobFromImage(test_frame, 1/255.0, (blob_size, blob_size), 
-                                        swapRB=True, crop=False)
-            net.setInput(blob)
+            net.setInput(preprocessor(test_frame))
             _ = net.forward(get_output_layers(net))
             
             # Benchmarking
             times = []
             for _ in range(20):  # Test 20 frames
-                frame = picam2.capture_array()
+                frame = source.read()
+                if frame is None:
+                    frame = test_frame  # Reuse the first frame once a file source runs out
                 
                 start_time = time.time()
                 
                 # Create blob
-                blob = cv2.dnn.blobFromImage(frame, 1/255.0, (blob_size, blob_size), 
-                                           swapRB=True, crop=False)
-                
-                # Inference
-                net.setInput(blob)
+                net.setInput(preprocessor(frame))
                 outs = net.forward(get_output_layers(net))
                 
                 # Process detections (measure full pipeline)
-                _, vehicle_count, _ = process_detections(
+                _, vehicle_count, _, _ = process_detections(
                     frame, outs, classes, CONFIDENCE_THRESHOLD, NMS_THRESHOLD)
                 
                 elapsed = time.time() - start_time
@@ -88,10 +79,11 @@ def run_performance_test():
                 "fps": fps
             })
             
-            print(f"  Result: {fps:.1f} FPS ({avg_time*1000:.1f} ms per frame)")
+            print(f"  Result: {fps:.1f} FPS ({avg_time*1000:.1f} ms per frame, "
+                  f"{preprocessor.stats()['mean_ms']:.2f} ms preprocessing)")
     
     # Clean up
-    picam2.stop()
+    source.stop()
     
     # Print results table
     print("\nPerformance Benchmark Results:")
@@ -129,4 +121,7 @@ def run_performance_test():
     print("\nRestart your application to apply changes.")
 
 if __name__ == "__main__":
-    run_performance_test()
+    parser = argparse.ArgumentParser(description='Benchmark blob sizes and backends')
+    add_source_arguments(parser)
+    args = parser.parse_args()
+    run_performance_test(source_from_args(args))
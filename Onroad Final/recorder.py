@@ -0,0 +1,208 @@
+import argparse
+import collections
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+from config import (
+    RECORD_DIR,
+    RECORD_PRE_SECONDS,
+    RECORD_POST_SECONDS,
+    RECORD_MAX_SECONDS,
+    RECORD_WIDTH,
+    RECORD_JPEG_QUALITY,
+    RECORD_BUFFER_MB,
+    RECORD_QUEUE_SIZE
+)
+
+class EventRecorder:
+    """Writes video clips around detection events, starting before the event.
+
+    add() hands frames to a ring thread without ever blocking; if that thread
+    falls behind, frames are dropped and counted. The ring thread shrinks each
+    frame to at most `width` pixels wide and keeps it as a JPEG, so the
+    pre-event ring costs a few tens of KB per frame and is capped at
+    buffer_mb. When trigger() is called, the ring (the last pre_seconds) and
+    the frames of the following post_seconds become one clip; triggers during
+    a clip extend it up to max_seconds. Finished clips are decoded and written
+    by a separate encoder thread.
+    """
+
+    def __init__(self, output_dir=RECORD_DIR, pre_seconds=RECORD_PRE_SECONDS,
+                 post_seconds=RECORD_POST_SECONDS, max_seconds=RECORD_MAX_SECONDS,
+                 width=RECORD_WIDTH, jpeg_quality=RECORD_JPEG_QUALITY,
+                 buffer_mb=RECORD_BUFFER_MB, queue_size=RECORD_QUEUE_SIZE):
+        self.output_dir = output_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_seconds = max_seconds
+        self.width = width
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.buffer_bytes = int(buffer_mb * 1024 * 1024)
+        os.makedirs(output_dir, exist_ok=True)
+
+        self.frames_added = 0
+        self.frames_dropped = 0
+        self.clips_written = 0
+        self.ring_bytes = 0
+        self.last_clip = None
+
+        self._frames = queue.Queue(maxsize=queue_size)
+        self._clips = queue.Queue()
+        self._ring = collections.deque()  # (timestamp, jpeg bytes)
+        self._lock = threading.Lock()
+        self._trigger_time = None  # Earliest pending trigger not yet turned into a clip
+        self._record_until = 0.0
+
+        self._ring_thread = threading.Thread(target=self._run_ring, name="recorder-ring", daemon=True)
+        self._encoder_thread = threading.Thread(target=self._run_encoder, name="recorder-encoder", daemon=True)
+        self._ring_thread.start()
+        self._encoder_thread.start()
+
+    def add(self, frame, timestamp):
+        """Offer a frame to the ring; never blocks"""
+        try:
+            self._frames.put_nowait((timestamp, frame))
+            self.frames_added += 1
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def trigger(self, timestamp):
+        """Record from pre_seconds before timestamp until post_seconds after it"""
+        with self._lock:
+            if self._trigger_time is None:
+                self._trigger_time = timestamp
+            self._record_until = max(self._record_until, timestamp + self.post_seconds)
+
+    def _compress(self, frame):
+        height, width = frame.shape[:2]
+        if width > self.width:
+            frame = cv2.resize(frame, (self.width, round(height * self.width / width)),
+                               interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode(".jpg", frame, self.encode_params)
+        return jpeg.tobytes() if ok else None
+
+    def _run_ring(self):
+        clip = None
+        while True:
+            item = self._frames.get()
+            if item is None:
+                break
+            timestamp, frame = item
+            jpeg = self._compress(frame)
+            if jpeg is None:
+                continue
+
+            with self._lock:
+                trigger_time = self._trigger_time
+                record_until = self._record_until
+
+            if clip is None and trigger_time is not None and timestamp >= trigger_time:
+                # Start the clip with the part of the ring inside the pre-event window
+                clip = [entry for entry in self._ring if entry[0] >= trigger_time - self.pre_seconds]
+                self._ring.clear()
+                self.ring_bytes = 0
+
+            if clip is not None:
+                clip.append((timestamp, jpeg))
+                # Decide under the lock, so a trigger arriving meanwhile either
+                # extends this clip or stays pending and starts the next one
+                with self._lock:
+                    finished = (timestamp >= self._record_until or
+                                timestamp - clip[0][0] >= self.max_seconds)
+                    if finished and self._record_until == record_until:
+                        self._trigger_time = None
+                        self._record_until = 0.0
+                if finished:
+                    self._clips.put(clip)
+                    clip = None
+                continue
+
+            # Keep only the pre-event window, within the memory budget
+            self._ring.append((timestamp, jpeg))
+            self.ring_bytes += len(jpeg)
+            while self._ring and (self._ring[0][0] < timestamp - self.pre_seconds or
+                                  self.ring_bytes > self.buffer_bytes):
+                self.ring_bytes -= len(self._ring.popleft()[1])
+
+        # Save a clip that was still being recorded
+        if clip:
+            self._clips.put(clip)
+        self._clips.put(None)
+
+    def _run_encoder(self):
+        while True:
+            clip = self._clips.get()
+            if clip is None:
+                break
+            try:
+                self._write_clip(clip)
+            except Exception as e:
+                print(f"Error writing event clip: {e}")
+
+    def _write_clip(self, clip):
+        duration = clip[-1][0] - clip[0][0]
+        fps = (len(clip) - 1) / duration if duration > 0 else 1.0
+        start = datetime.fromtimestamp(clip[0][0]).strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        path = os.path.join(self.output_dir, f"event_{start}.avi")
+
+        writer = None
+        for _, jpeg in clip:
+            frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if writer is None:
+                height, width = frame.shape[:2]
+                writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+            writer.write(frame)
+        writer.release()
+        self.clips_written += 1
+        self.last_clip = path
+        print(f"Event clip saved: {path} ({len(clip)} frames, {duration:.1f} s)")
+
+    def close(self):
+        """Finish the current clip, write all pending clips and stop the threads"""
+        self._frames.put(None)
+        self._ring_thread.join()
+        self._encoder_thread.join()
+
+def benchmark(num_frames=300, width=640, height=480):
+    """Compare holding raw frames with the JPEG ring, and time add() on the caller's thread"""
+    import tempfile
+    from frame_sources import SyntheticSource
+
+    source = SyntheticSource(width, height, realtime=False)
+    with source:
+        frames = [source.read() for _ in range(num_frames)]
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        # A large queue so the comparison measures compression, not dropping
+        recorder = EventRecorder(output_dir, pre_seconds=1e9, buffer_mb=1024, queue_size=num_frames)
+        start = time.perf_counter()
+        add_times = []
+        for i, frame in enumerate(frames):
+            t0 = time.perf_counter()
+            recorder.add(frame, i / 30.0)
+            add_times.append(time.perf_counter() - t0)
+        while recorder._frames.qsize():
+            time.sleep(0.01)
+        ring_seconds = time.perf_counter() - start
+        ring_bytes = recorder.ring_bytes
+        recorder.trigger(num_frames / 30.0)
+        recorder.add(frames[-1], num_frames / 30.0 + recorder.post_seconds)
+        recorder.close()
+
+    raw_bytes = sum(frame.nbytes for frame in frames)
+    print(f"\nPre-event ring over {num_frames} frames ({width}x{height}):")
+    print(f"  Raw frames:  {raw_bytes / 1024 / 1024:7.1f} MB")
+    print(f"  JPEG ring:   {ring_bytes / 1024 / 1024:7.1f} MB ({ring_bytes / num_frames / 1024:.1f} KB per frame)")
+    print(f"  add() on the capture thread: {np.mean(add_times) * 1e6:.0f} us mean, "
+          f"{np.max(add_times) * 1e6:.0f} us max")
+    print(f"  Ring thread: {ring_seconds / num_frames * 1000:.2f} ms per frame")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Pre-event recorder memory and overhead benchmark')
+    parser.add_argument('--frames', type=int, default=300, help='Frames to buffer')
+    args = parser.parse_args()
+    benchmark(args.frames)
@@ -0,0 +1,74 @@
+import threading
+import cv2
+import numpy as np
+from config import DISPLAY_WIDTH, DISPLAY_HEIGHT
+from utils import draw_detections
+
+class FrameRenderer:
+    """Draws detections and status text for whoever wants to see frames.
+
+    Detection only produces data. This stage runs only while a consumer (the
+    preview window, a recorder, a stream) is attached, and it draws onto a
+    reused buffer of at most DISPLAY_WIDTH x DISPLAY_HEIGHT, so the camera
+    frame is never modified and headless runs pay nothing for visuals.
+    """
+
+    def __init__(self, classes, width=DISPLAY_WIDTH, height=DISPLAY_HEIGHT):
+        self.classes = classes
+        self.max_width = width
+        self.max_height = height
+        self.renders = 0
+
+        self._consumers = set()
+        self._lock = threading.Lock()
+        self._frame_shape = None
+        self._size = None
+        self._scale = None
+        self._buffer = None
+
+    def attach(self, name):
+        """Register a consumer of rendered frames"""
+        with self._lock:
+            self._consumers.add(name)
+
+    def detach(self, name):
+        """Remove a consumer; rendering stops when none are left"""
+        with self._lock:
+            self._consumers.discard(name)
+
+    @property
+    def active(self):
+        """True if any consumer is attached"""
+        return bool(self._consumers)
+
+    def _prepare(self, frame_shape):
+        height, width = frame_shape[:2]
+        scale = min(self.max_width / width, self.max_height / height, 1.0)
+        self._size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        self._scale = np.array([self._size[0] / width, self._size[1] / height] * 2)
+        self._buffer = np.empty((self._size[1], self._size[0], 3), dtype=np.uint8)
+        self._frame_shape = frame_shape
+
+    def render(self, frame, detections, lines=()):
+        """Return the frame with boxes and status lines drawn, at display size
+
+        The returned array is overwritten by the next call; copy it to keep it.
+        """
+        if frame.shape != self._frame_shape:
+            self._prepare(frame.shape)
+
+        if self._size == (frame.shape[1], frame.shape[0]):
+            np.copyto(self._buffer, frame)
+        else:
+            cv2.resize(frame, self._size, dst=self._buffer, interpolation=cv2.INTER_AREA)
+
+        if len(detections):
+            scaled = detections.copy()
+            scaled['box'] = np.round(detections['box'] * self._scale).astype(np.int32)
+            draw_detections(self._buffer, scaled, self.classes)
+
+        for i, text in enumerate(lines):
+            cv2.putText(self._buffer, text, (10, 30 + 30 * i),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+        self.renders += 1
+        return self._buffer
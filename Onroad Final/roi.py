@@ -0,0 +1,106 @@
+import argparse
+import cv2
+import numpy as np
+from config import (
+    CAMERA_WIDTH,
+    CAMERA_HEIGHT,
+    ROI_POLYGONS,
+    ROI_MARGIN
+)
+
+class RegionOfInterest:
+    """Polygon regions of the frame where vehicles can appear.
+
+    Detection runs on the bounding crop of all polygons, and detections whose
+    ground point (bottom centre of the box) falls outside the polygons are
+    rejected with a lookup in a precomputed mask.
+    """
+
+    def __init__(self, polygons, frame_shape, margin=ROI_MARGIN,
+                 reference_size=(CAMERA_WIDTH, CAMERA_HEIGHT)):
+        """
+        Args:
+            polygons: List of polygons, each a list of (x, y) points
+            frame_shape: (height, width, ...) of the frames to be processed
+            margin: Extra pixels around the polygons kept in the crop
+            reference_size: (width, height) the polygon points refer to
+        """
+        frame_height, frame_width = frame_shape[:2]
+        scale = np.array([frame_width / reference_size[0], frame_height / reference_size[1]])
+        self.polygons = [np.round(np.asarray(polygon, dtype=np.float64) * scale).astype(np.int32)
+                         for polygon in polygons]
+        if not self.polygons:
+            raise ValueError("At least one ROI polygon is required")
+
+        # Lookup table: True where a vehicle's ground point may be
+        mask = np.zeros((frame_height, frame_width), dtype=np.uint8)
+        cv2.fillPoly(mask, self.polygons, 1)
+        self.mask = mask.astype(bool)
+
+        x, y, w, h = cv2.boundingRect(np.concatenate(self.polygons))
+        self.x0 = max(0, x - margin)
+        self.y0 = max(0, y - margin)
+        self.x1 = min(frame_width, x + w + margin)
+        self.y1 = min(frame_height, y + h + margin)
+        self.frame_shape = (frame_height, frame_width)
+
+    @property
+    def crop_shape(self):
+        """(height, width) of the crop handed to the detector"""
+        return self.y1 - self.y0, self.x1 - self.x0
+
+    @property
+    def coverage(self):
+        """Fraction of the frame inside the crop"""
+        crop_height, crop_width = self.crop_shape
+        return crop_height * crop_width / (self.frame_shape[0] * self.frame_shape[1])
+
+    def crop(self, frame):
+        """View of the frame covering the ROI bounding box (no copy)"""
+        return frame[self.y0:self.y1, self.x0:self.x1]
+
+    def map_detections(self, detections):
+        """Shift crop detections to frame coordinates and drop those outside the polygons"""
+        if len(detections) == 0:
+            return detections
+        boxes = detections['box']
+        boxes[:, 0] += self.x0
+        boxes[:, 1] += self.y0
+
+        # Ground point of each box, clamped into the frame
+        ground_x = np.clip(boxes[:, 0] + boxes[:, 2] // 2, 0, self.frame_shape[1] - 1)
+        ground_y = np.clip(boxes[:, 1] + boxes[:, 3], 0, self.frame_shape[0] - 1)
+        return detections[self.mask[ground_y, ground_x]]
+
+    def draw(self, frame, color=(255, 255, 0)):
+        """Outline the polygons and the crop on a frame"""
+        cv2.polylines(frame, self.polygons, True, color, 1)
+        cv2.rectangle(frame, (self.x0, self.y0), (self.x1 - 1, self.y1 - 1), color, 1)
+        return frame
+
+def create_roi(frame_shape, polygons=ROI_POLYGONS):
+    """Build the configured region of interest, or None to use the whole frame"""
+    if not polygons:
+        return None
+    roi = RegionOfInterest(polygons, frame_shape)
+    print(f"Region of interest: {len(roi.polygons)} polygon(s), detecting on a "
+          f"{roi.crop_shape[1]}x{roi.crop_shape[0]} crop ({roi.coverage * 100:.0f}% of the frame)")
+    return roi
+
+if __name__ == "__main__":
+    from frame_sources import add_source_arguments, source_from_args
+
+    parser = argparse.ArgumentParser(description='Save a frame with the configured ROI drawn on it')
+    add_source_arguments(parser)
+    parser.add_argument('--output', default='roi_preview.png', help='Image file to write')
+    args = parser.parse_args()
+
+    with source_from_args(args) as source:
+        frame = source.read()
+    if frame is None:
+        raise SystemExit("Frame source produced no frames")
+    roi = create_roi(frame.shape)
+    if roi is None:
+        raise SystemExit("No ROI_POLYGONS configured in config.py")
+    cv2.imwrite(args.output, roi.draw(frame))
+    print(f"ROI preview saved to {args.output}")
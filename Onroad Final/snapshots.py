@@ -0,0 +1,238 @@
+import argparse
+import collections
+import csv
+import hashlib
+import os
+import queue
+import threading
+import time
+import cv2
+from config import (
+    SNAPSHOT_DIR,
+    SNAPSHOT_MODE,
+    SNAPSHOT_WORKERS,
+    SNAPSHOT_QUEUE_SIZE,
+    SNAPSHOT_MIN_INTERVAL,
+    SNAPSHOT_MAX_SIZE,
+    SNAPSHOT_PADDING,
+    SNAPSHOT_JPEG_QUALITY,
+    SNAPSHOT_QUOTA_MB
+)
+
+INDEX_COLUMNS = ["Timestamp", "Frame", "Class", "Score", "Track", "X", "Y", "W", "H", "SHA256", "Bytes"]
+
+def object_path(root, digest):
+    """Path of a stored JPEG in the content-addressed store"""
+    return os.path.join(root, "objects", digest[:2], digest[2:] + ".jpg")
+
+def read_index(root, class_name=None, start_time=None, end_time=None):
+    """Yield index rows (dicts) for snapshots whose files are still stored"""
+    path = os.path.join(root, "index.csv")
+    if not os.path.exists(path):
+        return
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            timestamp = float(row["Timestamp"])
+            if class_name is not None and row["Class"] != class_name:
+                continue
+            if (start_time is not None and timestamp < start_time) or \
+               (end_time is not None and timestamp >= end_time):
+                continue
+            row["Path"] = object_path(root, row["SHA256"])
+            if os.path.exists(row["Path"]):
+                yield row
+
+class SnapshotStore:
+    """JPEG thumbnails of detected vehicles, encoded by a small pool of worker threads.
+
+    submit() runs on the detection path and only does the cheap part: the
+    rate limit (one snapshot per track, or per class for untracked boxes,
+    every min_interval seconds) and slicing out the crops. Resizing, JPEG
+    encoding, hashing and writing happen on the workers; when they fall
+    behind, new jobs are dropped and counted. Files are named by their
+    SHA-256, so identical images are stored once, and each snapshot gets a
+    row in index.csv. Once the store exceeds quota_mb, the oldest files are
+    deleted.
+    """
+
+    def __init__(self, classes, root=SNAPSHOT_DIR, mode=SNAPSHOT_MODE, workers=SNAPSHOT_WORKERS,
+                 queue_size=SNAPSHOT_QUEUE_SIZE, min_interval=SNAPSHOT_MIN_INTERVAL,
+                 max_size=SNAPSHOT_MAX_SIZE, padding=SNAPSHOT_PADDING,
+                 jpeg_quality=SNAPSHOT_JPEG_QUALITY, quota_mb=SNAPSHOT_QUOTA_MB):
+        if mode not in ("crop", "frame"):
+            raise ValueError(f"Unknown snapshot mode {mode!r} (choose from crop, frame)")
+        self.classes = classes
+        self.root = root
+        self.mode = mode
+        self.min_interval = min_interval
+        self.max_size = max_size
+        self.padding = padding
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.quota_bytes = int(quota_mb * 1024 * 1024)
+
+        self.submitted = 0
+        self.rate_limited = 0
+        self.dropped = 0
+        self.written = 0
+        self.duplicates = 0
+        self.evicted = 0
+
+        self._last_saved = {}  # Rate limit key -> time of the last snapshot
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._store_lock = threading.Lock()
+        self._files, self.stored_bytes = self._scan_objects()
+
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        index_path = os.path.join(root, "index.csv")
+        new_index = not os.path.exists(index_path)
+        self._index_file = open(index_path, "a", newline="")
+        self._index = csv.writer(self._index_file)
+        if new_index:
+            self._index.writerow(INDEX_COLUMNS)
+            self._index_file.flush()
+
+        self._workers = [threading.Thread(target=self._worker_loop, name=f"snapshot-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for worker in self._workers:
+            worker.start()
+        print(f"Snapshot store initialized at {root} ({self.stored_bytes / 1024 / 1024:.1f} MB stored)")
+
+    def _scan_objects(self):
+        """Stored files oldest first, and their total size"""
+        files = []
+        for directory, _, names in os.walk(os.path.join(self.root, "objects")):
+            for name in names:
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, path, stat.st_size))
+        files.sort()
+        return collections.deque((path, size) for _, path, size in files), sum(size for _, _, size in files)
+
+    def _rate_key(self, detection):
+        track_id = int(detection['track_id'])
+        if track_id >= 0:
+            return ("track", track_id)
+        return ("class", int(detection['class_id']))
+
+    def submit(self, frame, detections, timestamp, frame_seq):
+        """Queue snapshots for the detections that are due; never blocks
+
+        The frame must not be modified afterwards (crops are views of it).
+        """
+        due = []
+        for detection in detections:
+            key = self._rate_key(detection)
+            last = self._last_saved.get(key)
+            if last is not None and timestamp - last < self.min_interval:
+                self.rate_limited += 1
+                continue
+            self._last_saved[key] = timestamp
+            due.append(detection)
+        if not due:
+            return
+
+        # Forget tracks that ended long ago so the table stays small
+        if len(self._last_saved) > 1000:
+            self._last_saved = {key: last for key, last in self._last_saved.items()
+                                if timestamp - last < self.min_interval}
+
+        if self.mode == "frame":
+            jobs = [(frame, due)]
+        else:
+            jobs = [(self._crop(frame, detection['box']), [detection]) for detection in due]
+        for image, job_detections in jobs:
+            self.submitted += 1
+            try:
+                self._queue.put_nowait((image, job_detections, timestamp, frame_seq))
+            except queue.Full:
+                self.dropped += 1
+
+    def _crop(self, frame, box):
+        x, y, w, h = (int(v) for v in box)
+        pad_x, pad_y = int(w * self.padding), int(h * self.padding)
+        height, width = frame.shape[:2]
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(width, x + w + pad_x), min(height, y + h + pad_y)
+        return frame[y0:max(y0 + 1, y1), x0:max(x0 + 1, x1)]
+
+    def _encode(self, image):
+        if image.size == 0:
+            return None
+        height, width = image.shape[:2]
+        scale = self.max_size / max(height, width)
+        if scale < 1.0:
+            image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode(".jpg", image, self.encode_params)
+        return jpeg.tobytes() if ok else None
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            image, detections, timestamp, frame_seq = job
+            try:
+                jpeg = self._encode(image)
+                if jpeg is not None:
+                    self._store(jpeg, detections, timestamp, frame_seq)
+            except Exception as e:
+                print(f"Error saving snapshot: {e}")
+
+    def _store(self, jpeg, detections, timestamp, frame_seq):
+        digest = hashlib.sha256(jpeg).hexdigest()
+        path = object_path(self.root, digest)
+        # Encoding runs in parallel; the small write and the index are serialized
+        with self._store_lock:
+            if os.path.exists(path):
+                self.duplicates += 1
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + ".tmp", "wb") as f:
+                    f.write(jpeg)
+                os.replace(path + ".tmp", path)
+                self.written += 1
+                self._files.append((path, len(jpeg)))
+                self.stored_bytes += len(jpeg)
+                self._enforce_quota()
+            for detection in detections:
+                x, y, w, h = (int(v) for v in detection['box'])
+                self._index.writerow([f"{timestamp:.3f}", frame_seq, self.classes[detection['class_id']],
+                                      f"{detection['score']:.3f}", int(detection['track_id']),
+                                      x, y, w, h, digest, len(jpeg)])
+            self._index_file.flush()
+
+    def _enforce_quota(self):
+        while self.stored_bytes > self.quota_bytes and len(self._files) > 1:
+            path, size = self._files.popleft()
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.stored_bytes -= size
+            self.evicted += 1
+
+    def close(self):
+        """Encode everything still queued and close the index"""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._index_file.close()
+        print(f"Snapshots: {self.written} written, {self.duplicates} duplicates, "
+              f"{self.rate_limited} rate limited, {self.dropped} dropped, {self.evicted} evicted")
+
+def main():
+    parser = argparse.ArgumentParser(description='List stored vehicle snapshots')
+    parser.add_argument('root', nargs='?', default=SNAPSHOT_DIR, help='Snapshot store directory')
+    parser.add_argument('--class', dest='class_name', default=None, help='Only this class (e.g. car)')
+    parser.add_argument('--since-minutes', type=float, default=None, help='Only the last N minutes')
+    args = parser.parse_args()
+
+    start_time = time.time() - args.since_minutes * 60 if args.since_minutes else None
+    for row in read_index(args.root, args.class_name, start_time):
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(float(row['Timestamp'])))}  "
+              f"{row['Class']:10} {float(row['Score']):.2f}  track {row['Track']:>5}  {row['Path']}")
+
+if __name__ == "__main__":
+    main()
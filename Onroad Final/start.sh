@@ -26,8 +26,8 @@ if [ -z "$DISPLAY" ] && [ -e "/dev/tty1" ]; then
     fi
 fi
 
-# Check for required dependencies
-if ! pip3 list | grep -q adafruit-circuitpython-ssd1306; then
+# Check for required dependencies (an import is much faster than listing every package)
+if ! python3 -c "import adafruit_ssd1306" 2> /dev/null; then
     echo "Installing OLED display dependencies..."
     pip3 install adafruit-circuitpython-ssd1306 pillow
 fi
@@ -0,0 +1,61 @@
+import os
+import threading
+import time
+
+def process_age():
+    """Seconds since this process was started (including interpreter start-up), or None"""
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may contain spaces; fields after it are space separated
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])  # Field 22: start time in clock ticks after boot
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+class StartupProfiler:
+    """Records how long each start-up phase takes until the first detection"""
+
+    def __init__(self):
+        # Put the origin at process start so imports are included
+        age = process_age()
+        self.origin = time.perf_counter() - (age or 0.0)
+        self.phases = []  # (name, seconds)
+        self.first_detection = None  # Seconds from process start
+        self._last = self.origin
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        """End the current phase, naming it"""
+        with self._lock:
+            now = time.perf_counter()
+            self.phases.append((name, now - self._last))
+            self._last = now
+
+    def record(self, name, seconds):
+        """Add a phase that ran in parallel with the others (not part of the sequence)"""
+        with self._lock:
+            self.phases.append((name + " (parallel)", seconds))
+
+    def detection_done(self):
+        """Mark the first detection and print the profile; later calls do nothing"""
+        with self._lock:
+            if self.first_detection is not None:
+                return
+            now = time.perf_counter()
+            self.phases.append(("first frame to detection", now - self._last))
+            self._last = now
+            self.first_detection = now - self.origin
+        self.report()
+
+    def report(self):
+        """Print the phases in order with their share of the time to first detection"""
+        print("\nStartup profile:")
+        print("| Phase                               | Seconds |")
+        print("|-------------------------------------|---------|")
+        for name, seconds in self.phases:
+            print(f"| {name:35} | {seconds:7.2f} |")
+        if self.first_detection is not None:
+            print(f"Time to first detection: {self.first_detection:.2f} s\n")
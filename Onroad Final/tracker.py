@@ -0,0 +1,201 @@
+import numpy as np
+from utils import DETECTION_DTYPE
+
+# Constant velocity model over the state [cx, cy, area, aspect, vx, vy, varea]
+# as used by SORT (Bewley et al., 2016). Aspect ratio is assumed constant.
+_F = np.eye(7, dtype=np.float64)
+_F[0, 4] = _F[1, 5] = _F[2, 6] = 1.0
+_H = np.eye(4, 7, dtype=np.float64)
+
+_Q = np.eye(7, dtype=np.float64)
+_Q[-1, -1] *= 0.01
+_Q[4:, 4:] *= 0.01
+
+_R = np.eye(4, dtype=np.float64)
+_R[2:, 2:] *= 10.0
+
+_P0 = np.eye(7, dtype=np.float64) * 10.0
+_P0[4:, 4:] *= 1000.0  # High uncertainty for the unobserved velocities
+
+def boxes_to_measurements(boxes):
+    """Convert (N, 4) x, y, w, h boxes to (N, 4) cx, cy, area, aspect measurements"""
+    boxes = boxes.astype(np.float64)
+    w = np.maximum(boxes[:, 2], 1.0)
+    h = np.maximum(boxes[:, 3], 1.0)
+    return np.stack([boxes[:, 0] + w / 2, boxes[:, 1] + h / 2, w * h, w / h], axis=1)
+
+def states_to_boxes(states):
+    """Convert (N, 7) filter states back to (N, 4) x, y, w, h boxes"""
+    area = np.maximum(states[:, 2], 1.0)
+    aspect = np.maximum(states[:, 3], 1e-3)
+    w = np.sqrt(area * aspect)
+    h = area / w
+    return np.stack([states[:, 0] - w / 2, states[:, 1] - h / 2, w, h], axis=1)
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between (N, 4) and (M, 4) x, y, w, h boxes"""
+    a = boxes_a.astype(np.float64)[:, None, :]
+    b = boxes_b.astype(np.float64)[None, :, :]
+    x1 = np.maximum(a[..., 0], b[..., 0])
+    y1 = np.maximum(a[..., 1], b[..., 1])
+    x2 = np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2])
+    y2 = np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+def greedy_match(iou, iou_threshold):
+    """Greedily pair rows and columns by descending IoU above the threshold"""
+    rows, cols = np.nonzero(iou >= iou_threshold)
+    if rows.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    order = np.argsort(-iou[rows, cols], kind='stable')
+    used_rows = set()
+    used_cols = set()
+    matched_rows = []
+    matched_cols = []
+    for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        matched_rows.append(r)
+        matched_cols.append(c)
+    return np.array(matched_rows, dtype=np.int64), np.array(matched_cols, dtype=np.int64)
+
+class VehicleTracker:
+    """SORT-style multi-object tracker with all Kalman filters updated as one batch"""
+
+    def __init__(self, max_age=10, min_hits=2, iou_threshold=0.3):
+        """Initialize the tracker
+
+        Args:
+            max_age: Frames a track survives without a matching detection
+            min_hits: Detector matches needed before a track is confirmed and counted
+            iou_threshold: Minimum IoU to associate a detection with a track
+        """
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.iou_threshold = iou_threshold
+
+        self.states = np.empty((0, 7), dtype=np.float64)
+        self.covariances = np.empty((0, 7, 7), dtype=np.float64)
+        self.track_ids = np.empty(0, dtype=np.int32)
+        self.class_ids = np.empty(0, dtype=np.int16)
+        self.scores = np.empty(0, dtype=np.float32)
+        self.hits = np.empty(0, dtype=np.int32)
+        self.frames_since_update = np.empty(0, dtype=np.int32)
+
+        self._next_id = 1
+        self.total_count = 0  # Number of unique confirmed vehicles
+
+    def __len__(self):
+        return len(self.track_ids)
+
+    def _predict(self):
+        """Advance every track by one frame"""
+        if len(self.track_ids) == 0:
+            return
+        # Keep the predicted area positive
+        shrinking = self.states[:, 6] + self.states[:, 2] <= 0
+        self.states[shrinking, 6] = 0.0
+        self.states = self.states @ _F.T
+        self.covariances = _F @ self.covariances @ _F.T + _Q
+        self.frames_since_update += 1
+
+    def _correct(self, track_idx, measurements):
+        """Kalman update for the given tracks with their matched measurements"""
+        P = self.covariances[track_idx]
+        x = self.states[track_idx]
+        S = _H @ P @ _H.T + _R
+        PHt = P @ _H.T
+        K = np.linalg.solve(S, PHt.transpose(0, 2, 1)).transpose(0, 2, 1)
+        innovation = measurements - x @ _H.T
+        self.states[track_idx] = x + np.einsum('nij,nj->ni', K, innovation)
+        self.covariances[track_idx] = (np.eye(7) - K @ _H) @ P
+
+    def _prune(self):
+        """Drop tracks that have not been matched for too long"""
+        alive = self.frames_since_update <= self.max_age
+        if alive.all():
+            return
+        self.states = self.states[alive]
+        self.covariances = self.covariances[alive]
+        self.track_ids = self.track_ids[alive]
+        self.class_ids = self.class_ids[alive]
+        self.scores = self.scores[alive]
+        self.hits = self.hits[alive]
+        self.frames_since_update = self.frames_since_update[alive]
+
+    def _output(self, mask):
+        """Build a detection array for the selected tracks"""
+        tracked = np.empty(int(mask.sum()), dtype=DETECTION_DTYPE)
+        tracked['box'] = np.rint(states_to_boxes(self.states[mask])).astype(np.int32)
+        tracked['class_id'] = self.class_ids[mask]
+        tracked['score'] = self.scores[mask]
+        tracked['track_id'] = self.track_ids[mask]
+        return tracked
+
+    def update(self, detections):
+        """Associate a frame's detections with the tracks
+
+        Returns the detections annotated with their track IDs.
+        """
+        self._predict()
+
+        num_tracks = len(self.track_ids)
+        if num_tracks and len(detections):
+            iou = iou_matrix(detections['box'], states_to_boxes(self.states))
+            det_idx, track_idx = greedy_match(iou, self.iou_threshold)
+        else:
+            det_idx = track_idx = np.empty(0, dtype=np.int64)
+
+        # Update matched tracks
+        if len(track_idx):
+            matched = detections[det_idx]
+            self._correct(track_idx, boxes_to_measurements(matched['box']))
+            self.class_ids[track_idx] = matched['class_id']
+            self.scores[track_idx] = matched['score']
+            newly_confirmed = self.hits[track_idx] + 1 == self.min_hits
+            self.hits[track_idx] += 1
+            self.frames_since_update[track_idx] = 0
+            self.total_count += int(newly_confirmed.sum())
+
+        # Start new tracks for unmatched detections
+        unmatched = np.ones(len(detections), dtype=bool)
+        unmatched[det_idx] = False
+        new = detections[unmatched]
+        if len(new):
+            measurements = boxes_to_measurements(new['box'])
+            states = np.zeros((len(new), 7), dtype=np.float64)
+            states[:, :4] = measurements
+            new_ids = np.arange(self._next_id, self._next_id + len(new), dtype=np.int32)
+            self._next_id += len(new)
+            self.states = np.concatenate([self.states, states])
+            self.covariances = np.concatenate([self.covariances, np.repeat(_P0[None], len(new), axis=0)])
+            self.track_ids = np.concatenate([self.track_ids, new_ids])
+            self.class_ids = np.concatenate([self.class_ids, new['class_id']])
+            self.scores = np.concatenate([self.scores, new['score']])
+            self.hits = np.concatenate([self.hits, np.ones(len(new), dtype=np.int32)])
+            self.frames_since_update = np.concatenate(
+                [self.frames_since_update, np.zeros(len(new), dtype=np.int32)])
+            if self.min_hits <= 1:
+                self.total_count += len(new)
+
+        # Report the detector's own boxes, tagged with the owning track
+        tracked = detections.copy()
+        tracked['track_id'][det_idx] = self.track_ids[track_idx]
+        if len(new):
+            tracked['track_id'][unmatched] = new_ids
+
+        self._prune()
+        return tracked
+
+    def predict(self):
+        """Carry confirmed tracks forward on a frame without detections
+
+        Returns predicted boxes for the confirmed tracks.
+        """
+        self._predict()
+        self._prune()
+        return self._output(self.hits >= self.min_hits)
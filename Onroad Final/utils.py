@@ -1,11 +1,16 @@
 import cv2
 import numpy as np
+import os
 import time
+import atexit
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from config import (
     VEHICLE_CLASSES, 
     LOG_DETECTIONS, 
     LOG_PATH, 
+    LOG_LEVEL, 
     ENABLE_OLED, 
     OLED_WIDTH, 
     OLED_HEIGHT, 
@@ -13,16 +18,32 @@ from config import (
     OLED_I2C_BUS,
     OLED_UPDATE_INTERVAL  # Add this import
 )
-import board
-import adafruit_ssd1306
-from PIL import Image, ImageDraw, ImageFont
-
-if LOG_DETECTIONS:
-    logging.basicConfig(filename=LOG_PATH, level=logging.INFO, 
-                        format='%(asctime)s - %(message)s')
+from PIL import Image
+from oled import OledRenderer
 
 # Global OLED display object
 oled_display = None
+_oled_renderers = {}  # Cached renderers (fonts and text lines) by display size
+
+def setup_logging():
+    """Send log messages to LOG_PATH through a queue when logging is enabled
+
+    Threads only put records on the queue; a listener thread formats them
+    and writes the file. Returns the listener (stopped at exit), or None.
+    """
+    if not LOG_DETECTIONS:
+        return None
+    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+    file_handler = logging.FileHandler(LOG_PATH)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler)
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(LOG_LEVEL)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
 
 def initialize_oled():
     """Initialize the OLED display"""
@@ -32,6 +53,11 @@ def initialize_oled():
         return None
     
     try:
+        # Imported here so start-up does not pay for the hardware libraries
+        # when the OLED is disabled
+        import board
+        import adafruit_ssd1306
+        
         # Create the I2C interface
         i2c = board.I2C()
         
@@ -49,6 +75,13 @@ def initialize_oled():
         print(f"Error initializing OLED display: {e}")
         return None
 
+def render_oled_image(vehicle_count, vehicle_types=None, width=OLED_WIDTH, height=OLED_HEIGHT):
+    """Render detection results into a 1-bit PIL image for the OLED"""
+    renderer = _oled_renderers.get((width, height))
+    if renderer is None:
+        renderer = _oled_renderers[(width, height)] = OledRenderer(width, height)
+    return Image.fromarray(renderer.render_pixels(vehicle_count, vehicle_types))
+
 # Track previous vehicle stats to avoid unnecessary OLED updates
 _previous_vehicle_count = -1
 _previous_vehicle_types = {}
@@ -71,78 +104,9 @@ def update_oled_display(vehicle_count, vehicle_types=None, fps=0, force_update=F
             return
     
     try:
-        # Create blank image for drawing
-        image = Image.new("1", (oled_display.width, oled_display.height))
-        draw = ImageDraw.Draw(image)
-        
-        # Load fonts - try to load larger fonts for better visibility
-        try:
-            large_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 16)
-            medium_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 14)
-        except:
-            # Fall back to default font if custom font fails
-            large_font = ImageFont.load_default()
-            medium_font = ImageFont.load_default()
-        
-        # Draw total vehicles count at the top in large font
-        total_text = f"Total: {vehicle_count}"
-        # Center the text
-        try:
-            # For newer PIL versions
-            total_bbox = draw.textbbox((0, 0), total_text, font=large_font)
-            total_w = total_bbox[2] - total_bbox[0]
-        except AttributeError:
-            # For older PIL versions
-            total_w = draw.textsize(total_text, font=large_font)[0]
+        image = render_oled_image(vehicle_count, vehicle_types, 
+                                  oled_display.width, oled_display.height)
         
-        draw.text(((OLED_WIDTH - total_w) // 2, 0), total_text, font=large_font, fill=255)
-        
-        # Draw each vehicle type with count
-        if vehicle_types and len(vehicle_types) > 0:
-            y_position = 20  # Start position after total count
-            
-            # Sort vehicle types by count (highest first)
-            sorted_vehicles = sorted(vehicle_types.items(), key=lambda x: x[1], reverse=True)
-            
-            # Display each vehicle type with count
-            for vehicle_type, count in sorted_vehicles:
-                if count > 0:  # Only show types with at least one detection
-                    # Capitalize first letter for better readability
-                    display_name = vehicle_type[0].upper() + vehicle_type[1:]
-                    vehicle_text = f"{display_name}: {count}"
-                    
-                    # Center each vehicle type text
-                    try:
-                        # For newer PIL versions
-                        text_bbox = draw.textbbox((0, 0), vehicle_text, font=medium_font)
-                        text_w = text_bbox[2] - text_bbox[0]
-                    except AttributeError:
-                        # For older PIL versions
-                        text_w = draw.textsize(vehicle_text, font=medium_font)[0]
-                    
-                    draw.text(((OLED_WIDTH - text_w) // 2, y_position), 
-                             vehicle_text, font=medium_font, fill=255)
-                    y_position += 16  # Spacing between lines
-                    
-                    # Only show top 3 vehicle types to ensure they fit on screen
-                    if y_position > 55:
-                        break
-        
-        # If no vehicles detected, show a message
-        if vehicle_count == 0:
-            no_vehicle_text = "No vehicles"
-            # Center the text
-            try:
-                # For newer PIL versions
-                text_bbox = draw.textbbox((0, 0), no_vehicle_text, font=medium_font)
-                text_w = text_bbox[2] - text_bbox[0]
-            except AttributeError:
-                # For older PIL versions
-                text_w = draw.textsize(no_vehicle_text, font=medium_font)[0]
-            
-            draw.text(((OLED_WIDTH - text_w) // 2, 30), 
-                     no_vehicle_text, font=medium_font, fill=255)
-            
         # Display the image
         oled_display.image(image)
         oled_display.show()
@@ -176,70 +140,114 @@ def draw_prediction(img, class_id, confidence, x, y, x_plus_w, y_plus_h, classes
     cv2.rectangle(img, (x, y), (x_plus_w, y_plus_h), color, 2)
     cv2.putText(img, f"{label} {confidence:.2f}", (x-10, y-10), 
                 cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-    
-    if LOG_DETECTIONS and label in VEHICLE_CLASSES:
-        logging.info(f"Detected {label} with confidence {confidence:.2f}")
-    
     return img
 
-def process_detections(frame, outs, classes, conf_threshold, nms_threshold):
-    """Process network outputs and draw predictions"""
-    class_ids = []
-    confidences = []
-    boxes = []
-    frame_height = frame.shape[0]
-    frame_width = frame.shape[1]
-
-    # Scan through all detections and keep only the ones with high confidence
-    for out in outs:
-        for detection in out:
-            scores = detection[5:]
-            class_id = np.argmax(scores)
-            confidence = scores[class_id]
-            
-            if confidence > conf_threshold and classes[class_id] in VEHICLE_CLASSES:
-                center_x = int(detection[0] * frame_width)
-                center_y = int(detection[1] * frame_height)
-                w = int(detection[2] * frame_width)
-                h = int(detection[3] * frame_height)
-                x = center_x - w / 2
-                y = center_y - h / 2
-                class_ids.append(class_id)
-                confidences.append(float(confidence))
-                boxes.append([x, y, w, h])
+# Compact per-detection record shared by drawing, OLED and logging code.
+# Boxes are stored as (x, y, w, h) in frame pixel coordinates; track_id is
+# -1 until the tracker assigns the detection to a vehicle.
+DETECTION_DTYPE = np.dtype([
+    ('box', np.int32, (4,)),
+    ('class_id', np.int16),
+    ('score', np.float32),
+    ('track_id', np.int32),
+])
 
+# Cache of vehicle lookup tables keyed by the class list contents
+_vehicle_lookup_cache = {}
+
+def get_vehicle_lookup(classes):
+    """Return (boolean mask, column indices) of vehicle classes in the class list"""
+    key = tuple(classes)
+    lookup = _vehicle_lookup_cache.get(key)
+    if lookup is None:
+        is_vehicle = np.array([name in VEHICLE_CLASSES for name in classes], dtype=bool)
+        lookup = (is_vehicle, np.flatnonzero(is_vehicle))
+        _vehicle_lookup_cache[key] = lookup
+    return lookup
+
+def decode_detections(outs, frame_width, frame_height, classes, conf_threshold, nms_threshold):
+    """Decode YOLO outputs into a structured array of vehicle detections"""
+    is_vehicle, vehicle_columns = get_vehicle_lookup(classes)
+    
+    # Stack both YOLO heads into a single (N, 5 + num_classes) matrix
+    rows = outs[0] if len(outs) == 1 else np.concatenate(outs, axis=0)
+    scores = rows[:, 5:]
+    
+    # Cheap pre-filter on the vehicle columns only: a row can only pass if
+    # one of its vehicle scores is above the threshold
+    candidates = np.flatnonzero(scores[:, vehicle_columns].max(axis=1) > conf_threshold)
+    if candidates.size == 0:
+        return np.empty(0, dtype=DETECTION_DTYPE)
+    
+    # Keep rows whose overall best class is a vehicle (same rule as before)
+    class_ids = scores[candidates].argmax(axis=1)
+    keep = is_vehicle[class_ids]
+    candidates = candidates[keep]
+    class_ids = class_ids[keep]
+    confidences = scores[candidates, class_ids]
+    
+    # Convert normalized centre/size to pixel boxes
+    centers_x = (rows[candidates, 0] * frame_width).astype(np.int32)
+    centers_y = (rows[candidates, 1] * frame_height).astype(np.int32)
+    widths = (rows[candidates, 2] * frame_width).astype(np.int32)
+    heights = (rows[candidates, 3] * frame_height).astype(np.int32)
+    boxes = np.stack([centers_x - widths / 2, centers_y - heights / 2, widths, heights], axis=1)
+    
     # Apply non-maximum suppression to remove redundant overlapping boxes
-    indices = cv2.dnn.NMSBoxes(boxes, confidences, conf_threshold, nms_threshold)
-    
-    vehicle_count = 0
-    vehicle_types = {}
-    for i in indices:
-        try:
-            box = boxes[i]
-        except:
-            i = i[0]
-            box = boxes[i]
-            
-        x = int(box[0])
-        y = int(box[1])
-        w = int(box[2])
-        h = int(box[3])
-        draw_prediction(frame, class_ids[i], confidences[i], x, y, x + w, y + h, classes)
-        vehicle_count += 1
-        
-        try:
-            i_value = i[0] if isinstance(i, np.ndarray) else i
-            label = classes[class_ids[i_value]]
-            if label in VEHICLE_CLASSES:
-                if label in vehicle_types:
-                    vehicle_types[label] += 1
-                else:
-                    vehicle_types[label] = 1
-        except:
-            pass
+    indices = cv2.dnn.NMSBoxes(boxes.tolist(), confidences.tolist(), conf_threshold, nms_threshold)
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+    
+    detections = np.empty(len(indices), dtype=DETECTION_DTYPE)
+    detections['box'] = boxes[indices].astype(np.int32)
+    detections['class_id'] = class_ids[indices]
+    detections['score'] = confidences[indices]
+    detections['track_id'] = -1
+    return detections
+
+def count_vehicle_types(detections, classes):
+    """Count detections per vehicle class name, in order of first appearance"""
+    if len(detections) == 0:
+        return {}
+    class_ids, first_index, counts = np.unique(
+        detections['class_id'], return_index=True, return_counts=True)
+    order = np.argsort(first_index)
+    return {classes[class_ids[i]]: int(counts[i]) for i in order}
+
+def summarize_detections(detections, classes):
+    """Return the vehicle count and per-type counts of a detection array"""
+    return len(detections), count_vehicle_types(detections, classes)
+
+def draw_detections(frame, detections, classes):
+    """Draw all detections onto the frame"""
+    for (x, y, w, h), class_id, score in zip(
+            detections['box'].tolist(), detections['class_id'].tolist(), detections['score'].tolist()):
+        draw_prediction(frame, class_id, score, x, y, x + w, y + h, classes)
+    return frame
+
+def annotate_frame(frame, detections, classes):
+    """Draw detections and the vehicle count; return frame, count and per-type counts"""
+    draw_detections(frame, detections, classes)
+    
+    vehicle_count, vehicle_types = summarize_detections(detections, classes)
     
     # Display vehicle count
     cv2.putText(frame, f"Vehicles: {vehicle_count}", (10, 30), 
                 cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
     
     return frame, vehicle_count, vehicle_types
+
+def process_detections(frame, outs, classes, conf_threshold, nms_threshold, roi=None):
+    """Process network outputs and draw predictions
+
+    With a roi the outputs refer to roi.crop(frame); boxes are mapped back to
+    the frame and those outside the ROI polygons are dropped.
+    """
+    frame_height, frame_width = frame.shape[:2] if roi is None else roi.crop_shape
+    
+    detections = decode_detections(outs, frame_width, frame_height, classes,
+                                   conf_threshold, nms_threshold)
+    if roi is not None:
+        detections = roi.map_detections(detections)
+    frame, vehicle_count, vehicle_types = annotate_frame(frame, detections, classes)
+    
+    return frame, vehicle_count, vehicle_types, detections
@@ -1,94 +1,48 @@
 #!/usr/bin/env python3
 import cv2
-import numpy as np
+import os
+import sys
 import time
-import torch
-from pathlib import Path
 import argparse
+from model_registry import load_model
+
+# Detection and drawing are shared with the main pipeline in "Onroad Final"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Onroad Final"))
+from detector import TorchScriptDetector
+from utils import draw_detections
 
 class VehicleDetector:
     """Vehicle detection class using YOLOv5 optimized for Raspberry Pi"""
     
-    def __init__(self, model_path=None, conf_threshold=0.25, device='cpu'):
+    def __init__(self, model_path=None, conf_threshold=0.25, imgsz=640, nms_threshold=0.45):
         """Initialize the vehicle detector with a YOLOv5 model
         
         Args:
-            model_path: Path to a custom YOLOv5 model, if None will download from torch hub
+            model_path: Path to a custom YOLOv5 .pt model, if None uses the bundled yolov5n.pt
             conf_threshold: Confidence threshold for detections
-            device: Computing device ('cpu' or 'cuda')
+            imgsz: Network input size
+            nms_threshold: Non-maximum suppression IoU threshold
         """
-        self.conf_threshold = conf_threshold
-        self.device = device
-        
-        # Load YOLOv5 model - either custom or pre-trained
-        if model_path and Path(model_path).exists():
-            self.model = torch.hub.load('ultralytics/yolov5', 'custom', 
-                                        path=model_path, force_reload=True)
-        else:
-            # Use YOLOv5s - the smallest and fastest variant
-            self.model = torch.hub.load('ultralytics/yolov5', 'yolov5s', pretrained=True)
-        
-        # Move model to the appropriate device
-        self.model.to(device)
+        # Load the checksum-verified, fused TorchScript model from the local
+        # registry (no torch hub download, works offline)
+        model, self.names = load_model(model_path or 'yolov5n', imgsz)
         
-        # Set model parameters
-        self.model.conf = conf_threshold  # Confidence threshold
-        
-        # Vehicle classes in COCO dataset that we're interested in
-        self.vehicle_classes = {
-            2: 'car', 
-            3: 'motorcycle', 
-            5: 'bus', 
-            7: 'truck'
-        }
+        # Run it through the main pipeline's TorchScript backend
+        self.detector = TorchScriptDetector(self.names, imgsz, model=model,
+                                            conf_threshold=conf_threshold, nms_threshold=nms_threshold)
     
     def detect_vehicles(self, frame):
         """Detect vehicles in the input frame
         
         Args:
-            frame: Input image frame
+            frame: Input BGR image frame (boxes are drawn onto it in place)
         
         Returns:
             processed_frame: Frame with detection boxes
-            detections: List of detected vehicles with coordinates and classes
+            detections: utils.DETECTION_DTYPE array of the vehicles (class_id indexes self.names)
         """
-        # Perform inference
-        results = self.model(frame)
-        
-        # Filter results to only include vehicles we're interested in
-        detections = []
-        for *box, conf, cls in results.xyxy[0]:  # xyxy format: x1, y1, x2, y2, confidence, class
-            if int(cls) in self.vehicle_classes:
-                vehicle_type = self.vehicle_classes[int(cls)]
-                bbox = [int(x) for x in box]
-                detections.append({
-                    'type': vehicle_type,
-                    'confidence': float(conf),
-                    'bbox': bbox
-                })
-        
-        # Draw the detections on the frame
-        for detection in detections:
-            x1, y1, x2, y2 = detection['bbox']
-            vehicle_type = detection['type']
-            confidence = detection['confidence']
-            
-            # Different color for different vehicle types
-            color = {
-                'car': (0, 255, 0),        # Green
-                'motorcycle': (0, 0, 255), # Red
-                'bus': (255, 0, 0),        # Blue
-                'truck': (255, 255, 0)     # Cyan
-            }.get(vehicle_type, (255, 255, 255))
-            
-            # Draw bounding box
-            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-            
-            # Draw label with confidence
-            label = f"{vehicle_type}: {confidence:.2f}"
-            (label_width, label_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-            cv2.rectangle(frame, (x1, y1 - label_height - 10), (x1 + label_width + 10, y1), color, -1)
-            cv2.putText(frame, label, (x1 + 5, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
+        detections = self.detector.detect(frame)
+        draw_detections(frame, detections, self.names)
         
         return frame, detections
 
@@ -124,10 +78,8 @@ def process_video(source=0, output=None, display=True, model_path=None):
         if not ret:
             break
         
-        # Detect vehicles
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)  # Convert BGR to RGB
-        processed_frame, detections = detector.detect_vehicles(rgb_frame)
-        processed_frame = cv2.cvtColor(processed_frame, cv2.COLOR_RGB2BGR)  # Convert RGB back to BGR
+        # Detect vehicles (annotations are drawn directly on the BGR frame)
+        processed_frame, detections = detector.detect_vehicles(frame)
         
         # Display FPS and detection count
         end_time = time.time()
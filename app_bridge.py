@@ -2,12 +2,11 @@
 import cv2
 import numpy as np
 import time
-import torch
-from pathlib import Path
 import argparse
 import subprocess
 import threading
-import os
+import shlex
+from app import VehicleDetector  # Same detector and drawing as the OpenCV capture version and main.py
 
 class FrameCaptureThread(threading.Thread):
     """Thread to continuously capture frames using libcamera-still"""
@@ -23,6 +22,8 @@ class FrameCaptureThread(threading.Thread):
         self.running = True
         self.latest_frame_path = "/tmp/latest_frame.jpg"
         self.frame_ready = False
+        self.seq = 0  # Number of the latest completed capture
+        self.framerate = 1.0 / interval
         self.daemon = True  # Thread will exit when main program exits
     
     def run(self):
@@ -35,115 +36,211 @@ class FrameCaptureThread(threading.Thread):
                      "--immediate", "--rotation", "0"],
                     check=True, capture_output=True
                 )
+                self.seq += 1
                 self.frame_ready = True
                 time.sleep(self.interval)
             except subprocess.CalledProcessError:
                 print("Error capturing frame")
                 time.sleep(1)
     
-    def get_frame(self):
-        """Get the latest frame
+    def get_frame(self, after_seq=0, timeout=1.0):
+        """Get the latest frame if it is newer than after_seq
+        
+        Args:
+            after_seq: Sequence number of the last frame the caller processed
+            timeout: Longest time to wait for a new capture (in seconds)
         
         Returns:
-            frame: The latest captured frame, or None if no frame is available
+            (seq, frame): The latest capture, or (after_seq, None) if there is no new one
         """
-        if not self.frame_ready or not os.path.exists(self.latest_frame_path):
-            return None
+        deadline = time.monotonic() + timeout
+        while self.seq <= after_seq:
+            if not self.running or time.monotonic() >= deadline:
+                return after_seq, None
+            time.sleep(0.05)
         
+        seq = self.seq
         frame = cv2.imread(self.latest_frame_path)
-        return frame
+        return (seq, frame) if frame is not None else (after_seq, None)
     
     def stop(self):
         """Stop the frame capture thread"""
         self.running = False
 
-class VehicleDetector:
-    """Vehicle detection class using YOLOv5 optimized for Raspberry Pi"""
+def jpeg_end(buffer, start):
+    """Find the end of the JPEG that starts at buffer[start] (its SOI marker)
+    
+    Walks the marker segments by their lengths instead of searching for the
+    first end marker, which also occurs inside embedded EXIF thumbnails.
+    
+    Returns:
+        The index just past the EOI marker, None if the JPEG is not complete
+        yet, or -1 if the data is not a valid JPEG
+    """
+    pos = start + 2
+    size = len(buffer)
+    while True:
+        if pos + 2 > size:
+            return None
+        if buffer[pos] != 0xFF:
+            return -1
+        marker = buffer[pos + 1]
+        if marker == 0xFF:
+            pos += 1  # Fill byte
+            continue
+        if marker == 0xD9:
+            return pos + 2
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            pos += 2  # Markers without a length
+            continue
+        if pos + 4 > size:
+            return None
+        pos += 2 + ((buffer[pos + 2] << 8) | buffer[pos + 3])
+        if marker == 0xDA:
+            # Entropy-coded data follows the scan header: it ends at the first
+            # 0xFF that is not a stuffed 0x00 or a restart marker
+            while True:
+                pos = buffer.find(b"\xff", pos)
+                if pos < 0 or pos + 1 >= size:
+                    return None
+                following = buffer[pos + 1]
+                if following == 0x00 or 0xD0 <= following <= 0xD7:
+                    pos += 2
+                    continue
+                break
+
+class StreamCaptureThread(threading.Thread):
+    """Thread that reads an MJPEG stream from one long-lived capture process
+    
+    The default command is libcamera-vid writing MJPEG to stdout. Frames are
+    split by walking their JPEG marker segments and decoded in memory; if the reader
+    falls behind only the newest complete frame is decoded. Every decoded
+    frame gets a sequence number so callers never process a frame twice.
+    """
     
-    def __init__(self, model_path=None, conf_threshold=0.25, device='cpu'):
-        """Initialize the vehicle detector with a YOLOv5 model
+    SOI = b"\xff\xd8"  # JPEG start of image
+    
+    def __init__(self, command=None, width=640, height=480, framerate=15):
+        """Initialize the stream capture thread
         
         Args:
-            model_path: Path to a custom YOLOv5 model, if None will download from torch hub
-            conf_threshold: Confidence threshold for detections
-            device: Computing device ('cpu' or 'cuda')
+            command: Capture command line (string or list) writing MJPEG to stdout,
+                e.g. "python3 mjpeg_replay.py recording.mp4" as a stand-in for the camera
+            width, height: Frame size requested from libcamera-vid
+            framerate: Frame rate requested from libcamera-vid
         """
-        self.conf_threshold = conf_threshold
-        self.device = device
-        
-        # Load YOLOv5 model - either custom or pre-trained
-        if model_path and Path(model_path).exists():
-            self.model = torch.hub.load('ultralytics/yolov5', 'custom', 
-                                        path=model_path, force_reload=True)
-        else:
-            # Use YOLOv5s - the smallest and fastest variant
-            self.model = torch.hub.load('ultralytics/yolov5', 'yolov5s', pretrained=True)
-        
-        # Move model to the appropriate device
-        self.model.to(device)
+        threading.Thread.__init__(self)
+        if command is None:
+            command = ["libcamera-vid", "-t", "0", "-n", "--codec", "mjpeg",
+                       "--width", str(width), "--height", str(height),
+                       "--framerate", str(framerate), "-o", "-"]
+        elif isinstance(command, str):
+            command = shlex.split(command)
+        self.command = command
+        self.framerate = framerate
+        self.running = True
+        self.frame_ready = False
+        self.seq = 0  # Number of the latest decoded frame
+        self.skipped = 0  # Complete frames dropped because a newer one had arrived
+        self.process = None
+        self.daemon = True  # Thread will exit when main program exits
         
-        # Set model parameters
-        self.model.conf = conf_threshold  # Confidence threshold
+        self._frame = None
+        self._condition = threading.Condition()
+    
+    def run(self):
+        """Read the stream until the process exits or the thread is stopped"""
+        try:
+            self.process = subprocess.Popen(self.command, stdout=subprocess.PIPE,
+                                            stderr=subprocess.DEVNULL, bufsize=0)
+        except OSError as e:
+            print(f"Error starting capture process: {e}")
+            self._finish()
+            return
         
-        # Vehicle classes in COCO dataset that we're interested in
-        self.vehicle_classes = {
-            2: 'car', 
-            3: 'motorcycle', 
-            5: 'bus', 
-            7: 'truck'
-        }
+        buffer = bytearray()
+        try:
+            while self.running:
+                # Unbuffered pipe: returns whatever is available, up to 64 KB
+                chunk = self.process.stdout.read(65536)
+                if not chunk:
+                    print("Capture process ended")
+                    break
+                buffer += chunk
+                
+                jpeg = self._newest_jpeg(buffer)
+                if jpeg is None:
+                    continue
+                frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if frame is None:
+                    print("Error decoding frame")
+                    continue
+                with self._condition:
+                    self.seq += 1
+                    self._frame = frame
+                    self.frame_ready = True
+                    self._condition.notify_all()
+        finally:
+            self._finish()
     
-    def detect_vehicles(self, frame):
-        """Detect vehicles in the input frame
+    def _newest_jpeg(self, buffer):
+        """Remove all complete JPEGs from the buffer and return the newest one"""
+        newest = None
+        while True:
+            start = buffer.find(self.SOI)
+            if start < 0:
+                # Keep a trailing 0xff that may start the next marker
+                del buffer[:-1]
+                break
+            end = jpeg_end(buffer, start)
+            if end is None:
+                del buffer[:start]
+                break
+            if end < 0:
+                # Not a real frame start; look for the next one
+                del buffer[:start + 2]
+                continue
+            if newest is not None:
+                self.skipped += 1
+            newest = bytes(buffer[start:end])
+            del buffer[:end]
+        return newest
+    
+    def _finish(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=2.0)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        with self._condition:
+            self.running = False
+            self._condition.notify_all()
+    
+    def get_frame(self, after_seq=0, timeout=1.0):
+        """Get the latest frame if it is newer than after_seq
         
         Args:
-            frame: Input image frame
+            after_seq: Sequence number of the last frame the caller processed
+            timeout: Longest time to wait for a new frame (in seconds)
         
         Returns:
-            processed_frame: Frame with detection boxes
-            detections: List of detected vehicles with coordinates and classes
+            (seq, frame): The latest frame, or (after_seq, None) if there is no new one
         """
-        # Perform inference
-        results = self.model(frame)
-        
-        # Filter results to only include vehicles we're interested in
-        detections = []
-        for *box, conf, cls in results.xyxy[0]:  # xyxy format: x1, y1, x2, y2, confidence, class
-            if int(cls) in self.vehicle_classes:
-                vehicle_type = self.vehicle_classes[int(cls)]
-                bbox = [int(x) for x in box]
-                detections.append({
-                    'type': vehicle_type,
-                    'confidence': float(conf),
-                    'bbox': bbox
-                })
-        
-        # Draw the detections on the frame
-        for detection in detections:
-            x1, y1, x2, y2 = detection['bbox']
-            vehicle_type = detection['type']
-            confidence = detection['confidence']
-            
-            # Different color for different vehicle types
-            color = {
-                'car': (0, 255, 0),        # Green
-                'motorcycle': (0, 0, 255), # Red
-                'bus': (255, 0, 0),        # Blue
-                'truck': (255, 255, 0)     # Cyan
-            }.get(vehicle_type, (255, 255, 255))
-            
-            # Draw bounding box
-            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-            
-            # Draw label with confidence
-            label = f"{vehicle_type}: {confidence:.2f}"
-            (label_width, label_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-            cv2.rectangle(frame, (x1, y1 - label_height - 10), (x1 + label_width + 10, y1), color, -1)
-            cv2.putText(frame, label, (x1 + 5, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
-        
-        return frame, detections
+        with self._condition:
+            self._condition.wait_for(lambda: self.seq > after_seq or not self.running, timeout)
+            if self.seq <= after_seq:
+                return after_seq, None
+            return self.seq, self._frame
+    
+    def stop(self):
+        """Stop the capture process and the thread"""
+        self.running = False
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
 
-def process_video(source=0, output=None, display=True, model_path=None):
+def process_video(source=0, output=None, display=True, model_path=None, capture='stream',
+                  capture_cmd=None):
     """Process video stream for vehicle detection
     
     Args:
@@ -151,44 +248,45 @@ def process_video(source=0, output=None, display=True, model_path=None):
         output: Path to save output video
         display: Whether to display the processed frames
         model_path: Path to a custom YOLOv5 model
+        capture: 'stream' (one long-lived MJPEG process) or 'still' (libcamera-still per frame)
+        capture_cmd: Command to use instead of libcamera-vid in stream mode
     """
     # Initialize detector
     detector = VehicleDetector(model_path=model_path)
     
     # Initialize frame capture thread
-    capture_thread = FrameCaptureThread()
+    if capture == 'still':
+        capture_thread = FrameCaptureThread()
+    else:
+        capture_thread = StreamCaptureThread(command=capture_cmd)
     capture_thread.start()
     
-    # Wait for the first frame to be captured
-    print("Waiting for first frame to be captured...")
-    while not capture_thread.frame_ready:
-        time.sleep(0.1)
-    
-    # Initialize video writer if output is specified
-    writer = None
-    if output:
-        # Get the first frame to determine dimensions
-        first_frame = capture_thread.get_frame()
-        if first_frame is not None:
-            height, width = first_frame.shape[:2]
-            fourcc = cv2.VideoWriter_fourcc(*'XVID')
-            writer = cv2.VideoWriter(output, fourcc, 2, (width, height))  # 2 FPS based on capture interval
-    
     # Process video frames
+    writer = None
     frame_count = 0
+    last_seq = 0
     start_time = time.time()
+    elapsed_time = 0
     
     try:
+        print("Waiting for first frame to be captured...")
         while True:
-            frame = capture_thread.get_frame()
+            # Only frames that have not been processed yet are returned
+            seq, frame = capture_thread.get_frame(last_seq)
             if frame is None:
-                time.sleep(0.1)
+                if not capture_thread.running:
+                    break
                 continue
+            last_seq = seq
+            
+            # Initialize video writer if output is specified, sized from the first frame
+            if output and writer is None:
+                height, width = frame.shape[:2]
+                fourcc = cv2.VideoWriter_fourcc(*'XVID')
+                writer = cv2.VideoWriter(output, fourcc, capture_thread.framerate, (width, height))
             
-            # Detect vehicles
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)  # Convert BGR to RGB
-            processed_frame, detections = detector.detect_vehicles(rgb_frame)
-            processed_frame = cv2.cvtColor(processed_frame, cv2.COLOR_RGB2BGR)  # Convert RGB back to BGR
+            # Detect vehicles (annotations are drawn directly on the BGR frame)
+            processed_frame, detections = detector.detect_vehicles(frame)
             
             # Display FPS and detection count
             end_time = time.time()
@@ -222,9 +320,13 @@ def process_video(source=0, output=None, display=True, model_path=None):
         capture_thread.stop()
         if writer:
             writer.release()
-        cv2.destroyAllWindows()
+        if display:
+            cv2.destroyAllWindows()
     
-    print(f"Processed {frame_count} frames in {elapsed_time:.2f} seconds ({frame_count/elapsed_time:.2f} FPS)")
+    if elapsed_time > 0:
+        print(f"Processed {frame_count} frames in {elapsed_time:.2f} seconds ({frame_count/elapsed_time:.2f} FPS)")
+    if capture != 'still':
+        print(f"Stream: {capture_thread.seq} frames decoded, {capture_thread.skipped} dropped before decoding")
 
 def main():
     parser = argparse.ArgumentParser(description='Vehicle Detection for Raspberry Pi')
@@ -238,6 +340,11 @@ def main():
                         help='Path to custom YOLOv5 model')
     parser.add_argument('--confidence', type=float, default=0.25, 
                         help='Detection confidence threshold')
+    parser.add_argument('--capture', choices=['stream', 'still'], default='stream',
+                        help='Read a continuous MJPEG stream, or run libcamera-still for every frame')
+    parser.add_argument('--capture-cmd', type=str, default=None,
+                        help='Stream mode command writing MJPEG to stdout instead of libcamera-vid '
+                             '(e.g. "python3 mjpeg_replay.py recording.mp4")')
     
     args = parser.parse_args()
     
@@ -249,7 +356,9 @@ def main():
         source=args.source,
         output=args.output,
         display=not args.no_display,
-        model_path=args.model
+        model_path=args.model,
+        capture=args.capture,
+        capture_cmd=args.capture_cmd
     )
 
 if __name__ == "__main__":
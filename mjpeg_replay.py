@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+import argparse
+import glob
+import os
+import sys
+import time
+import cv2
+
+def read_frames(path):
+    """Yield JPEG bytes from a video file, a directory of images or a single image"""
+    if os.path.isdir(path):
+        for image_path in sorted(glob.glob(os.path.join(path, "*"))):
+            if image_path.lower().endswith((".jpg", ".jpeg")):
+                with open(image_path, "rb") as f:
+                    yield f.read()
+            elif image_path.lower().endswith((".png", ".bmp")):
+                yield cv2.imencode(".jpg", cv2.imread(image_path))[1].tobytes()
+        return
+
+    capture = cv2.VideoCapture(path)
+    try:
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            yield cv2.imencode(".jpg", frame)[1].tobytes()
+    finally:
+        capture.release()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Write a recording to stdout as a paced MJPEG stream, like libcamera-vid --codec mjpeg -o -')
+    parser.add_argument('path', help='Video file or directory of images')
+    parser.add_argument('--fps', type=float, default=15, help='Frames per second to write')
+    parser.add_argument('--loop', action='store_true', help='Start again at the end')
+    args = parser.parse_args()
+
+    frames = list(read_frames(args.path))
+    if not frames:
+        sys.exit(f"No frames in {args.path}")
+
+    out = sys.stdout.buffer
+    next_time = time.monotonic()
+    try:
+        while True:
+            for jpeg in frames:
+                out.write(jpeg)
+                out.flush()
+                next_time += 1.0 / args.fps
+                time.sleep(max(0.0, next_time - time.monotonic()))
+            if not args.loop:
+                break
+    except (BrokenPipeError, KeyboardInterrupt):
+        # The reader went away; keep Python from failing on the final flush
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+if __name__ == "__main__":
+    main()
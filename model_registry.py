@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+REGISTRY_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(REGISTRY_DIR, "model_cache")
+
+# Local copies of the ultralytics/yolov5 source. The code is only needed to
+# unpickle a .pt checkpoint the first time it is prepared; cached models load
+# with PyTorch alone.
+YOLOV5_SOURCE_DIRS = [
+    os.environ.get("YOLOV5_DIR"),
+    os.path.join(REGISTRY_DIR, "yolov5"),
+    os.path.expanduser("~/.cache/torch/hub/ultralytics_yolov5_master"),
+]
+
+# Weights shipped with the project and their SHA-256 checksums
+MODELS = {
+    "yolov5n": {
+        "file": "yolov5n.pt",
+        "sha256": "4f180cf23ba0717ada0badd6c685026d73d48f184d00fc159c2641284b2ac0a3",
+    },
+}
+
+class ModelIntegrityError(Exception):
+    """A model file does not match its recorded checksum"""
+
+def file_sha256(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def resolve(model):
+    """Return (weights path, expected SHA-256 or None) for a registry name or a file path
+
+    Custom weights can be pinned with a "<file>.sha256" file next to them.
+    """
+    if model in MODELS:
+        entry = MODELS[model]
+        path = os.path.join(REGISTRY_DIR, entry["file"])
+        expected = entry["sha256"]
+    else:
+        path = model
+        expected = None
+        if os.path.exists(path + ".sha256"):
+            with open(path + ".sha256") as f:
+                expected = f.read().split()[0]
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model weights not found: {path}")
+    return path, expected
+
+def verify(path, expected=None):
+    """Check a file against its expected checksum and return its digest"""
+    digest = file_sha256(path)
+    if expected and digest != expected:
+        raise ModelIntegrityError(f"{path} has SHA-256 {digest}, expected {expected}")
+    return digest
+
+def _import_yolov5():
+    """Make the yolov5 'models' package importable from a local copy"""
+    for source_dir in YOLOV5_SOURCE_DIRS:
+        if source_dir and os.path.exists(os.path.join(source_dir, "models", "yolo.py")):
+            if source_dir not in sys.path:
+                sys.path.insert(0, source_dir)
+            return source_dir
+    raise ImportError("The yolov5 source is needed once to prepare a .pt model: clone "
+                      "https://github.com/ultralytics/yolov5 to ./yolov5 or set YOLOV5_DIR")
+
+def prepare(weights_path, imgsz):
+    """Load a YOLOv5 checkpoint, fuse it, switch it to eval mode and trace it to TorchScript
+
+    Returns (TorchScript module, class names).
+    """
+    import torch
+
+    _import_yolov5()
+    try:
+        checkpoint = torch.load(weights_path, map_location="cpu", weights_only=False)
+    except TypeError:
+        # PyTorch < 1.13 has no weights_only argument
+        checkpoint = torch.load(weights_path, map_location="cpu")
+    model = (checkpoint.get("ema") or checkpoint["model"]).float()
+    names = model.names
+    if isinstance(names, dict):
+        names = [names[i] for i in sorted(names)]
+
+    # Fold batch norm into the convolutions and drop training-only behaviour
+    model = model.fuse().eval()
+    for module in model.modules():
+        if type(module).__name__ == "Detect":
+            # Same settings as yolov5's export.py: one (1, N, 5 + classes) output
+            module.inplace = False
+            module.export = True
+    for parameter in model.parameters():
+        parameter.requires_grad_(False)
+
+    with torch.no_grad():
+        traced = torch.jit.trace(model, torch.zeros(1, 3, imgsz, imgsz), strict=False)
+    return traced, list(names)
+
+def _write_atomic(path, write):
+    """Write to a temporary file in the same directory, then rename it into place"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def cached_model_path(weights_path, digest, imgsz, cache_dir=CACHE_DIR):
+    """Cache file for weights with the given digest traced at imgsz"""
+    name = os.path.splitext(os.path.basename(weights_path))[0]
+    return os.path.join(cache_dir, f"{name}-{digest[:12]}-{imgsz}.torchscript")
+
+def load_model(model="yolov5n", imgsz=640, cache_dir=CACHE_DIR):
+    """Return (TorchScript module, class names) for a registry name or weights file
+
+    Nothing is downloaded. The weights are checked against their checksum and
+    the prepared model is cached per weights digest, input size and PyTorch
+    version, so later starts only load the cached TorchScript file.
+    """
+    import torch
+
+    weights_path, expected = resolve(model)
+    digest = verify(weights_path, expected)
+
+    cached_path = cached_model_path(weights_path, digest, imgsz, cache_dir)
+    meta_path = cached_path + ".json"
+
+    meta = None
+    if os.path.exists(meta_path) and os.path.exists(cached_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("torch") != torch.__version__ or file_sha256(cached_path) != meta.get("sha256"):
+            print(f"Cached model {cached_path} is stale or corrupt, preparing it again")
+            meta = None
+    if meta is not None:
+        return torch.jit.load(cached_path, map_location="cpu").eval(), meta["names"]
+
+    print(f"Preparing {weights_path} ({imgsz}x{imgsz}) for {cached_path}...")
+    traced, names = prepare(weights_path, imgsz)
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_atomic(cached_path, lambda path: torch.jit.save(traced, path))
+    meta = {
+        "source": os.path.basename(weights_path),
+        "source_sha256": digest,
+        "sha256": file_sha256(cached_path),
+        "imgsz": imgsz,
+        "torch": torch.__version__,
+        "names": names,
+    }
+    def write_meta(path):
+        with open(path, "w") as f:
+            json.dump(meta, f, indent=2)
+    _write_atomic(meta_path, write_meta)
+    return torch.jit.load(cached_path, map_location="cpu").eval(), names
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify and prepare models without network access')
+    parser.add_argument('model', nargs='?', default='yolov5n',
+                        help=f"Registry name ({', '.join(MODELS)}) or path to a .pt file")
+    parser.add_argument('--imgsz', type=int, default=640, help='Input size to trace the model at')
+    parser.add_argument('--export', default=None,
+                        help='Also copy the TorchScript file here (e.g. for DETECTOR_BACKEND = "torchscript")')
+    parser.add_argument('--checksum', action='store_true',
+                        help='Only print the SHA-256 of the weights (to pin custom models)')
+    args = parser.parse_args()
+
+    weights_path, expected = resolve(args.model)
+    if args.checksum:
+        print(f"{file_sha256(weights_path)}  {weights_path}")
+        return
+
+    load_model(args.model, args.imgsz)
+    cached_path = cached_model_path(weights_path, file_sha256(weights_path), args.imgsz)
+    print(f"Model ready: {cached_path}")
+    if args.export:
+        shutil.copyfile(cached_path, args.export)
+        print(f"Exported to {args.export}")
+
+if __name__ == "__main__":
+    main()